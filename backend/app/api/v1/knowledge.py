@@ -13,7 +13,9 @@ from app.models.user import User
 from app.schemas.knowledge import (
     KnowledgeBaseCreate, KnowledgeBaseResponse, KnowledgeBaseUpdate,
     RetrievalConfigUpdate, RetrievalConfigResponse, DocumentResponse,
-    SearchRequest, SearchResult
+    SearchRequest, SearchResult, IndexProfileUpdate, IndexTuneRequest, IndexTuneResponse,
+    BatchSearchRequest, BatchSearchResult, FederatedSearchRequest,
+    ProjectionUpdate, ProjectionResponse, QuantizationReportResponse, ScalarFieldMigrationResponse
 )
 from app.schemas.common import ApiResponse, PaginatedResponse
 from app.services.knowledge_service import KnowledgeService
@@ -30,9 +32,32 @@ async def create_knowledge_base(
     """创建知识库集合"""
     logger.info(f"用户 {current_user.username} 请求创建知识库: {kb_in.name}")
     kb_service = KnowledgeService(db)
-    kb = await kb_service.create_knowledge_base(current_user.id, kb_in)
+    try:
+        kb = await kb_service.create_knowledge_base(current_user.id, kb_in)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     return ApiResponse(data=KnowledgeBaseResponse.model_validate(kb))
 
+@router.get("/embedding-providers", response_model=ApiResponse[List[Dict[str, Any]]])
+async def list_embedding_providers(
+    current_user: User = Depends(get_current_active_user)
+):
+    """可选的 Embedding 提供方（创建知识库时选择）"""
+    from app.knowledge.embedding_providers import embedding_providers
+    
+    default = embedding_providers.validate(None)
+    providers = []
+    for name in embedding_providers.names():
+        provider = embedding_providers.get(name)
+        providers.append({
+            "name": name,
+            "model": provider.model_id,
+            "dimension": provider.dimension,
+            "supports_sparse": provider.supports_sparse,
+            "default": name == default
+        })
+    return ApiResponse(data=providers)
+
 @router.get("/collections", response_model=ApiResponse[List[KnowledgeBaseResponse]])
 async def list_knowledge_bases(
     current_user: User = Depends(get_current_active_user),
@@ -92,7 +117,16 @@ async def get_retrieval_config(
         top_n=kb.top_n,
         similarity_threshold=kb.similarity_threshold,
         search_mode=kb.search_mode,
-        rerank_enabled=kb.rerank_enabled
+        rerank_enabled=kb.rerank_enabled,
+        index_profile=kb.index_profile,
+        index_search_params=kb.index_search_params,
+        quantization=kb.quantization,
+        projection_dim=kb.projection_dim,
+        projection_rescore=kb.projection_rescore,
+        sparse_enabled=kb.sparse_enabled,
+        scalar_fields=kb.scalar_fields,
+        shared_collection=kb.shared_collection,
+        embedding_provider=kb.embedding_provider
     ))
 
 @router.put("/collections/{kb_id}/config", response_model=ApiResponse[RetrievalConfigResponse])
@@ -116,9 +150,142 @@ async def update_retrieval_config(
         top_n=updated_kb.top_n,
         similarity_threshold=updated_kb.similarity_threshold,
         search_mode=updated_kb.search_mode,
-        rerank_enabled=updated_kb.rerank_enabled
+        rerank_enabled=updated_kb.rerank_enabled,
+        index_profile=updated_kb.index_profile,
+        index_search_params=updated_kb.index_search_params,
+        quantization=updated_kb.quantization,
+        projection_dim=updated_kb.projection_dim,
+        projection_rescore=updated_kb.projection_rescore,
+        sparse_enabled=updated_kb.sparse_enabled,
+        scalar_fields=updated_kb.scalar_fields,
+        shared_collection=updated_kb.shared_collection,
+        embedding_provider=updated_kb.embedding_provider
+    ))
+
+@router.put("/collections/{kb_id}/index", response_model=ApiResponse[RetrievalConfigResponse])
+async def update_index_profile(
+    kb_id: str,
+    index_in: IndexProfileUpdate,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """切换向量索引类型并重建索引（AUTO 表示按数据量自动选择）"""
+    kb_service = KnowledgeService(db)
+    kb = await kb_service.get_knowledge_base(kb_id)
+    if not kb or kb.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Knowledge base not found")
+    
+    try:
+        kb = await kb_service.rebuild_index(kb, index_in.index_profile)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return ApiResponse(data=RetrievalConfigResponse(
+        chunk_size=kb.chunk_size,
+        chunk_overlap=kb.chunk_overlap,
+        top_k=kb.top_k,
+        top_n=kb.top_n,
+        similarity_threshold=kb.similarity_threshold,
+        search_mode=kb.search_mode,
+        rerank_enabled=kb.rerank_enabled,
+        index_profile=kb.index_profile,
+        index_search_params=kb.index_search_params,
+        quantization=kb.quantization,
+        projection_dim=kb.projection_dim,
+        projection_rescore=kb.projection_rescore,
+        sparse_enabled=kb.sparse_enabled,
+        scalar_fields=kb.scalar_fields,
+        shared_collection=kb.shared_collection,
+        embedding_provider=kb.embedding_provider
     ))
 
+@router.post("/collections/{kb_id}/index/tune", response_model=ApiResponse[IndexTuneResponse])
+async def tune_index(
+    kb_id: str,
+    tune_req: IndexTuneRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """按召回率目标自动调优检索参数（nprobe/ef/search_list）"""
+    kb_service = KnowledgeService(db)
+    kb = await kb_service.get_knowledge_base(kb_id)
+    if not kb or kb.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Knowledge base not found")
+    if tune_req.recall_target is not None and not 0 < tune_req.recall_target <= 1:
+        raise HTTPException(status_code=400, detail="recall_target must be in (0, 1]")
+    
+    try:
+        result = await kb_service.tune_index(
+            kb,
+            recall_target=tune_req.recall_target,
+            sample_size=tune_req.sample_size,
+            top_k=tune_req.top_k
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return ApiResponse(data=IndexTuneResponse(**result.to_dict()))
+
+@router.put("/collections/{kb_id}/projection", response_model=ApiResponse[ProjectionResponse])
+async def update_projection(
+    kb_id: str,
+    projection_in: ProjectionUpdate,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """在知识库分块上拟合 PCA 降维投影并按新维度重建集合，返回召回损失报告"""
+    kb_service = KnowledgeService(db)
+    kb = await kb_service.get_knowledge_base(kb_id)
+    if not kb or kb.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Knowledge base not found")
+    
+    try:
+        result = await kb_service.set_projection(kb, projection_in.dimension, projection_in.rescore)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return ApiResponse(data=ProjectionResponse(**result))
+
+@router.post("/collections/{kb_id}/scalar-fields/migrate", response_model=ApiResponse[ScalarFieldMigrationResponse])
+async def migrate_scalar_fields(
+    kb_id: str,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """将旧集合重建为带 document_id / kb_id / chunk_id / page_id 标量字段的 schema"""
+    kb_service = KnowledgeService(db)
+    kb = await kb_service.get_knowledge_base(kb_id)
+    if not kb or kb.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Knowledge base not found")
+    
+    try:
+        result = await kb_service.migrate_scalar_fields(kb)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return ApiResponse(data=ScalarFieldMigrationResponse(**result))
+
+@router.get("/collections/{kb_id}/quantization/report", response_model=ApiResponse[QuantizationReportResponse])
+async def get_quantization_report(
+    kb_id: str,
+    sample_size: int = None,
+    top_k: int = None,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """对比量化/降维检索（首轮 / 重打分）与全精度检索的召回率和延迟"""
+    kb_service = KnowledgeService(db)
+    kb = await kb_service.get_knowledge_base(kb_id)
+    if not kb or kb.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Knowledge base not found")
+    
+    try:
+        report = await kb_service.quantization_report(kb, sample_size=sample_size, top_k=top_k)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return ApiResponse(data=QuantizationReportResponse(**report.to_dict()))
+
 @router.get("/collections/{kb_id}/documents", response_model=ApiResponse[PaginatedResponse[DocumentResponse]])
 async def list_documents(
     kb_id: str,
@@ -194,7 +361,7 @@ async def upload_document(
         )
         
         # 确保 bucket 存在
-        bucket_name = "agonx-documents"
+        bucket_name = settings.MINIO_BUCKET
         if not minio_client.bucket_exists(bucket_name):
             minio_client.make_bucket(bucket_name)
         
@@ -234,13 +401,15 @@ async def upload_document(
         # TODO: 实现异步任务队列（Celery 或 asyncio task）
         # 暂时同步处理
         try:
+            from app.knowledge.index_profiles import CollectionSpec
             await _process_document_vectorization(
                 doc_id, 
                 collection_id, 
                 kb.collection_name,
                 object_name, 
                 file_content, 
-                db
+                db,
+                spec=CollectionSpec.from_knowledge_base(kb)
             )
         except Exception as e:
             logger.error(f"向量化失败: {str(e)}")
@@ -248,6 +417,9 @@ async def upload_document(
             document.error_message = str(e)
             await db.commit()
         
+        # 新文档（包括处理失败时已写入的部分分块）会改变检索结果
+        await kb_service.invalidate_search_cache(kb.id)
+        
         logger.info(f"文档上传成功: {file.filename}")
         return ApiResponse(
             message="文件已上传，正在处理",
@@ -268,7 +440,8 @@ async def _process_document_vectorization(
     collection_name: str,
     file_path: str,
     file_content: bytes,
-    db: AsyncSession
+    db: AsyncSession,
+    spec=None
 ):
     """处理文档向量化（增强版，支持图片、OCR、页面映射）"""
     from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -304,13 +477,13 @@ async def _process_document_vectorization(
         if file_ext == '.pdf':
             await _process_pdf_rich_media(
                 doc_id, kb_id, collection_name, file_path, file_content,
-                minio_client, db
+                minio_client, db, spec=spec
             )
         else:
             # 非PDF文档，使用原有逻辑
             await _process_simple_document(
                 doc_id, kb_id, collection_name, file_path, file_content,
-                file_ext, db
+                file_ext, db, spec=spec
             )
         
         logger.info(f"========== 文档向量化完成 ==========")
@@ -334,7 +507,8 @@ async def _process_pdf_rich_media(
     file_path: str,
     file_content: bytes,
     minio_client: Minio,
-    db: AsyncSession
+    db: AsyncSession,
+    spec=None
 ):
     """处理PDF文档（富媒体模式）"""
     import fitz  # PyMuPDF
@@ -491,7 +665,8 @@ async def _process_pdf_rich_media(
                 await retrieval_service.add_texts(
                     collection_name=collection_name,
                     texts=batch_texts,
-                    metadatas=batch_metadatas
+                    metadatas=batch_metadatas,
+                    spec=spec
                 )
                 logger.info(f"  ✅ 第 {batch_num}/{total_batches} 批插入成功")
             except Exception as e:
@@ -538,7 +713,8 @@ async def _process_simple_document(
     file_path: str,
     file_content: bytes,
     file_ext: str,
-    db: AsyncSession
+    db: AsyncSession,
+    spec=None
 ):
     """处理简单文档（TXT/Word）"""
     from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -590,7 +766,8 @@ async def _process_simple_document(
         await retrieval_service.add_texts(
             collection_name=collection_name,
             texts=texts,
-            metadatas=metadatas
+            metadatas=metadatas,
+            spec=spec
         )
         
         # 更新文档状态
@@ -626,13 +803,36 @@ async def search_knowledge(
     
     try:
         from app.knowledge.retrieval import retrieval_service
-        
-        # 连接 Milvus
-        await retrieval_service.connect()
+        from app.knowledge.index_profiles import CollectionSpec
+        from app.knowledge.cache import search_result_cache
+        from app.knowledge.filters import SearchFilter
         
         # 根据检索模式进行检索
         search_mode = search_req.search_mode or kb.search_mode
         top_k = search_req.top_k or kb.top_k
+        threshold = search_req.similarity_threshold or kb.similarity_threshold
+        spec = CollectionSpec.from_knowledge_base(kb)
+        filters = SearchFilter(document_ids=search_req.document_ids) if search_req.document_ids else None
+        
+        # 命中结果缓存时直接返回，不经过 Embedding 和 Milvus（按文档过滤的检索不缓存）
+        cache_version = None
+        if search_result_cache.enabled and filters is None:
+            cache_version = await search_result_cache.version(kb.id)
+            cached = await search_result_cache.get(
+                kb.id, search_req.query, top_k, threshold, search_mode, version=cache_version
+            )
+            if cached is not None:
+                logger.info(f"🎯 检索结果命中缓存，返回 {len(cached)} 条结果")
+                return ApiResponse(data=[SearchResult(**r) for r in cached])
+        
+        # 连接 Milvus
+        await retrieval_service.connect()
+        
+        # BM25 索引在后台重建期间退回纯向量检索，结果不写入缓存
+        if search_mode in ("keyword", "hybrid", "hybrid_rrf") and not await kb_service.ensure_keyword_index(kb):
+            logger.info(f"BM25 索引重建中，{search_mode} 检索暂时退回纯向量检索")
+            search_mode = "vector"
+            cache_version = None
         
         if search_mode == "vector":
             # 纯向量检索
@@ -640,22 +840,29 @@ async def search_knowledge(
                 collection_name=kb.collection_name,
                 query_text=search_req.query,
                 top_k=top_k,
-                score_threshold=search_req.similarity_threshold or kb.similarity_threshold
+                score_threshold=threshold,
+                spec=spec,
+                filters=filters
             )
         elif search_mode == "keyword":
-            # 关键词检索（简单实现，可使用 BM25）
+            # 关键词检索（BM25，稀疏向量知识库使用 BGE-M3 词汇权重）
             results = await retrieval_service.keyword_search(
                 collection_name=kb.collection_name,
                 query_text=search_req.query,
-                top_k=top_k
+                top_k=top_k,
+                spec=spec,
+                filters=filters
             )
-        elif search_mode == "hybrid":
-            # 混合检索
+        elif search_mode in ("hybrid", "hybrid_rrf"):
+            # 混合检索（向量 + BM25 并发，加权或 RRF 融合；稀疏向量知识库在向量存储中融合稠密与稀疏两路）
             results = await retrieval_service.hybrid_search(
                 collection_name=kb.collection_name,
                 query_text=search_req.query,
                 top_k=top_k,
-                score_threshold=search_req.similarity_threshold or kb.similarity_threshold
+                score_threshold=threshold,
+                fusion="rrf" if search_mode == "hybrid_rrf" else "weighted",
+                spec=spec,
+                filters=filters
             )
         else:
             raise HTTPException(status_code=400, detail=f"Unsupported search mode: {search_mode}")
@@ -664,7 +871,7 @@ async def search_knowledge(
         if kb.rerank_enabled and results:
             results = await retrieval_service.rerank(
                 query=search_req.query,
-                documents=[r["content"] for r in results],
+                results=results,
                 top_n=kb.top_n
             )
         
@@ -680,6 +887,12 @@ async def search_knowledge(
             for r in results
         ]
         
+        if cache_version is not None:
+            await search_result_cache.set(
+                kb.id, search_req.query, top_k, threshold, search_mode,
+                [r.model_dump() for r in search_results], version=cache_version
+            )
+        
         logger.info(f"检索完成，返回 {len(search_results)} 条结果")
         return ApiResponse(data=search_results)
     
@@ -687,6 +900,185 @@ async def search_knowledge(
         logger.error(f"检索失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+@router.post("/search/federated", response_model=ApiResponse[List[SearchResult]])
+async def federated_search_knowledge(
+    search_req: FederatedSearchRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """跨知识库联合检索接口（查询只编码一次，各知识库并发检索后全局合并）"""
+    from app.core.config import settings
+    
+    logger.info(f"用户 {current_user.username} 请求联合检索: {search_req.query} ({len(search_req.collection_ids)} 个知识库)")
+    
+    kb_ids = list(dict.fromkeys(search_req.collection_ids))
+    if not kb_ids:
+        raise HTTPException(status_code=400, detail="collection_ids must not be empty")
+    if len(kb_ids) > settings.FEDERATED_SEARCH_MAX_COLLECTIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many knowledge bases: {len(kb_ids)} > {settings.FEDERATED_SEARCH_MAX_COLLECTIONS}"
+        )
+    
+    # 验证权限
+    kb_service = KnowledgeService(db)
+    kbs = await kb_service.get_user_knowledge_bases_by_ids(current_user.id, kb_ids)
+    if len(kbs) != len(kb_ids):
+        missing = set(kb_ids) - {kb.id for kb in kbs}
+        raise HTTPException(status_code=404, detail=f"Knowledge base not found: {', '.join(sorted(missing))}")
+    
+    try:
+        from app.knowledge.retrieval import retrieval_service
+        from app.knowledge.index_profiles import CollectionSpec
+        
+        top_k = search_req.top_k or settings.DEFAULT_TOP_K
+        results = await retrieval_service.federated_search(
+            specs=[CollectionSpec.from_knowledge_base(kb) for kb in kbs],
+            query_text=search_req.query,
+            top_k=top_k,
+            score_threshold=search_req.similarity_threshold or settings.DEFAULT_SIMILARITY_THRESHOLD
+        )
+        
+        # 重排序分数与知识库无关，可在合并后统一重排
+        if search_req.rerank_enabled and results:
+            results = await retrieval_service.rerank(
+                query=search_req.query,
+                results=results,
+                top_n=top_k
+            )
+        
+        return ApiResponse(data=[
+            SearchResult(
+                id=str(r.get("id", "")),
+                content=r.get("content", ""),
+                score=float(r.get("score", 0.0)),
+                metadata=r.get("metadata", {}),
+                source=r.get("source", ""),
+                collection_id=r.get("kb_id")
+            )
+            for r in results
+        ])
+    
+    except Exception as e:
+        logger.error(f"联合检索失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Federated search failed: {str(e)}")
+
+@router.post("/search/batch", response_model=ApiResponse[List[BatchSearchResult]])
+async def batch_search_knowledge(
+    search_req: BatchSearchRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """批量向量检索接口（多个查询一次编码、一次检索，用于评测与智能体并发检索）"""
+    from app.core.config import settings
+    
+    logger.info(f"用户 {current_user.username} 请求批量检索: {len(search_req.queries)} 个查询")
+    
+    if not search_req.queries:
+        return ApiResponse(data=[])
+    if len(search_req.queries) > settings.BATCH_SEARCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many queries: {len(search_req.queries)} > {settings.BATCH_SEARCH_MAX_QUERIES}"
+        )
+    
+    # 验证权限
+    kb_service = KnowledgeService(db)
+    kb = await kb_service.get_knowledge_base(search_req.collection_id)
+    if not kb or kb.user_id != current_user.id:
+        raise HTTPException(status_code=404, detail="Knowledge base not found")
+    
+    try:
+        from app.knowledge.retrieval import retrieval_service
+        from app.knowledge.index_profiles import CollectionSpec
+        
+        batch_results = await retrieval_service.batch_vector_search(
+            collection_name=kb.collection_name,
+            queries=search_req.queries,
+            top_k=search_req.top_k or kb.top_k,
+            score_threshold=search_req.similarity_threshold or kb.similarity_threshold,
+            spec=CollectionSpec.from_knowledge_base(kb)
+        )
+        
+        return ApiResponse(data=[
+            BatchSearchResult(
+                query=query,
+                results=[
+                    SearchResult(
+                        id=str(r.get("id", "")),
+                        content=r.get("content", ""),
+                        score=float(r.get("score", 0.0)),
+                        metadata=r.get("metadata", {}),
+                        source=r.get("source", "")
+                    )
+                    for r in results
+                ]
+            )
+            for query, results in zip(search_req.queries, batch_results)
+        ])
+    
+    except Exception as e:
+        logger.error(f"批量检索失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Batch search failed: {str(e)}")
+
+@router.get("/stats", response_model=ApiResponse[Dict[str, Any]])
+async def get_retrieval_stats(
+    current_user: User = Depends(get_current_active_user)
+):
+    """获取检索相关组件的运行统计（队列深度、延迟等）。包含内部配置，仅管理员可用。"""
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    
+    from app.knowledge.executor import embedding_executor, keyword_executor, rerank_executor
+    from app.knowledge.retrieval import retrieval_service, rerank_service
+    from app.knowledge.bm25 import keyword_index_manager
+    from app.knowledge.vector_store import vector_store
+    from app.knowledge.cache import search_result_cache
+    from app.knowledge.quantization import quantized_searcher
+    from app.knowledge.projection import projection_store
+    from app.knowledge.gc import vector_gc
+    from app.knowledge.content_store import content_embedding_store
+    from app.knowledge.embedding_providers import embedding_providers
+    
+    return ApiResponse(data={
+        "embedding_executor": embedding_executor.stats(),
+        "embedding_backend": retrieval_service.embedding_backend_stats(),
+        "embedding_providers": embedding_providers.stats(),
+        "query_batcher": retrieval_service.query_batcher.stats(),
+        "query_embedding_cache": retrieval_service.query_cache.stats(),
+        "chunk_embedding_store": content_embedding_store.stats() if content_embedding_store else None,
+        "keyword_index": keyword_index_manager.stats(),
+        "rerank_executor": rerank_executor.stats(),
+        "keyword_executor": keyword_executor.stats(),
+        "reranker": rerank_service.stats(),
+        "vector_store": vector_store.stats(),
+        "search_result_cache": search_result_cache.stats(),
+        "quantized_search": quantized_searcher.stats(),
+        "projections": projection_store.stats(),
+        "garbage_collector": vector_gc.stats()
+    })
+
+
+@router.post("/gc/reconcile", response_model=ApiResponse[Dict[str, Any]])
+async def reconcile_storage(
+    dry_run: bool = True,
+    check_objects: bool = True,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    对账：扫描所有知识库的向量集合和 MinIO 存储桶，找出数据库中已不存在的文档遗留的数据
+    
+    默认只报告（dry_run=true），确认后传 dry_run=false 执行删除。仅管理员可用。
+    """
+    if not current_user.is_superuser:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    
+    kb_service = KnowledgeService(db)
+    report = await kb_service.reconcile_storage(dry_run=dry_run, check_objects=check_objects)
+    logger.info(f"用户 {current_user.username} 执行存储对账 (dry_run={dry_run})")
+    return ApiResponse(data=report.to_dict())
+
 @router.get("/documents/{document_id}/download")
 async def download_document(
     document_id: str,
@@ -724,7 +1116,7 @@ async def download_document(
             secure=False
         )
         
-        bucket_name = "agonx-documents"
+        bucket_name = settings.MINIO_BUCKET
         response = minio_client.get_object(bucket_name, document.file_path)
         
         # 读取文件内容
@@ -771,8 +1163,7 @@ async def delete_document(
         raise HTTPException(status_code=403, detail="Permission denied")
     
     # 删除文档
-    await db.delete(document)
-    await db.commit()
+    await kb_service.delete_document(kb, document)
     
     logger.info(f"用户 {current_user.username} 删除文档: {document.filename}")
     return ApiResponse(message="文档已删除")
@@ -800,6 +1191,7 @@ async def enhanced_search(
     
     try:
         from app.knowledge.retrieval import retrieval_service
+        from app.knowledge.index_profiles import CollectionSpec
         
         # 1. 向量检索
         logger.info(f"步骤1: 执行向量检索...")
@@ -820,7 +1212,8 @@ async def enhanced_search(
                 collection_name=kb.collection_name,
                 query_text=search_req.query,
                 top_k=top_k,
-                score_threshold=search_req.similarity_threshold or kb.similarity_threshold
+                score_threshold=search_req.similarity_threshold or kb.similarity_threshold,
+                spec=CollectionSpec.from_knowledge_base(kb)
             )
         except Exception as e:
             logger.error(f"向量检索失败: {str(e)}")
@@ -1007,7 +1400,7 @@ def _get_minio_url(object_path: str) -> str:
             secure=False
         )
         
-        bucket = "agonx-documents"
+        bucket = settings.MINIO_BUCKET
         
         # 生成预签名URL，有效期7天
         url = minio_client.presigned_get_object(
@@ -1021,6 +1414,6 @@ def _get_minio_url(object_path: str) -> str:
         logger.error(f"生成MinIO URL失败: {str(e)}")
         # 降级为直接链接
         endpoint = settings.MINIO_ENDPOINT
-        bucket = "agonx-documents"
+        bucket = settings.MINIO_BUCKET
         return f"{endpoint}/{bucket}/{object_path}"
 
@@ -2,9 +2,10 @@
 配置模块
 从 YAML 文件和环境变量加载配置
 """
+import os
 from pydantic_settings import BaseSettings
 from functools import lru_cache
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from app.core.yaml_config import config as yaml_config
 
 
@@ -15,6 +16,8 @@ class Settings(BaseSettings):
     APP_NAME: str = yaml_config.get("app.name", "AgonX")
     APP_VERSION: str = yaml_config.get("app.version", "0.1.0")
     DEBUG: bool = yaml_config.get("app.debug", True)
+    # worker 进程数（uvicorn/gunicorn 的 --workers 读取 WEB_CONCURRENCY，优先使用该环境变量）
+    WORKERS: int = int(os.environ.get("WEB_CONCURRENCY") or yaml_config.get("app.workers", 1))
     
     # API配置
     API_V1_PREFIX: str = yaml_config.get("api.v1_prefix", "/api/v1")
@@ -57,6 +60,27 @@ class Settings(BaseSettings):
     MILVUS_USER: str = yaml_config.get("milvus.user", "")
     MILVUS_PASSWORD: str = yaml_config.get("milvus.password", "")
     EMBEDDING_DIMENSION: int = int(yaml_config.get("milvus.embedding_dimension", 1024))
+    MILVUS_MAX_LOADED_COLLECTIONS: int = int(yaml_config.get("milvus.max_loaded_collections", 64))
+    MILVUS_PRELOAD_COLLECTIONS: int = int(yaml_config.get("milvus.preload_collections", 8))
+    MILVUS_USAGE_STATS_FILE: str = yaml_config.get("milvus.usage_stats_file", "./data/collection_usage.json")
+    MILVUS_DEFAULT_INDEX_PROFILE: str = yaml_config.get("milvus.default_index_profile", "IVF_FLAT")
+    MILVUS_PARTITION_KEY_PARTITIONS: int = int(yaml_config.get("milvus.partition_key_partitions", 64))
+    SHARED_COLLECTIONS_ENABLED: bool = yaml_config.get("milvus.shared_collections.enabled", False)
+    SHARED_COLLECTIONS_COUNT: int = int(yaml_config.get("milvus.shared_collections.count", 4))
+    SHARED_COLLECTIONS_INDEX_PROFILE: str = yaml_config.get("milvus.shared_collections.index_profile", "HNSW")
+    INDEX_TUNE_RECALL_TARGET: float = float(yaml_config.get("milvus.index_tune.recall_target", 0.95))
+    INDEX_TUNE_SAMPLE_SIZE: int = int(yaml_config.get("milvus.index_tune.sample_size", 50))
+    MILVUS_CONNECTION_POOL_SIZE: int = int(yaml_config.get("milvus.connection_pool_size", 4))
+    VECTOR_STORE_BACKEND: str = yaml_config.get("milvus.vector_store_backend", "milvus")
+    EMBEDDED_STORE_DIR: str = yaml_config.get("milvus.embedded_store.data_dir", "./data/vectors")
+    EMBEDDED_STORE_MAX_VECTORS: int = int(yaml_config.get("milvus.embedded_store.max_vectors", 20000))
+    QUANTIZATION_DEFAULT: str = yaml_config.get("milvus.quantization.default", "none")
+    QUANTIZATION_COLD_STORE_DIR: str = yaml_config.get("milvus.quantization.cold_store_dir", "./data/cold_vectors")
+    QUANTIZATION_RESCORE_MULTIPLIER: int = int(yaml_config.get("milvus.quantization.rescore_multiplier", 4))
+    QUANTIZATION_REPORT_SAMPLE_SIZE: int = int(yaml_config.get("milvus.quantization.report_sample_size", 50))
+    PROJECTION_DIR: str = yaml_config.get("milvus.projection.data_dir", "./data/projections")
+    PROJECTION_FIT_SAMPLE_SIZE: int = int(yaml_config.get("milvus.projection.fit_sample_size", 10000))
+    PROJECTION_REBUILD_BATCH_SIZE: int = int(yaml_config.get("milvus.projection.rebuild_batch_size", 1000))
     
     # MinIO配置
     MINIO_ENDPOINT: str = yaml_config.get("minio.endpoint", "localhost:19000")
@@ -77,6 +101,41 @@ class Settings(BaseSettings):
     EMBEDDING_DEVICE: str = yaml_config.get("embedding.device", "cpu")
     EMBEDDING_CACHE_FOLDER: str = yaml_config.get("embedding.cache_folder", "./models")
     EMBEDDING_DIMENSION: int = int(yaml_config.get("embedding.dimension", 1024))
+    EMBEDDING_BATCH_SIZE: int = int(yaml_config.get("embedding.batch_size", 32))
+    EMBEDDING_EXECUTOR_WORKERS: int = int(yaml_config.get("embedding.executor_workers", 1))
+    EMBEDDING_EXECUTOR_QUEUE_SIZE: int = int(yaml_config.get("embedding.executor_queue_size", 256))
+    EMBEDDING_QUERY_BATCH_WINDOW_MS: float = float(yaml_config.get("embedding.query_batch_window_ms", 5))
+    EMBEDDING_QUERY_BATCH_MAX_SIZE: int = int(yaml_config.get("embedding.query_batch_max_size", 32))
+    EMBEDDING_QUERY_CACHE_SIZE: int = int(yaml_config.get("embedding.query_cache_size", 2048))
+    EMBEDDING_QUERY_CACHE_TTL: int = int(yaml_config.get("embedding.query_cache_ttl", 3600))
+    EMBEDDING_QUERY_CACHE_REDIS: bool = yaml_config.get("embedding.query_cache_redis", False)
+    EMBEDDING_SPARSE_ENABLED: bool = yaml_config.get("embedding.sparse_enabled", False)
+    EMBEDDING_DEFAULT_PROVIDER: str = yaml_config.get("embedding.default_provider", "local")
+    EMBEDDING_PROVIDERS: Dict[str, Dict[str, Any]] = yaml_config.get("embedding.providers", None) or {}
+    EMBEDDING_BACKEND: str = yaml_config.get("embedding.backend", "torch")
+    EMBEDDING_ONNX_MODEL_PATH: str = yaml_config.get("embedding.onnx.model_path", "./models/bge-m3-onnx-int8")
+    EMBEDDING_ONNX_THREADS: int = int(yaml_config.get("embedding.onnx.threads", 0))
+    EMBEDDING_ONNX_MAX_LENGTH: int = int(yaml_config.get("embedding.onnx.max_length", 0))
+    EMBEDDING_CONTENT_STORE_ENABLED: bool = yaml_config.get("embedding.content_store.enabled", True)
+    EMBEDDING_CONTENT_STORE_BACKEND: str = yaml_config.get("embedding.content_store.backend", "mmap")
+    EMBEDDING_CONTENT_STORE_DIR: str = yaml_config.get("embedding.content_store.data_dir", "./data/chunk_embeddings")
+    EMBEDDING_CONTENT_STORE_MAX_ENTRIES: int = int(yaml_config.get("embedding.content_store.max_entries", 1000000))
+    
+    # Reranker配置
+    RERANK_MODEL: str = yaml_config.get("rerank.model", "BAAI/bge-reranker-v2-m3")
+    RERANK_USE_FP16: bool = yaml_config.get("rerank.use_fp16", False)
+    RERANK_BATCH_SIZE: int = int(yaml_config.get("rerank.batch_size", 16))
+    RERANK_MAX_LENGTH: int = int(yaml_config.get("rerank.max_length", 512))
+    RERANK_EXECUTOR_WORKERS: int = int(yaml_config.get("rerank.executor_workers", 1))
+    RERANK_EXECUTOR_QUEUE_SIZE: int = int(yaml_config.get("rerank.executor_queue_size", 64))
+    RERANK_CACHE_SIZE: int = int(yaml_config.get("rerank.cache_size", 8192))
+    RERANK_CACHE_TTL: int = int(yaml_config.get("rerank.cache_ttl", 3600))
+    RERANK_LOAD_RETRY_INTERVAL: float = float(yaml_config.get("rerank.load_retry_interval", 60))
+    RERANK_LOAD_RETRY_MAX_INTERVAL: float = float(yaml_config.get("rerank.load_retry_max_interval", 3600))
+    RERANK_CASCADE_ENABLED: bool = yaml_config.get("rerank.cascade_enabled", False)
+    RERANK_CASCADE_TOP_M: int = int(yaml_config.get("rerank.cascade_top_m", 30))
+    RERANK_CASCADE_BATCH_SIZE: int = int(yaml_config.get("rerank.cascade_batch_size", 8))
+    RERANK_CASCADE_MARGIN: float = float(yaml_config.get("rerank.cascade_margin", 0.1))
     
     # 知识库默认配置
     DEFAULT_CHUNK_SIZE: int = int(yaml_config.get("knowledge.chunk_size", 512))
@@ -84,6 +143,42 @@ class Settings(BaseSettings):
     DEFAULT_TOP_K: int = int(yaml_config.get("knowledge.top_k", 10))
     DEFAULT_TOP_N: int = int(yaml_config.get("knowledge.top_n", 5))
     DEFAULT_SIMILARITY_THRESHOLD: float = float(yaml_config.get("knowledge.similarity_threshold", 0.7))
+    HYBRID_VECTOR_WEIGHT: float = float(yaml_config.get("knowledge.hybrid_vector_weight", 0.7))
+    HYBRID_KEYWORD_WEIGHT: float = float(yaml_config.get("knowledge.hybrid_keyword_weight", 0.3))
+    HYBRID_RRF_K: int = int(yaml_config.get("knowledge.hybrid_rrf_k", 60))
+    HYBRID_CANDIDATE_MULTIPLIER: int = int(yaml_config.get("knowledge.hybrid_candidate_multiplier", 2))
+    HYBRID_VECTOR_TIMEOUT: float = float(yaml_config.get("knowledge.hybrid_vector_timeout", 3.0))
+    HYBRID_KEYWORD_TIMEOUT: float = float(yaml_config.get("knowledge.hybrid_keyword_timeout", 1.0))
+    KEYWORD_EXECUTOR_WORKERS: int = int(yaml_config.get("knowledge.keyword_executor_workers", 2))
+    KEYWORD_EXECUTOR_QUEUE_SIZE: int = int(yaml_config.get("knowledge.keyword_executor_queue_size", 64))
+    BM25_INDEX_DIR: str = yaml_config.get("knowledge.bm25_index_dir", "./data/bm25")
+    BM25_K1: float = float(yaml_config.get("knowledge.bm25_k1", 1.5))
+    BM25_B: float = float(yaml_config.get("knowledge.bm25_b", 0.75))
+    RANGE_SEARCH_ENABLED: bool = yaml_config.get("knowledge.range_search_enabled", True)
+    RANGE_SEARCH_MIN_RESULTS: int = int(yaml_config.get("knowledge.range_search_min_results", 0))
+    RANGE_SEARCH_WIDEN_STEP: float = float(yaml_config.get("knowledge.range_search_widen_step", 0.1))
+    RANGE_SEARCH_MIN_SCORE: float = float(yaml_config.get("knowledge.range_search_min_score", 0.4))
+    BATCH_SEARCH_MAX_QUERIES: int = int(yaml_config.get("knowledge.batch_search_max_queries", 256))
+    FEDERATED_SEARCH_MAX_COLLECTIONS: int = int(yaml_config.get("knowledge.federated_search_max_collections", 20))
+    SEARCH_CACHE_ENABLED: bool = yaml_config.get("knowledge.search_cache_enabled", True)
+    SEARCH_CACHE_SIZE: int = int(yaml_config.get("knowledge.search_cache_size", 1024))
+    SEARCH_CACHE_TTL: int = int(yaml_config.get("knowledge.search_cache_ttl", 300))
+    SEARCH_CACHE_MAX_MB: int = int(yaml_config.get("knowledge.search_cache_max_mb", 64))
+    SEARCH_CACHE_REDIS: bool = yaml_config.get("knowledge.search_cache_redis", False)
+    GC_SWEEP_INTERVAL: float = float(yaml_config.get("knowledge.gc_sweep_interval", 5.0))
+    GC_BATCH_SIZE: int = int(yaml_config.get("knowledge.gc_batch_size", 200))
+    GC_COMPACTION_THRESHOLD: int = int(yaml_config.get("knowledge.gc_compaction_threshold", 50000))
+    GC_MAX_ATTEMPTS: int = int(yaml_config.get("knowledge.gc_max_attempts", 3))
+    GC_RECONCILE_GRACE_PERIOD: float = float(yaml_config.get("knowledge.gc_reconcile_grace_period", 3600))
+    
+    # 启动预热配置
+    WARMUP_ENABLED: bool = yaml_config.get("warmup.enabled", True)
+    WARMUP_BLOCKING: bool = yaml_config.get("warmup.blocking", False)
+    WARMUP_MODELS: List[str] = yaml_config.get("warmup.models", None) or ["embedding", "rerank", "ocr"]
+    WARMUP_REQUIRED: List[str] = yaml_config.get("warmup.required", None) or ["embedding"]
+    WARMUP_TIMEOUT: float = float(yaml_config.get("warmup.timeout", 600))
+    WARMUP_RETRY_INTERVAL: float = float(yaml_config.get("warmup.retry_interval", 30))
+    WARMUP_RETRY_MAX_INTERVAL: float = float(yaml_config.get("warmup.retry_max_interval", 600))
     
     # 文件上传配置
     MAX_FILE_SIZE: int = int(yaml_config.get("upload.max_file_size", 52428800))
@@ -6,6 +6,81 @@ from app.knowledge.retrieval import (
     retrieval_service,
     rerank_service
 )
+from app.knowledge.executor import (
+    InferenceExecutor,
+    embedding_executor,
+    rerank_executor
+)
+from app.knowledge.bm25 import (
+    BM25Index,
+    KeywordIndexManager,
+    keyword_index_manager
+)
+from app.knowledge.vector_store import (
+    VectorStore,
+    MilvusVectorStore,
+    InMemoryVectorStore,
+    SPARSE_FIELD,
+    SCALAR_FIELDS,
+    create_vector_store,
+    vector_store
+)
+from app.knowledge.filters import SearchFilter
+from app.knowledge.embedded_store import (
+    EmbeddedVectorStore,
+    TieredVectorStore
+)
+from app.knowledge.index_profiles import (
+    IndexProfile,
+    CollectionSpec,
+    INDEX_PROFILES,
+    get_index_profile
+)
+from app.knowledge.index_tuner import (
+    IndexAutoTuner,
+    TuningResult,
+    index_auto_tuner
+)
+from app.knowledge.quantization import (
+    QuantizedSearcher,
+    QuantizationReport,
+    quantized_searcher
+)
+from app.knowledge.projection import (
+    PCAProjection,
+    ProjectionStore,
+    projection_store
+)
+from app.knowledge.cache import (
+    LRUCache,
+    QueryEmbeddingCache,
+    SearchResultCache,
+    search_result_cache
+)
+from app.knowledge.embedding_backends import (
+    OnnxEmbeddingModel,
+    embedding_model_id
+)
+from app.knowledge.embedding_providers import (
+    EmbeddingProvider,
+    LocalEmbeddingProvider,
+    RemoteEmbeddingProvider,
+    EmbeddingProviderRegistry,
+    embedding_providers
+)
+from app.knowledge.content_store import (
+    ContentEmbeddingStore,
+    MmapContentEmbeddingStore,
+    RedisContentEmbeddingStore,
+    content_embedding_store,
+    content_key
+)
+from app.knowledge.gc import (
+    DeletionTask,
+    ReconcileReport,
+    VectorGarbageCollector,
+    vector_gc
+)
 from app.knowledge.embeddings import (
     EmbeddingService,
     embedding_service
@@ -17,6 +92,55 @@ __all__ = [
     "RerankService",
     "retrieval_service",
     "rerank_service",
+    "InferenceExecutor",
+    "embedding_executor",
+    "rerank_executor",
+    "BM25Index",
+    "KeywordIndexManager",
+    "keyword_index_manager",
+    "VectorStore",
+    "MilvusVectorStore",
+    "InMemoryVectorStore",
+    "SPARSE_FIELD",
+    "SCALAR_FIELDS",
+    "SearchFilter",
+    "create_vector_store",
+    "vector_store",
+    "EmbeddedVectorStore",
+    "TieredVectorStore",
+    "IndexProfile",
+    "CollectionSpec",
+    "INDEX_PROFILES",
+    "get_index_profile",
+    "IndexAutoTuner",
+    "TuningResult",
+    "index_auto_tuner",
+    "QuantizedSearcher",
+    "QuantizationReport",
+    "quantized_searcher",
+    "PCAProjection",
+    "ProjectionStore",
+    "projection_store",
+    "LRUCache",
+    "QueryEmbeddingCache",
+    "SearchResultCache",
+    "search_result_cache",
+    "OnnxEmbeddingModel",
+    "embedding_model_id",
+    "EmbeddingProvider",
+    "LocalEmbeddingProvider",
+    "RemoteEmbeddingProvider",
+    "EmbeddingProviderRegistry",
+    "embedding_providers",
+    "ContentEmbeddingStore",
+    "MmapContentEmbeddingStore",
+    "RedisContentEmbeddingStore",
+    "content_embedding_store",
+    "content_key",
+    "DeletionTask",
+    "ReconcileReport",
+    "VectorGarbageCollector",
+    "vector_gc",
     "EmbeddingService",
     "embedding_service"
 ]
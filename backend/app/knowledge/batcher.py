@@ -0,0 +1,122 @@
+"""
+动态微批调度器
+将短时间窗口内并发到达的请求合并为一次批量调用
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.logger import logger
+
+
+class MicroBatcher:
+    """
+    动态微批调度器
+
+    第一个请求到达后开启一个时间窗口，窗口结束或累计达到
+    max_batch_size 个请求时，合并为一次 batch_fn 调用，再把
+    结果按顺序分发给各个调用方。相同的输入在同一批次内只计算一次。
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Awaitable[List[Any]]],
+        window_ms: float = 5.0,
+        max_batch_size: int = 32,
+        name: str = "batcher"
+    ):
+        self.name = name
+        self.window = max(0.0, window_ms) / 1000
+        self.max_batch_size = max(1, max_batch_size)
+
+        self._batch_fn = batch_fn
+        self._pending: List[Tuple[Any, asyncio.Future, float]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        # 统计信息
+        self._batches = 0
+        self._items = 0
+        self._max_batch = 0
+        self._wait_total = 0.0
+
+    async def submit(self, item: Any) -> Any:
+        """
+        提交单个请求并等待其结果
+
+        Args:
+            item: 请求输入
+
+        Returns:
+            该输入对应的结果
+        """
+        if self.window == 0 or self.max_batch_size == 1:
+            results = await self._batch_fn([item])
+            return results[0]
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future, time.perf_counter()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        """结束当前窗口并派发批次"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future, float]]):
+        """执行一次批量调用并分发结果"""
+        dispatched = time.perf_counter()
+        unique_items: List[Any] = []
+        positions: Dict[Any, int] = {}
+        for item, _, _ in batch:
+            if item not in positions:
+                positions[item] = len(unique_items)
+                unique_items.append(item)
+
+        self._batches += 1
+        self._items += len(batch)
+        self._max_batch = max(self._max_batch, len(batch))
+        self._wait_total += sum(dispatched - submitted for _, _, submitted in batch)
+
+        try:
+            results = await self._batch_fn(unique_items)
+        except Exception as e:
+            logger.error(f"微批调用失败 ({self.name}, 批大小: {len(unique_items)}): {str(e)}")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for item, future, _ in batch:
+            if not future.done():
+                future.set_result(results[positions[item]])
+
+    def stats(self) -> Dict[str, Any]:
+        """获取批处理统计"""
+        return {
+            "name": self.name,
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "pending": len(self._pending),
+            "batches": self._batches,
+            "requests": self._items,
+            "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+            "max_observed_batch_size": self._max_batch,
+            "avg_window_wait_ms": round(self._wait_total / self._items * 1000, 2) if self._items else 0.0
+        }
@@ -0,0 +1,488 @@
+"""
+BM25 关键词检索
+按集合维护倒排索引，支持中文分词、增量更新和磁盘持久化
+"""
+import asyncio
+import heapq
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.knowledge.executor import keyword_executor
+
+
+_TOKEN_PATTERN = re.compile(r"[\u4e00-\u9fff]+|[a-z0-9]+(?:[._-][a-z0-9]+)*")
+_CJK_PATTERN = re.compile(r"^[\u4e00-\u9fff]+$")
+
+try:
+    import jieba
+    jieba.setLogLevel("WARNING")
+except ImportError:  # pragma: no cover - jieba 为可选依赖
+    jieba = None
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    分词
+
+    安装了 jieba 时使用搜索引擎模式分词；否则英文/数字按单词切分，
+    中文按单字 + 相邻双字切分。
+    """
+    text = (text or "").lower()
+    tokens: List[str] = []
+    for segment in _TOKEN_PATTERN.findall(text):
+        if not _CJK_PATTERN.match(segment):
+            tokens.append(segment)
+        elif jieba is not None:
+            tokens.extend(t for t in jieba.lcut_for_search(segment) if t.strip())
+        else:
+            tokens.extend(segment)
+            tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+    return tokens
+
+
+class BM25Index:
+    """单个集合的 BM25 倒排索引"""
+
+    VERSION = 1
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs: Dict[str, Dict[str, Any]] = {}
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.document_chunks: Dict[str, Set[str]] = {}
+        self.total_length = 0
+        # 是否包含集合的全部分块（新建集合或全量重建后为 True）
+        self.complete = False
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def add(self, doc_id: str, content: str, metadata: Dict[str, Any] = None, source: str = ""):
+        """添加（或替换）一个分块"""
+        if doc_id in self.docs:
+            self.remove(doc_id)
+
+        metadata = metadata or {}
+        term_freqs = Counter(tokenize(content))
+        length = sum(term_freqs.values())
+
+        self.docs[doc_id] = {
+            "content": content,
+            "metadata": metadata,
+            "source": source,
+            "length": length,
+            "terms": list(term_freqs)
+        }
+        for term, tf in term_freqs.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.total_length += length
+
+        document_id = metadata.get("document_id")
+        if document_id:
+            self.document_chunks.setdefault(document_id, set()).add(doc_id)
+
+    def remove(self, doc_id: str) -> bool:
+        """删除一个分块"""
+        doc = self.docs.pop(doc_id, None)
+        if doc is None:
+            return False
+
+        for term in doc["terms"]:
+            posting = self.postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self.postings[term]
+        self.total_length -= doc["length"]
+
+        document_id = doc["metadata"].get("document_id")
+        if document_id in self.document_chunks:
+            self.document_chunks[document_id].discard(doc_id)
+            if not self.document_chunks[document_id]:
+                del self.document_chunks[document_id]
+        return True
+
+    def remove_document(self, document_id: str) -> int:
+        """删除某个文档的全部分块，返回删除数量"""
+        doc_ids = list(self.document_chunks.get(document_id, ()))
+        for doc_id in doc_ids:
+            self.remove(doc_id)
+        return len(doc_ids)
+
+    def remap_ids(self, mapping: Dict[str, str]):
+        """替换分块 ID（向量集合迁移后主键变化时使用），无需重新分词"""
+        self.docs = {mapping.get(doc_id, doc_id): doc for doc_id, doc in self.docs.items()}
+        for term, posting in self.postings.items():
+            self.postings[term] = {mapping.get(doc_id, doc_id): tf for doc_id, tf in posting.items()}
+        for document_id, doc_ids in self.document_chunks.items():
+            self.document_chunks[document_id] = {mapping.get(doc_id, doc_id) for doc_id in doc_ids}
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 10,
+        predicate: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> List[Dict[str, Any]]:
+        """检索并返回 BM25 分数最高的 top_k 个分块（predicate 不为空时只保留满足条件的分块）"""
+        if not self.docs:
+            return []
+
+        num_docs = len(self.docs)
+        avg_length = self.total_length / num_docs or 1.0
+        scores: Dict[str, float] = {}
+
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (num_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc_id, tf in posting.items():
+                length_norm = 1 - self.b + self.b * self.docs[doc_id]["length"] / avg_length
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + self.k1 * length_norm)
+
+        if predicate is not None:
+            scores = {doc_id: score for doc_id, score in scores.items() if predicate(self.docs[doc_id])}
+        top = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+        return [
+            {
+                "id": doc_id,
+                "content": self.docs[doc_id]["content"],
+                "score": float(score),
+                "metadata": self.docs[doc_id]["metadata"],
+                "source": self.docs[doc_id]["source"]
+            }
+            for doc_id, score in top
+        ]
+
+
+class _InterProcessLock:
+    """索引文件的跨进程互斥锁（Linux/macOS 使用 fcntl.flock，Windows 使用 msvcrt.locking）"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a+b")
+        if os.name == "nt":
+            import msvcrt
+            self._file.seek(0)
+            while True:
+                try:
+                    # LK_LOCK 重试约 10 秒后仍拿不到锁会抛出 OSError，继续等待
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+IndexOperation = Callable[[BM25Index], BM25Index]
+
+
+class KeywordIndexManager:
+    """
+    关键词索引管理器
+
+    每个集合一个 BM25Index，首次访问时从磁盘加载。加载、检索和修改都在
+    线程池中执行，不阻塞事件循环；同一集合的读写由线程锁串行化。
+
+    多个 worker 进程各自持有内存索引：修改先作用于内存索引并记录为待落盘操作，
+    延迟落盘时持有跨进程文件锁，若磁盘文件已被其他 worker 更新，先重新加载
+    磁盘上的索引再重放本进程的待落盘操作，然后写回，不会覆盖其他 worker 的写入。
+    没有待落盘操作时，磁盘文件更新后自动重新加载。
+    """
+
+    SAVE_DELAY = 2.0
+
+    def __init__(self, index_dir: str = None):
+        self.index_dir = Path(index_dir or settings.BM25_INDEX_DIR)
+        self._indexes: Dict[str, BM25Index] = {}
+        self._locks: Dict[str, threading.RLock] = {}
+        self._locks_guard = threading.Lock()
+        self._pending: Dict[str, List[IndexOperation]] = {}
+        self._save_handles: Dict[str, asyncio.TimerHandle] = {}
+        self._loaded_mtimes: Dict[str, int] = {}
+        self.merges = 0
+
+    def _path(self, collection_name: str) -> Path:
+        return self.index_dir / f"{collection_name}.bm25"
+
+    def _file_lock(self, collection_name: str) -> _InterProcessLock:
+        return _InterProcessLock(self.index_dir / f"{collection_name}.bm25.lock")
+
+    def _lock(self, collection_name: str) -> threading.RLock:
+        with self._locks_guard:
+            if collection_name not in self._locks:
+                self._locks[collection_name] = threading.RLock()
+            return self._locks[collection_name]
+
+    def _disk_mtime(self, collection_name: str) -> Optional[int]:
+        try:
+            return self._path(collection_name).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _load(self, collection_name: str) -> Optional[BM25Index]:
+        """从磁盘加载索引（在线程池中调用）"""
+        path = self._path(collection_name)
+        if not path.exists():
+            return None
+        try:
+            mtime = path.stat().st_mtime_ns
+            with open(path, "rb") as f:
+                payload = pickle.load(f)
+            if payload.get("version") != BM25Index.VERSION:
+                logger.warning(f"BM25 索引版本不匹配，忽略: {path}")
+                return None
+            logger.info(f"BM25 索引已从磁盘加载: {collection_name} ({len(payload['index'])} 个分块)")
+            self._loaded_mtimes[collection_name] = mtime
+            return payload["index"]
+        except Exception as e:
+            logger.error(f"加载 BM25 索引失败 ({path}): {str(e)}")
+            return None
+
+    def _is_stale(self, collection_name: str) -> bool:
+        """磁盘上的索引是否比内存中的新（被其他 worker 更新过）；有待落盘操作时在落盘时合并"""
+        if self._pending.get(collection_name):
+            return False
+        mtime = self._disk_mtime(collection_name)
+        return mtime is not None and mtime > self._loaded_mtimes.get(collection_name, 0)
+
+    def _get_sync(self, collection_name: str) -> BM25Index:
+        """获取集合的索引（不存在时返回空索引），调用方需持有集合锁"""
+        index = self._indexes.get(collection_name)
+        if index is None or self._is_stale(collection_name):
+            index = self._load(collection_name)
+            if index is None:
+                index = BM25Index(k1=settings.BM25_K1, b=settings.BM25_B)
+            self._indexes[collection_name] = index
+        return index
+
+    def _apply_sync(self, collection_name: str, operation: IndexOperation):
+        """修改内存索引并记录为待落盘操作"""
+        with self._lock(collection_name):
+            index = self._get_sync(collection_name)
+            self._indexes[collection_name] = operation(index)
+            self._pending.setdefault(collection_name, []).append(operation)
+
+    async def _apply(self, collection_name: str, operation: IndexOperation, save_now: bool = False):
+        await asyncio.to_thread(self._apply_sync, collection_name, operation)
+        if save_now:
+            await self.save(collection_name)
+        else:
+            self._schedule_save(collection_name)
+
+    async def is_complete(self, collection_name: str) -> bool:
+        """索引是否包含集合的全部分块（否则需要全量重建）"""
+        def check() -> bool:
+            with self._lock(collection_name):
+                return self._get_sync(collection_name).complete
+        return await asyncio.to_thread(check)
+
+    async def create(self, collection_name: str):
+        """为新建的集合创建空索引"""
+        def reset(_: BM25Index) -> BM25Index:
+            index = BM25Index(k1=settings.BM25_K1, b=settings.BM25_B)
+            index.complete = True
+            return index
+        await self._apply(collection_name, reset, save_now=True)
+
+    def _save_sync(self, collection_name: str):
+        """
+        持有跨进程文件锁写入索引文件（原子替换）
+
+        磁盘文件比本进程上次加载/写入的更新时，先加载磁盘上的索引并重放待落盘操作。
+        """
+        with self._lock(collection_name), self._file_lock(collection_name):
+            index = self._indexes.get(collection_name)
+            if index is None:
+                return
+            operations = self._pending.pop(collection_name, [])
+            mtime = self._disk_mtime(collection_name)
+            if operations and mtime is not None and mtime > self._loaded_mtimes.get(collection_name, 0):
+                disk_index = self._load(collection_name)
+                if disk_index is not None:
+                    for operation in operations:
+                        disk_index = operation(disk_index)
+                    index = self._indexes[collection_name] = disk_index
+                    self.merges += 1
+                    logger.info(f"BM25 索引已被其他 worker 更新，合并 {len(operations)} 个待落盘操作: {collection_name}")
+
+            self.index_dir.mkdir(parents=True, exist_ok=True)
+            path = self._path(collection_name)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            try:
+                with open(tmp_path, "wb") as f:
+                    pickle.dump({"version": BM25Index.VERSION, "index": index}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, path)
+            except Exception:
+                # 写入失败时保留待落盘操作，下次落盘重试
+                self._pending.setdefault(collection_name, [])[:0] = operations
+                tmp_path.unlink(missing_ok=True)
+                raise
+            self._loaded_mtimes[collection_name] = path.stat().st_mtime_ns
+
+    async def save(self, collection_name: str):
+        """立即落盘"""
+        handle = self._save_handles.pop(collection_name, None)
+        if handle is not None:
+            handle.cancel()
+        try:
+            await asyncio.to_thread(self._save_sync, collection_name)
+        except Exception as e:
+            logger.error(f"保存 BM25 索引失败 ({collection_name}): {str(e)}")
+
+    def _schedule_save(self, collection_name: str):
+        """延迟落盘，合并短时间内的多次写入"""
+        if collection_name in self._save_handles:
+            return
+        loop = asyncio.get_running_loop()
+        self._save_handles[collection_name] = loop.call_later(
+            self.SAVE_DELAY,
+            lambda: asyncio.ensure_future(self.save(collection_name))
+        )
+
+    async def add_texts(
+        self,
+        collection_name: str,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]] = None
+    ):
+        """增量添加分块"""
+        entries = list(zip(ids, texts, metadatas or [{} for _ in texts]))
+
+        def add(index: BM25Index) -> BM25Index:
+            for doc_id, text, metadata in entries:
+                index.add(str(doc_id), text, metadata, metadata.get("source", ""))
+            return index
+        await self._apply(collection_name, add)
+
+    async def remove_document(self, collection_name: str, document_id: str) -> int:
+        """删除某个文档的全部分块"""
+        removed = 0
+
+        def remove(index: BM25Index) -> BM25Index:
+            nonlocal removed
+            removed = index.remove_document(document_id)
+            return index
+        await self._apply(collection_name, remove)
+        return removed
+
+    async def remap_ids(self, collection_name: str, mapping: Dict[str, str]):
+        """替换分块 ID"""
+        def remap(index: BM25Index) -> BM25Index:
+            index.remap_ids(mapping)
+            return index
+        await self._apply(collection_name, remap, save_now=True)
+
+    async def rebuild(self, collection_name: str, entries: Iterable[Dict[str, Any]]) -> int:
+        """
+        用给定的分块全量重建索引
+
+        Args:
+            collection_name: 集合名称
+            entries: 分块迭代器，每项包含 id/content/metadata/source
+        """
+        def build() -> BM25Index:
+            index = BM25Index(k1=settings.BM25_K1, b=settings.BM25_B)
+            for entry in entries:
+                index.add(str(entry["id"]), entry["content"], entry.get("metadata"), entry.get("source", ""))
+            index.complete = True
+            return index
+
+        rebuilt = await asyncio.to_thread(build)
+        await self._apply(collection_name, lambda _: rebuilt, save_now=True)
+        logger.info(f"BM25 索引重建完成: {collection_name} ({len(rebuilt)} 个分块)")
+        return len(rebuilt)
+
+    def _search_sync(
+        self,
+        collection_name: str,
+        query: str,
+        top_k: int,
+        predicate: Optional[Callable[[Dict[str, Any]], bool]]
+    ) -> List[Dict[str, Any]]:
+        with self._lock(collection_name):
+            return self._get_sync(collection_name).search(query, top_k, predicate)
+
+    async def search(
+        self,
+        collection_name: str,
+        query: str,
+        top_k: int = 10,
+        predicate: Optional[Callable[[Dict[str, Any]], bool]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        关键词检索
+
+        索引加载和打分在关键词执行器中执行：事件循环不被阻塞，调用方的超时可以立即返回；
+        超时后仍在运行的检索只占用执行器的有界线程，不会挤占默认线程池。
+        """
+        return await keyword_executor.run(self._search_sync, collection_name, query, top_k, predicate)
+
+    async def drop(self, collection_name: str):
+        """删除集合的索引"""
+        handle = self._save_handles.pop(collection_name, None)
+        if handle is not None:
+            handle.cancel()
+
+        def drop_files():
+            with self._lock(collection_name), self._file_lock(collection_name):
+                self._indexes.pop(collection_name, None)
+                self._pending.pop(collection_name, None)
+                self._loaded_mtimes.pop(collection_name, None)
+                path = self._path(collection_name)
+                if path.exists():
+                    path.unlink()
+                    logger.info(f"BM25 索引已删除: {collection_name}")
+        await asyncio.to_thread(drop_files)
+        with self._locks_guard:
+            self._locks.pop(collection_name, None)
+
+    async def flush(self):
+        """将所有待落盘的索引立即写入磁盘"""
+        for collection_name in list(self._save_handles):
+            await self.save(collection_name)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取索引统计"""
+        return {
+            "loaded_collections": len(self._indexes),
+            "chunks": sum(len(index) for index in self._indexes.values()),
+            "terms": sum(len(index.postings) for index in self._indexes.values()),
+            "pending_saves": len(self._save_handles),
+            "pending_operations": sum(len(ops) for ops in self._pending.values()),
+            "merges": self.merges
+        }
+
+
+# 全局实例
+keyword_index_manager = KeywordIndexManager()
@@ -0,0 +1,367 @@
+"""
+检索缓存
+提供带 TTL 的 LRU 缓存、查询向量缓存（可选 Redis 二级缓存）以及检索结果缓存
+"""
+import hashlib
+import re
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set
+
+from app.core.config import settings
+from app.core.logger import logger
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：全半角统一、去除首尾空白、合并连续空白、转小写"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def estimate_size(obj: Any) -> int:
+    """粗略估算对象占用的内存（字节），递归统计容器中的元素"""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(estimate_size(item) for item in obj)
+    return size
+
+
+class LRUCache:
+    """
+    带 TTL 的线程安全 LRU 缓存
+
+    提供 size_fn 时按其估算每个条目的内存占用，超过 max_bytes
+    也会淘汰最久未使用的条目。
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: Optional[float] = None,
+        size_fn: Optional[Callable[[Any], int]] = None,
+        max_bytes: Optional[int] = None
+    ):
+        self.max_size = max(1, max_size)
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self.size_fn = size_fn
+        self.max_bytes = max_bytes if size_fn and max_bytes else None
+
+        # key -> (过期时间, 值, 估算字节数)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """读取缓存，未命中或已过期返回 None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value, size = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        size = self.size_fn(value) if self.size_fn else 0
+        with self._lock:
+            previous = self._data.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous[2]
+            self._data[key] = (expires_at, value, size)
+            self.bytes += size
+            while len(self._data) > self.max_size or (
+                self.max_bytes and self.bytes > self.max_bytes and len(self._data) > 1
+            ):
+                _, (_, _, evicted_size) = self._data.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> Optional[Any]:
+        """删除并返回缓存条目"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+            if entry is None:
+                return None
+            self.bytes -= entry[2]
+            return entry[1]
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取命中统计"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            **({"memory_bytes": self.bytes, "max_bytes": self.max_bytes} if self.size_fn else {})
+        }
+
+
+class QueryEmbeddingCache:
+    """
+    查询向量缓存
+
+    缓存键由规范化后的查询文本、Embedding 模型名称和向量维度共同决定，
+    不同模型产生的向量不会互相命中。一级缓存为进程内 LRU，
+    启用 Redis 后作为二级缓存在多个 worker 之间共享。
+    """
+
+    REDIS_PREFIX = "agonx:emb:query:"
+
+    def __init__(
+        self,
+        max_size: int = 2048,
+        ttl: Optional[float] = 3600,
+        use_redis: bool = False
+    ):
+        self.local = LRUCache(max_size=max_size, ttl=ttl)
+        self.ttl = ttl
+        self.use_redis = use_redis
+
+        self._redis = None
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.redis_errors = 0
+
+    @staticmethod
+    def make_key(text: str, model_name: str, dimension: int) -> str:
+        """生成缓存键"""
+        raw = f"{model_name}|{dimension}|{normalize_text(text)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    async def _get_redis(self):
+        """获取 Redis 客户端（懒加载）"""
+        if self._redis is None:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(settings.REDIS_URL)
+        return self._redis
+
+    async def get(self, key: str) -> Optional[List[float]]:
+        """读取查询向量"""
+        vector = self.local.get(key)
+        if vector is not None or not self.use_redis:
+            return vector
+
+        try:
+            client = await self._get_redis()
+            raw = await client.get(self.REDIS_PREFIX + key)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"读取 Redis 查询向量缓存失败: {str(e)}")
+            return None
+
+        if raw is None:
+            self.redis_misses += 1
+            return None
+
+        self.redis_hits += 1
+        vector = array("f", raw).tolist()
+        self.local.set(key, vector)
+        return vector
+
+    async def set(self, key: str, vector: List[float]):
+        """写入查询向量"""
+        self.local.set(key, vector)
+        if not self.use_redis:
+            return
+
+        try:
+            client = await self._get_redis()
+            ttl = int(self.ttl) if self.ttl else None
+            await client.set(self.REDIS_PREFIX + key, array("f", vector).tobytes(), ex=ttl)
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"写入 Redis 查询向量缓存失败: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        stats = self.local.stats()
+        stats["redis_enabled"] = self.use_redis
+        if self.use_redis:
+            stats["redis_hits"] = self.redis_hits
+            stats["redis_misses"] = self.redis_misses
+            stats["redis_errors"] = self.redis_errors
+        return stats
+
+
+class SearchResultCache:
+    """
+    检索结果缓存
+
+    缓存键由知识库 ID、知识库版本号和检索参数（规范化查询、top_k、阈值、
+    检索模式）组成。上传、删除文档或修改检索配置时递增版本号，旧版本的
+    缓存条目不再命中，随 LRU/TTL 自然淘汰。启用 Redis 后版本号保存在
+    Redis 中，多个 worker 之间的失效同步生效。
+
+    未启用 Redis 时版本号只在本进程内有效，其他 worker 上的修改不会使本进程的
+    缓存失效；因此多 worker 部署且未启用 Redis 时结果缓存自动关闭。
+    """
+
+    REDIS_VERSION_PREFIX = "agonx:kb:version:"
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: Optional[float] = 300,
+        max_bytes: Optional[int] = None,
+        use_redis: bool = False,
+        enabled: bool = True,
+        workers: int = 1
+    ):
+        self.results = LRUCache(max_size=max_size, ttl=ttl, size_fn=estimate_size, max_bytes=max_bytes)
+        self.use_redis = use_redis
+        self.enabled = enabled and (use_redis or workers <= 1)
+        if enabled and not self.enabled:
+            logger.warning(
+                f"检索结果缓存已关闭：{workers} 个 worker 但未启用 Redis 版本号"
+                f"（knowledge.search_cache_redis），各 worker 的缓存无法同步失效"
+            )
+
+        self._versions: Dict[str, int] = {}
+        # Redis 递增失败的知识库：递增成功前不使用缓存，避免读到旧版本的结果
+        self._unsynced: Set[str] = set()
+        self._redis = None
+        self.redis_errors = 0
+
+    async def _get_redis(self):
+        """获取 Redis 客户端（懒加载）"""
+        if self._redis is None:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(settings.REDIS_URL)
+        return self._redis
+
+    async def version(self, kb_id: str) -> Optional[int]:
+        """获取知识库当前版本号（缓存关闭或 Redis 不可用时返回 None，此时不使用缓存）"""
+        if not self.enabled:
+            return None
+        if not self.use_redis:
+            return self._versions.get(kb_id, 0)
+        if kb_id in self._unsynced and not await self._incr(kb_id):
+            return None
+        try:
+            client = await self._get_redis()
+            raw = await client.get(self.REDIS_VERSION_PREFIX + kb_id)
+            return int(raw) if raw is not None else 0
+        except Exception as e:
+            self.redis_errors += 1
+            logger.warning(f"读取知识库版本号失败: {str(e)}")
+            return None
+
+    async def bump_version(self, kb_id: str):
+        """
+        递增知识库版本号，使该知识库的全部缓存结果失效
+
+        Redis 递增失败时，本进程在之后的 version() 中重试递增，成功前该知识库不使用缓存。
+        """
+        self._versions[kb_id] = self._versions.get(kb_id, 0) + 1
+        if self.use_redis:
+            await self._incr(kb_id)
+
+    async def _incr(self, kb_id: str) -> bool:
+        try:
+            client = await self._get_redis()
+            await client.incr(self.REDIS_VERSION_PREFIX + kb_id)
+        except Exception as e:
+            self.redis_errors += 1
+            self._unsynced.add(kb_id)
+            logger.warning(f"递增知识库版本号失败，递增成功前不使用该知识库的检索缓存: {str(e)}")
+            return False
+        self._unsynced.discard(kb_id)
+        return True
+
+    @staticmethod
+    def make_key(kb_id: str, version: int, query: str, top_k: int, threshold: float, mode: str) -> tuple:
+        """生成缓存键"""
+        return (kb_id, version, normalize_text(query), top_k, round(float(threshold), 6), mode)
+
+    async def get(
+        self,
+        kb_id: str,
+        query: str,
+        top_k: int,
+        threshold: float,
+        mode: str,
+        version: Optional[int] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """读取缓存的检索结果（version 为 version() 的返回值，为 None 时不命中）"""
+        if version is None:
+            return None
+        return self.results.get(self.make_key(kb_id, version, query, top_k, threshold, mode))
+
+    async def set(
+        self,
+        kb_id: str,
+        query: str,
+        top_k: int,
+        threshold: float,
+        mode: str,
+        results: List[Dict[str, Any]],
+        version: Optional[int] = None
+    ):
+        """
+        写入检索结果
+
+        version 应为检索开始前读取的版本号，避免检索期间知识库被修改时
+        把旧数据写到新版本下。
+        """
+        if version is None:
+            return
+        self.results.set(self.make_key(kb_id, version, query, top_k, threshold, mode), results)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        stats = self.results.stats()
+        stats["enabled"] = self.enabled
+        stats["redis_enabled"] = self.use_redis
+        stats["tracked_knowledge_bases"] = len(self._versions)
+        if self.use_redis:
+            stats["redis_errors"] = self.redis_errors
+            stats["unsynced_knowledge_bases"] = len(self._unsynced)
+        return stats
+
+
+# 全局实例
+search_result_cache = SearchResultCache(
+    max_size=settings.SEARCH_CACHE_SIZE,
+    ttl=settings.SEARCH_CACHE_TTL,
+    max_bytes=settings.SEARCH_CACHE_MAX_MB * 1024 * 1024,
+    use_redis=settings.SEARCH_CACHE_REDIS,
+    enabled=settings.SEARCH_CACHE_ENABLED,
+    workers=settings.WORKERS
+)
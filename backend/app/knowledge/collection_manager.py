@@ -0,0 +1,222 @@
+"""
+Milvus 集合管理器
+缓存集合句柄、跟踪加载状态，按 LRU 释放空闲集合
+"""
+import json
+import os
+import threading
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from pymilvus import Collection
+
+from app.core.config import settings
+from app.core.logger import logger
+
+T = TypeVar("T")
+
+
+class CollectionManager:
+    """
+    集合句柄与加载状态管理
+
+    - 句柄按 (连接别名, 集合名) 缓存，避免每次检索都 describe 集合
+    - 已加载的集合只 load 一次，超过上限时释放最久未使用的集合（正在使用的集合不释放）
+    - 记录各集合的使用次数，供下次启动时预加载热门知识库
+    """
+
+    def __init__(
+        self,
+        max_loaded: int = 64,
+        alias: str = "default",
+        usage_file: Optional[str] = None
+    ):
+        self.max_loaded = max(1, max_loaded)
+        self.alias = alias
+        self.usage_file = Path(usage_file) if usage_file else None
+
+        self._handles: Dict[Tuple[str, str], Collection] = {}
+        # 已加载集合，按最近使用顺序排列（末尾为最近使用）
+        self._loaded: "OrderedDict[str, None]" = OrderedDict()
+        self._usage: Counter = Counter()
+        self._lock = threading.RLock()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        # 正在使用的集合（集合名 -> 使用数），LRU 不会释放
+        self._pins: Counter = Counter()
+
+        self.loads = 0
+        self.releases = 0
+
+    def get(self, collection_name: str, load: bool = True, using: str = None) -> Collection:
+        """
+        获取集合句柄
+
+        Args:
+            collection_name: 集合名称
+            load: 是否确保集合已加载到内存（检索前需要）
+            using: Milvus 连接别名，默认使用管理器的别名
+        """
+        using = using or self.alias
+        with self._lock:
+            handle = self._handles.get((using, collection_name))
+            if handle is None:
+                handle = Collection(collection_name, using=using)
+                self._handles[(using, collection_name)] = handle
+            if not load:
+                return handle
+
+            self._usage[collection_name] += 1
+            if collection_name in self._loaded:
+                self._loaded.move_to_end(collection_name)
+                return handle
+            load_lock = self._load_locks.setdefault(collection_name, threading.Lock())
+
+        # 加载可能耗时较长，只锁定当前集合，不阻塞其他集合的检索
+        with load_lock:
+            if collection_name not in self._loaded:
+                logger.info(f"加载 Milvus Collection: {collection_name}")
+                handle.load()
+                with self._lock:
+                    self.loads += 1
+                    self._loaded[collection_name] = None
+                    self._release_lru(keep=collection_name)
+
+        return handle
+
+    def use(self, collection_name: str, fn: Callable[[Collection], T], using: str = None) -> T:
+        """
+        在已加载的集合上执行操作
+
+        执行期间固定集合，不会被本进程的 LRU 释放；集合被其他进程释放
+        （或 Milvus 重启）报告未加载时，重新加载后重试一次。
+        """
+        from pymilvus import MilvusException
+
+        self.pin(collection_name)
+        try:
+            try:
+                return fn(self.get(collection_name, using=using))
+            except MilvusException as e:
+                if "not loaded" not in str(e).lower():
+                    raise
+                logger.warning(f"Collection 未加载，重新加载后重试: {collection_name}")
+                self.mark_unloaded(collection_name)
+                return fn(self.get(collection_name, using=using))
+        finally:
+            self.unpin(collection_name)
+
+    def pin(self, collection_name: str):
+        """固定集合（跨多次调用的操作，如分批遍历）"""
+        with self._lock:
+            self._pins[collection_name] += 1
+
+    def unpin(self, collection_name: str):
+        with self._lock:
+            self._pins[collection_name] -= 1
+            if self._pins[collection_name] <= 0:
+                del self._pins[collection_name]
+                # 固定期间超出上限的集合在这里补充释放
+                self._release_lru()
+
+    def register(self, collection_name: str, handle: Collection, using: str = None):
+        """登记新建集合的句柄"""
+        with self._lock:
+            self._handles[(using or self.alias, collection_name)] = handle
+
+    def _release_lru(self, keep: Optional[str] = None):
+        """释放超出上限的最久未使用集合（跳过正在使用和刚加载的集合）"""
+        for collection_name in list(self._loaded):
+            if len(self._loaded) <= self.max_loaded:
+                break
+            if collection_name == keep or self._pins.get(collection_name):
+                continue
+            del self._loaded[collection_name]
+            handle = next(
+                (h for (_, name), h in self._handles.items() if name == collection_name),
+                None
+            )
+            if handle is None:
+                continue
+            try:
+                handle.release()
+                self.releases += 1
+                logger.info(f"释放空闲 Milvus Collection: {collection_name}")
+            except Exception as e:
+                logger.warning(f"释放 Milvus Collection 失败 ({collection_name}): {str(e)}")
+
+    def is_loaded(self, collection_name: str) -> bool:
+        """集合是否已由本进程加载"""
+        return collection_name in self._loaded
+
+    def mark_unloaded(self, collection_name: str):
+        """标记集合未加载（例如被其他进程释放或 Milvus 重启后）"""
+        with self._lock:
+            self._loaded.pop(collection_name, None)
+
+    def invalidate(self, collection_name: str):
+        """移除集合的句柄与状态（删除集合时调用）"""
+        with self._lock:
+            for key in [key for key in self._handles if key[1] == collection_name]:
+                del self._handles[key]
+            self._loaded.pop(collection_name, None)
+            self._usage.pop(collection_name, None)
+            self._load_locks.pop(collection_name, None)
+
+    def most_used(self, limit: int) -> List[str]:
+        """按使用次数返回最常用的集合"""
+        with self._lock:
+            return [name for name, _ in self._usage.most_common(limit)]
+
+    def preload(self, collection_names: List[str], using: str = None) -> int:
+        """预加载集合，返回成功数量"""
+        loaded = 0
+        for collection_name in collection_names[:self.max_loaded]:
+            try:
+                self.get(collection_name, using=using)
+                loaded += 1
+            except Exception as e:
+                logger.warning(f"预加载 Milvus Collection 失败 ({collection_name}): {str(e)}")
+        return loaded
+
+    def load_usage(self):
+        """从文件恢复使用次数"""
+        if not self.usage_file or not self.usage_file.exists():
+            return
+        try:
+            with open(self.usage_file, "r", encoding="utf-8") as f:
+                self._usage.update(json.load(f))
+        except Exception as e:
+            logger.warning(f"读取集合使用统计失败: {str(e)}")
+
+    def save_usage(self):
+        """将使用次数写入文件"""
+        if not self.usage_file:
+            return
+        try:
+            self.usage_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.usage_file.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(dict(self._usage), f)
+            os.replace(tmp_path, self.usage_file)
+        except Exception as e:
+            logger.warning(f"保存集合使用统计失败: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """获取管理器统计"""
+        with self._lock:
+            return {
+                "cached_handles": len(self._handles),
+                "loaded_collections": len(self._loaded),
+                "max_loaded": self.max_loaded,
+                "pinned_collections": len(self._pins),
+                "loads": self.loads,
+                "releases": self.releases
+            }
+
+
+# 全局实例
+collection_manager = CollectionManager(
+    max_loaded=settings.MILVUS_MAX_LOADED_COLLECTIONS,
+    usage_file=settings.MILVUS_USAGE_STATS_FILE
+)
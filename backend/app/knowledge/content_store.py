@@ -0,0 +1,312 @@
+"""
+内容寻址的分块向量存储
+以“规范化分块文本 + 模型 + 维度”的哈希为键保存文档向量，重复上传的文档、
+跨文档重复的模板段落只需编码一次；重新导入未修改的语料几乎不占用模型时间。
+"""
+import asyncio
+import hashlib
+import os
+import pickle
+import re
+import threading
+import unicodedata
+from abc import ABC, abstractmethod
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logger import logger
+
+KEY_SIZE = 20
+
+
+def content_key(text: str, model_name: str, dimension: int) -> bytes:
+    """
+    生成分块内容键（20 字节 SHA-1）
+
+    只统一全半角和空白，不转小写（大小写会影响文档向量，与查询缓存的规范化不同）。
+    """
+    normalized = re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text or "")).strip()
+    return hashlib.sha1(f"{model_name}|{dimension}|{normalized}".encode("utf-8")).digest()
+
+
+class ContentEmbeddingStore(ABC):
+    """内容寻址向量存储接口"""
+
+    backend = "none"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @abstractmethod
+    async def get_many(self, keys: List[bytes], model_id: str, dimension: int) -> List[Optional[List[float]]]:
+        """批量查询，未命中的位置为 None（model_id 与 dimension 须与生成键时一致）"""
+
+    @abstractmethod
+    async def put_many(self, keys: List[bytes], vectors: List[List[float]], model_id: str, dimension: int):
+        """批量写入（已存在的键忽略）"""
+
+    async def close(self):
+        pass
+
+    def _count(self, results: List[Optional[List[float]]]):
+        hits = sum(1 for vector in results if vector is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "writes": self.writes
+        }
+
+
+class MmapContentEmbeddingStore(ContentEmbeddingStore):
+    """
+    内存映射文件存储（单进程）
+
+    行号和键索引只保存在本进程内，多个进程同时追加会写入相同的行，
+    因此多 worker 部署时不会创建（见 create_content_store）。
+
+    每个 (模型, 维度) 一个目录：
+    - vectors.npy: (容量, 维度) float32 内存映射文件，写满后容量翻倍
+    - keys.npy: (容量, 20) uint8 键，打开时载入为 键 -> 行号 字典
+    - meta.pkl: 已写入行数
+    达到 max_entries 后不再写入新向量（已有向量仍可命中）。
+    """
+
+    backend = "mmap"
+    VERSION = 1
+    INITIAL_CAPACITY = 4096
+
+    def __init__(self, data_dir: str = None, max_entries: int = None):
+        super().__init__()
+        self.data_dir = Path(data_dir or settings.EMBEDDING_CONTENT_STORE_DIR)
+        self.max_entries = max_entries or settings.EMBEDDING_CONTENT_STORE_MAX_ENTRIES
+        self.lock = threading.Lock()
+        self._namespaces: Dict[str, Dict[str, Any]] = {}
+        self._full_logged = False
+
+    def _namespace_path(self, model_name: str, dimension: int) -> Path:
+        slug = re.sub(r"[^A-Za-z0-9_.-]", "_", model_name)
+        return self.data_dir / f"{slug}_{dimension}"
+
+    def _open(self, model_name: str, dimension: int) -> Dict[str, Any]:
+        path = self._namespace_path(model_name, dimension)
+        namespace = self._namespaces.get(str(path))
+        if namespace is not None:
+            return namespace
+
+        meta_path = path / "meta.pkl"
+        if meta_path.exists():
+            with open(meta_path, "rb") as f:
+                meta = pickle.load(f)
+            if meta.get("version") != self.VERSION or meta.get("dimension") != dimension:
+                raise ValueError(f"分块向量存储版本或维度不匹配: {path}")
+            vectors = np.load(path / "vectors.npy", mmap_mode="r+")
+            keys = np.load(path / "keys.npy", mmap_mode="r+")
+            size = meta["size"]
+            logger.info(f"💾 已打开分块向量存储: {path}（{size} 条）")
+        else:
+            path.mkdir(parents=True, exist_ok=True)
+            vectors = np.lib.format.open_memmap(
+                path / "vectors.npy", mode="w+", dtype=np.float32,
+                shape=(self.INITIAL_CAPACITY, dimension)
+            )
+            keys = np.lib.format.open_memmap(
+                path / "keys.npy", mode="w+", dtype=np.uint8, shape=(self.INITIAL_CAPACITY, KEY_SIZE)
+            )
+            size = 0
+
+        namespace = {
+            "path": path,
+            "dimension": dimension,
+            "vectors": vectors,
+            "keys": keys,
+            "size": size,
+            "index": {keys[i].tobytes(): i for i in range(size)}
+        }
+        self._namespaces[str(path)] = namespace
+        return namespace
+
+    @staticmethod
+    def _grow(namespace: Dict[str, Any], required: int):
+        """扩容向量和键文件（容量翻倍直到满足需求）"""
+        capacity = len(namespace["keys"])
+        if required <= capacity:
+            return
+        while capacity < required:
+            capacity *= 2
+
+        path, size = namespace["path"], namespace["size"]
+        for name, shape, dtype in (
+            ("vectors", (capacity, namespace["dimension"]), np.float32),
+            ("keys", (capacity, KEY_SIZE), np.uint8)
+        ):
+            tmp_path = path / f"{name}.tmp.npy"
+            grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=dtype, shape=shape)
+            grown[:size] = namespace[name][:size]
+            grown.flush()
+            del grown
+            # 释放旧映射后再替换文件
+            namespace[name].flush()
+            namespace[name] = None
+            os.replace(tmp_path, path / f"{name}.npy")
+            namespace[name] = np.load(path / f"{name}.npy", mmap_mode="r+")
+
+    @staticmethod
+    def _save(namespace: Dict[str, Any]):
+        namespace["vectors"].flush()
+        namespace["keys"].flush()
+        meta_path = namespace["path"] / "meta.pkl"
+        tmp_path = meta_path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump({
+                "version": MmapContentEmbeddingStore.VERSION,
+                "dimension": namespace["dimension"],
+                "size": namespace["size"]
+            }, f)
+        os.replace(tmp_path, meta_path)
+
+    def _get_many_sync(self, keys: List[bytes], model_id: str, dimension: int) -> List[Optional[List[float]]]:
+        with self.lock:
+            namespace = self._open(model_id, dimension)
+            index, vectors = namespace["index"], namespace["vectors"]
+            results = []
+            for key in keys:
+                row = index.get(key)
+                results.append(None if row is None else vectors[row].tolist())
+            return results
+
+    def _put_many_sync(self, keys: List[bytes], vectors: List[List[float]], model_id: str, dimension: int) -> int:
+        with self.lock:
+            namespace = self._open(model_id, dimension)
+            index = namespace["index"]
+            new: Dict[bytes, List[float]] = {}
+            for key, vector in zip(keys, vectors):
+                if key not in index and key not in new:
+                    new[key] = vector
+            room = self.max_entries - namespace["size"]
+            if len(new) > room:
+                if not self._full_logged:
+                    logger.warning(f"分块向量存储已达上限 ({self.max_entries} 条)，不再写入新向量")
+                    self._full_logged = True
+                new = dict(list(new.items())[:max(room, 0)])
+            if not new:
+                return 0
+
+            start = namespace["size"]
+            self._grow(namespace, start + len(new))
+            namespace["vectors"][start:start + len(new)] = np.asarray(list(new.values()), dtype=np.float32)
+            namespace["keys"][start:start + len(new)] = np.frombuffer(b"".join(new), dtype=np.uint8).reshape(-1, KEY_SIZE)
+            for offset, key in enumerate(new):
+                index[key] = start + offset
+            namespace["size"] = start + len(new)
+            self._save(namespace)
+            return len(new)
+
+    async def get_many(self, keys: List[bytes], model_id: str, dimension: int) -> List[Optional[List[float]]]:
+        if not keys:
+            return []
+        results = await asyncio.to_thread(self._get_many_sync, keys, model_id, dimension)
+        self._count(results)
+        return results
+
+    async def put_many(self, keys: List[bytes], vectors: List[List[float]], model_id: str, dimension: int):
+        if keys:
+            self.writes += await asyncio.to_thread(self._put_many_sync, keys, vectors, model_id, dimension)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **super().stats(),
+            "entries": {
+                namespace["path"].name: namespace["size"] for namespace in self._namespaces.values()
+            },
+            "max_entries": self.max_entries
+        }
+
+
+class RedisContentEmbeddingStore(ContentEmbeddingStore):
+    """Redis 存储（多个 worker 共享），每个键一条 float32 二进制值"""
+
+    backend = "redis"
+    REDIS_PREFIX = "agonx:emb:chunk:"
+
+    def __init__(self):
+        super().__init__()
+        self._redis = None
+        self.errors = 0
+
+    async def _get_redis(self):
+        if self._redis is None:
+            import redis.asyncio as redis
+            self._redis = redis.from_url(settings.REDIS_URL)
+        return self._redis
+
+    async def get_many(self, keys: List[bytes], model_id: str, dimension: int) -> List[Optional[List[float]]]:
+        if not keys:
+            return []
+        try:
+            client = await self._get_redis()
+            raws = await client.mget([self.REDIS_PREFIX + key.hex() for key in keys])
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"读取 Redis 分块向量失败: {str(e)}")
+            raws = [None] * len(keys)
+        results = [None if raw is None else array("f", raw).tolist() for raw in raws]
+        self._count(results)
+        return results
+
+    async def put_many(self, keys: List[bytes], vectors: List[List[float]], model_id: str, dimension: int):
+        if not keys:
+            return
+        try:
+            client = await self._get_redis()
+            async with client.pipeline(transaction=False) as pipe:
+                for key, vector in zip(keys, vectors):
+                    pipe.set(self.REDIS_PREFIX + key.hex(), array("f", vector).tobytes(), nx=True)
+                await pipe.execute()
+            self.writes += len(keys)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"写入 Redis 分块向量失败: {str(e)}")
+
+    async def close(self):
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "errors": self.errors}
+
+
+def create_content_store(backend: str = None, workers: int = None) -> Optional[ContentEmbeddingStore]:
+    """根据配置创建分块向量存储（未启用，或多 worker 部署使用 mmap 后端时返回 None）"""
+    if not settings.EMBEDDING_CONTENT_STORE_ENABLED:
+        return None
+    backend = (backend or settings.EMBEDDING_CONTENT_STORE_BACKEND).lower()
+    workers = settings.WORKERS if workers is None else workers
+    if backend == "redis":
+        return RedisContentEmbeddingStore()
+    if backend == "mmap":
+        if workers > 1:
+            logger.warning(
+                f"分块向量存储已关闭：{workers} 个 worker 不能共享 mmap 后端"
+                f"（embedding.content_store.backend 改为 redis 可在 worker 之间共享）"
+            )
+            return None
+        return MmapContentEmbeddingStore()
+    raise ValueError(f"未知的分块向量存储后端: {backend}（可选 mmap / redis）")
+
+
+# 全局实例
+content_embedding_store = create_content_store()
@@ -0,0 +1,698 @@
+"""
+嵌入式向量存储
+每个集合的向量保存在内存映射的 NumPy 文件中，暴力余弦检索，
+适合小知识库和无 Milvus 的本地开发/测试环境
+"""
+import asyncio
+import os
+import pickle
+import threading
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.knowledge.index_profiles import BINARY_METRIC_TYPE, get_index_profile
+from app.knowledge.vector_store import (
+    PARTITION_KEY_FIELD, SPARSE_FIELD, VectorStore, MilvusVectorStore, compile_filter, sparse_dot
+)
+
+
+class _EmbeddedCollection:
+    """
+    单个嵌入式集合
+
+    - vectors.npy: 形状为 (容量, 维度) 的 float32 内存映射文件，写满后按倍数扩容
+    - meta.pkl: 分块内容、元数据、主键、删除标记（稀疏集合还包含各行的稀疏向量）
+    向量写入时即归一化，检索时内积即余弦相似度。
+    """
+
+    VERSION = 1
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self, path: Path, dimension: int, index_params: Dict[str, Any] = None, sparse: bool = False):
+        self.path = path
+        self.dimension = dimension
+        self.index_params = index_params or {}
+        self.sparse = sparse
+        self.lock = threading.RLock()
+
+        self.size = 0
+        self.next_id = 1
+        self.rows: List[Dict[str, Any]] = []
+        self.positions: Dict[str, int] = {}
+        self.alive = np.zeros(0, dtype=bool)
+        self.vectors: Optional[np.memmap] = None
+
+    @property
+    def vectors_path(self) -> Path:
+        return self.path / "vectors.npy"
+
+    @property
+    def meta_path(self) -> Path:
+        return self.path / "meta.pkl"
+
+    @property
+    def count(self) -> int:
+        return int(self.alive[:self.size].sum())
+
+    def create(self):
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.vectors = np.lib.format.open_memmap(
+            self.vectors_path, mode="w+", dtype=np.float32,
+            shape=(self.INITIAL_CAPACITY, self.dimension)
+        )
+        self.alive = np.zeros(self.INITIAL_CAPACITY, dtype=bool)
+        self.save()
+
+    @classmethod
+    def open(cls, path: Path) -> "_EmbeddedCollection":
+        with open(path / "meta.pkl", "rb") as f:
+            meta = pickle.load(f)
+        if meta.get("version") != cls.VERSION:
+            raise ValueError(f"嵌入式集合版本不匹配: {path}")
+        collection = cls(path, meta["dimension"], meta["index_params"], meta.get("sparse", False))
+        collection.size = meta["size"]
+        collection.next_id = meta["next_id"]
+        collection.rows = meta["rows"]
+        collection.positions = {row["id"]: i for i, row in enumerate(collection.rows)}
+        collection.vectors = np.load(collection.vectors_path, mmap_mode="r+")
+        collection.alive = np.zeros(len(collection.vectors), dtype=bool)
+        collection.alive[:collection.size] = meta["alive"]
+        return collection
+
+    def save(self):
+        """落盘：刷新向量文件，原子写入元数据"""
+        with self.lock:
+            if self.vectors is not None:
+                self.vectors.flush()
+            meta = {
+                "version": self.VERSION,
+                "dimension": self.dimension,
+                "index_params": self.index_params,
+                "sparse": self.sparse,
+                "size": self.size,
+                "next_id": self.next_id,
+                "rows": self.rows,
+                "alive": self.alive[:self.size].copy()
+            }
+            tmp_path = self.meta_path.with_suffix(".tmp")
+            with open(tmp_path, "wb") as f:
+                pickle.dump(meta, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.meta_path)
+
+    def _grow(self, required: int):
+        """扩容向量文件（容量翻倍直到满足需求）"""
+        capacity = len(self.vectors)
+        if required <= capacity:
+            return
+        while capacity < required:
+            capacity *= 2
+
+        tmp_path = self.path / "vectors.tmp.npy"
+        grown = np.lib.format.open_memmap(
+            tmp_path, mode="w+", dtype=np.float32, shape=(capacity, self.dimension)
+        )
+        grown[:self.size] = self.vectors[:self.size]
+        grown.flush()
+        del grown
+        # 释放旧映射后再替换文件
+        self.vectors.flush()
+        self.vectors = None
+        os.replace(tmp_path, self.vectors_path)
+        self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.size] = self.alive[:self.size]
+        self.alive = alive
+
+    def insert(self, rows: List[Dict[str, Any]]) -> List[str]:
+        """写入分块，行中带 id 时沿用（如冷存储使用 Milvus 主键），否则自增分配"""
+        with self.lock:
+            matrix = np.asarray([row["embedding"] for row in rows], dtype=np.float32)
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1.0, norms)
+
+            start = self.size
+            self._grow(start + len(rows))
+            self.vectors[start:start + len(rows)] = matrix
+            self.alive[start:start + len(rows)] = True
+
+            ids = []
+            for row in rows:
+                if row.get("id") is not None:
+                    row_id = str(row["id"])
+                else:
+                    row_id = str(self.next_id)
+                    self.next_id += 1
+                self.positions[row_id] = len(self.rows)
+                stored = {
+                    "id": row_id,
+                    "content": row["content"],
+                    "metadata": row.get("metadata") or {},
+                    "source": row.get("source", "")
+                }
+                if self.sparse:
+                    stored[SPARSE_FIELD] = dict(row.get(SPARSE_FIELD) or {})
+                self.rows.append(stored)
+                ids.append(row_id)
+            self.size += len(rows)
+            return ids
+
+    def search(
+        self,
+        vectors: List[List[float]],
+        top_k: int,
+        filter_expr: Optional[str] = None,
+        min_score: Optional[float] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """暴力检索（min_score 不为空时只组装不低于该分数的命中）"""
+        with self.lock:
+            mask = self.alive[:self.size].copy()
+            if filter_expr:
+                predicate = compile_filter(filter_expr)
+                mask &= np.fromiter((predicate(row) for row in self.rows), dtype=bool, count=self.size)
+
+            positions = np.flatnonzero(mask)
+            if not len(positions) or top_k <= 0:
+                return [[] for _ in vectors]
+
+            queries = np.asarray(vectors, dtype=np.float32)
+            norms = np.linalg.norm(queries, axis=1, keepdims=True)
+            queries /= np.where(norms == 0, 1.0, norms)
+
+            # 全部存活时直接使用内存映射切片，避免复制整个矩阵
+            if len(positions) == self.size:
+                scores = queries @ self.vectors[:self.size].T
+            else:
+                scores = queries @ self.vectors[positions].T
+
+            k = min(top_k, len(positions))
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+            results = []
+            for query_scores, query_top in zip(scores, top):
+                ordered = query_top[np.argsort(-query_scores[query_top])]
+                if min_score is not None:
+                    ordered = ordered[query_scores[ordered] >= min_score]
+                results.append([
+                    {
+                        key: self.rows[positions[i]][key] for key in ("id", "content", "metadata", "source")
+                    } | {"score": float(query_scores[i])}
+                    for i in ordered
+                ])
+            return results
+
+    def sparse_search(
+        self,
+        sparse_vectors: List[Dict[int, float]],
+        top_k: int,
+        filter_expr: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        with self.lock:
+            if not self.sparse:
+                raise ValueError(f"集合没有稀疏向量字段: {self.path.name}")
+            predicate = compile_filter(filter_expr)
+            rows = [row for i, row in enumerate(self.rows) if self.alive[i] and predicate(row)]
+            results = []
+            for sparse_vector in sparse_vectors:
+                scored = sorted(
+                    ((sparse_dot(sparse_vector, row[SPARSE_FIELD]), row) for row in rows),
+                    key=lambda item: item[0],
+                    reverse=True
+                )[:top_k]
+                results.append([
+                    {key: row[key] for key in ("id", "content", "metadata", "source")} | {"score": score}
+                    for score, row in scored if score > 0
+                ])
+            return results
+
+    def delete(self, filter_expr: str) -> int:
+        with self.lock:
+            predicate = compile_filter(filter_expr)
+            deleted = 0
+            for position, row in enumerate(self.rows):
+                if self.alive[position] and predicate(row):
+                    self.alive[position] = False
+                    deleted += 1
+            return deleted
+
+    def compact(self) -> int:
+        """去掉已删除的行（存活行的向量前移，主键不变），返回回收的行数"""
+        with self.lock:
+            keep = np.flatnonzero(self.alive[:self.size])
+            removed = self.size - len(keep)
+            if not removed:
+                return 0
+            self.vectors[:len(keep)] = self.vectors[keep]
+            self.rows = [self.rows[i] for i in keep]
+            self.alive[:] = False
+            self.alive[:len(keep)] = True
+            self.size = len(keep)
+            self.positions = {row["id"]: i for i, row in enumerate(self.rows)}
+            self.save()
+            return removed
+
+    def fetch(self, ids: List[str]) -> Dict[str, np.ndarray]:
+        """按主键读取归一化后的向量（已删除或不存在的主键被忽略）"""
+        with self.lock:
+            found = {}
+            for row_id in ids:
+                position = self.positions.get(str(row_id))
+                if position is not None and self.alive[position]:
+                    found[str(row_id)] = np.array(self.vectors[position])
+            return found
+
+    def remap_ids(self, mapping: Dict[str, str]) -> int:
+        """替换主键（对应集合迁移后主键变化），返回更新的行数"""
+        with self.lock:
+            updated = 0
+            for row in self.rows:
+                new_id = mapping.get(row["id"])
+                if new_id is not None:
+                    row["id"] = str(new_id)
+                    updated += 1
+            if updated:
+                self.positions = {row["id"]: i for i, row in enumerate(self.rows)}
+            return updated
+
+    def export(self, start: int, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """导出 [start, start + limit) 范围内存活的分块（含向量）"""
+        with self.lock:
+            end = min(self.size, start + limit)
+            return [
+                (self.rows[i]["id"], {**self.rows[i], "embedding": self.vectors[i].tolist()})
+                for i in range(start, end)
+                if self.alive[i]
+            ]
+
+    def sample(self, limit: int) -> List[Tuple[str, List[float]]]:
+        with self.lock:
+            positions = np.flatnonzero(self.alive[:self.size])
+            if len(positions) > limit:
+                positions = np.random.choice(positions, limit, replace=False)
+            return [(self.rows[i]["id"], self.vectors[i].tolist()) for i in positions]
+
+    def close(self):
+        with self.lock:
+            if self.vectors is not None:
+                self.vectors.flush()
+                self.vectors = None
+
+
+class EmbeddedVectorStore(VectorStore):
+    """
+    嵌入式向量存储
+
+    进程内暴力检索，数万条向量以内延迟与 Milvus 相当且没有网络往返。
+    集合在首次访问时打开，文件保存在 data_dir/{集合名}/ 下。
+    """
+
+    def __init__(self, data_dir: str = None):
+        self.data_dir = Path(data_dir or settings.EMBEDDED_STORE_DIR)
+        self._collections: Dict[str, _EmbeddedCollection] = {}
+        self._lock = threading.Lock()
+
+    def contains(self, collection_name: str) -> bool:
+        """集合是否由嵌入式存储管理"""
+        return collection_name in self._collections or (self.data_dir / collection_name / "meta.pkl").exists()
+
+    def _get(self, collection_name: str) -> _EmbeddedCollection:
+        collection = self._collections.get(collection_name)
+        if collection is not None:
+            return collection
+        with self._lock:
+            if collection_name not in self._collections:
+                path = self.data_dir / collection_name
+                if not (path / "meta.pkl").exists():
+                    raise ValueError(f"Collection not found: {collection_name}")
+                self._collections[collection_name] = _EmbeddedCollection.open(path)
+                logger.info(f"嵌入式向量集合已打开: {collection_name}")
+            return self._collections[collection_name]
+
+    def dimension(self, collection_name: str) -> int:
+        return self._get(collection_name).dimension
+
+    def is_sparse(self, collection_name: str) -> bool:
+        return self._get(collection_name).sparse
+
+    async def has_collection(self, collection_name: str) -> bool:
+        return self.contains(collection_name)
+
+    async def create_collection(
+        self,
+        collection_name: str,
+        dimension: int,
+        index_params: Optional[Dict[str, Any]] = None,
+        sparse: bool = False,
+        partition_key: str = PARTITION_KEY_FIELD
+    ):
+        if (index_params or {}).get("metric_type") == BINARY_METRIC_TYPE:
+            raise ValueError("嵌入式向量存储不支持二值向量集合")
+        with self._lock:
+            if collection_name in self._collections or (self.data_dir / collection_name / "meta.pkl").exists():
+                return
+            collection = _EmbeddedCollection(
+                self.data_dir / collection_name,
+                dimension,
+                index_params or get_index_profile(None).index_params(),
+                sparse
+            )
+            collection.create()
+            self._collections[collection_name] = collection
+        logger.info(f"嵌入式向量集合创建成功: {collection_name}")
+
+    async def drop_collection(self, collection_name: str):
+        import shutil
+
+        with self._lock:
+            collection = self._collections.pop(collection_name, None)
+            if collection is not None:
+                collection.close()
+            path = self.data_dir / collection_name
+            if path.exists():
+                shutil.rmtree(path)
+                logger.info(f"嵌入式向量集合已删除: {collection_name}")
+
+    async def insert(self, collection_name: str, rows: List[Dict[str, Any]]) -> List[str]:
+        return await asyncio.to_thread(self._get(collection_name).insert, rows)
+
+    async def flush(self, collection_name: str):
+        await asyncio.to_thread(self._get(collection_name).save)
+
+    async def search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        top_k: int = 10,
+        filter_expr: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        # 暴力检索始终精确，忽略 search_params
+        return await asyncio.to_thread(self._get(collection_name).search, vectors, top_k, filter_expr)
+
+    async def range_search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        radius: float,
+        top_k: int = 10,
+        filter_expr: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        return await asyncio.to_thread(self._get(collection_name).search, vectors, top_k, filter_expr, radius)
+
+    async def sparse_search(
+        self,
+        collection_name: str,
+        sparse_vectors: List[Dict[int, float]],
+        top_k: int = 10,
+        filter_expr: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        return await asyncio.to_thread(
+            self._get(collection_name).sparse_search, sparse_vectors, top_k, filter_expr
+        )
+
+    async def delete(self, collection_name: str, filter_expr: str) -> int:
+        collection = self._get(collection_name)
+        deleted = await asyncio.to_thread(collection.delete, filter_expr)
+        if deleted:
+            await asyncio.to_thread(collection.save)
+        return deleted
+
+    async def count(self, collection_name: str) -> int:
+        return self._get(collection_name).count
+
+    async def compact(self, collection_name: str):
+        removed = await asyncio.to_thread(self._get(collection_name).compact)
+        if removed:
+            logger.info(f"嵌入式向量集合已压缩: {collection_name} (回收 {removed} 行)")
+
+    async def rebuild_index(self, collection_name: str, index_params: Dict[str, Any]):
+        # 只记录索引参数，迁移到 Milvus 时使用
+        collection = self._get(collection_name)
+        collection.index_params = index_params
+        await asyncio.to_thread(collection.save)
+
+    async def describe_index(self, collection_name: str) -> Dict[str, Any]:
+        return self._get(collection_name).index_params
+
+    async def sample_vectors(self, collection_name: str, limit: int) -> List[Tuple[str, List[float]]]:
+        return self._get(collection_name).sample(limit)
+
+    async def fetch_vectors(self, collection_name: str, ids: List[str]) -> Dict[str, np.ndarray]:
+        """按主键读取向量（用于全精度重打分）"""
+        return await asyncio.to_thread(self._get(collection_name).fetch, ids)
+
+    async def remap_ids(self, collection_name: str, mapping: Dict[str, str]):
+        """替换主键并落盘"""
+        collection = self._get(collection_name)
+        if await asyncio.to_thread(collection.remap_ids, mapping):
+            await asyncio.to_thread(collection.save)
+
+    async def export(self, collection_name: str, start: int, limit: int) -> List[Tuple[str, Dict[str, Any]]]:
+        """按位置分批导出集合数据（用于迁移）"""
+        return await asyncio.to_thread(self._get(collection_name).export, start, limit)
+
+    async def scan(
+        self, collection_name: str, batch_size: int = 1000, filter_expr: Optional[str] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        predicate = compile_filter(filter_expr)
+        total = self.capacity_used(collection_name)
+        for start in range(0, total, batch_size):
+            batch = await self.export(collection_name, start, batch_size)
+            rows = [row for _, row in batch if predicate(row)]
+            if rows:
+                yield rows
+
+    async def rename_collection(self, collection_name: str, new_name: str):
+        with self._lock:
+            target = self.data_dir / new_name
+            if new_name in self._collections or target.exists():
+                raise ValueError(f"Collection already exists: {new_name}")
+            collection = self._collections.pop(collection_name, None)
+            if collection is not None:
+                collection.save()
+                collection.close()
+            os.replace(self.data_dir / collection_name, target)
+        logger.info(f"嵌入式向量集合已重命名: {collection_name} -> {new_name}")
+
+    def capacity_used(self, collection_name: str) -> int:
+        """已使用的位置数（含已删除）"""
+        return self._get(collection_name).size
+
+    async def preload(self, collection_names: List[str]) -> int:
+        loaded = 0
+        for collection_name in collection_names:
+            try:
+                self._get(collection_name)
+                loaded += 1
+            except Exception as e:
+                logger.warning(f"打开嵌入式向量集合失败 ({collection_name}): {str(e)}")
+        return loaded
+
+    async def close(self):
+        with self._lock:
+            for collection in self._collections.values():
+                collection.save()
+                collection.close()
+            self._collections.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "embedded",
+            "data_dir": str(self.data_dir),
+            "open_collections": len(self._collections),
+            "vectors": sum(c.count for c in self._collections.values())
+        }
+
+
+class TieredVectorStore(VectorStore):
+    """
+    分层向量存储
+
+    新集合先放在嵌入式存储中；写入后超过 max_vectors 条时自动迁移到
+    Milvus（沿用集合记录的索引参数）。迁移后主键会变化，调用方通过
+    ensure_capacity 的返回值更新引用旧主键的索引。
+    """
+
+    MIGRATION_BATCH_SIZE = 1000
+
+    def __init__(self, embedded: EmbeddedVectorStore, milvus: MilvusVectorStore, max_vectors: int = 20000):
+        self.embedded = embedded
+        self.milvus = milvus
+        self.max_vectors = max_vectors
+        self.migrations = 0
+
+    def _route(self, collection_name: str) -> VectorStore:
+        return self.embedded if self.embedded.contains(collection_name) else self.milvus
+
+    async def connect(self):
+        # Milvus 连接在首次访问 Milvus 集合时建立，本地开发无需 Milvus
+        pass
+
+    async def close(self):
+        await self.embedded.close()
+        await self.milvus.close()
+
+    async def has_collection(self, collection_name: str) -> bool:
+        if self.embedded.contains(collection_name):
+            return True
+        return await self.milvus.has_collection(collection_name)
+
+    async def create_collection(
+        self,
+        collection_name: str,
+        dimension: int,
+        index_params: Optional[Dict[str, Any]] = None,
+        sparse: bool = False,
+        partition_key: str = PARTITION_KEY_FIELD
+    ):
+        # 二值量化集合和共享集合直接放在 Milvus（共享集合迁移会改变其他知识库的主键）
+        if (index_params or {}).get("metric_type") == BINARY_METRIC_TYPE or partition_key != PARTITION_KEY_FIELD:
+            await self.milvus.create_collection(collection_name, dimension, index_params, sparse, partition_key)
+            return
+        await self.embedded.create_collection(collection_name, dimension, index_params, sparse)
+
+    async def drop_collection(self, collection_name: str):
+        if self.embedded.contains(collection_name):
+            await self.embedded.drop_collection(collection_name)
+        else:
+            await self.milvus.drop_collection(collection_name)
+
+    async def ensure_capacity(self, collection_name: str, incoming: int) -> Optional[Dict[str, str]]:
+        if not self.embedded.contains(collection_name):
+            return None
+        if await self.embedded.count(collection_name) + incoming <= self.max_vectors:
+            return None
+        return await self._migrate(collection_name)
+
+    async def _migrate(self, collection_name: str) -> Dict[str, str]:
+        """将集合从嵌入式存储迁移到 Milvus，返回 旧主键 -> 新主键 映射"""
+        logger.info(f"🚚 集合超过 {self.max_vectors} 条向量，迁移到 Milvus: {collection_name}")
+        await self.milvus.create_collection(
+            collection_name,
+            self.embedded.dimension(collection_name),
+            index_params=await self.embedded.describe_index(collection_name),
+            sparse=self.embedded.is_sparse(collection_name)
+        )
+
+        mapping: Dict[str, str] = {}
+        total = self.embedded.capacity_used(collection_name)
+        for start in range(0, total, self.MIGRATION_BATCH_SIZE):
+            batch = await self.embedded.export(collection_name, start, self.MIGRATION_BATCH_SIZE)
+            if not batch:
+                continue
+            new_ids = await self.milvus.insert(collection_name, [row for _, row in batch])
+            mapping.update(zip((old_id for old_id, _ in batch), new_ids))
+        await self.milvus.flush(collection_name)
+        await self.embedded.drop_collection(collection_name)
+
+        self.migrations += 1
+        logger.info(f"✅ 集合迁移完成: {collection_name} ({len(mapping)} 条向量)")
+        return mapping
+
+    async def insert(self, collection_name: str, rows: List[Dict[str, Any]]) -> List[str]:
+        return await self._route(collection_name).insert(collection_name, rows)
+
+    async def flush(self, collection_name: str):
+        await self._route(collection_name).flush(collection_name)
+
+    async def search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        top_k: int = 10,
+        filter_expr: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        return await self._route(collection_name).search(
+            collection_name, vectors, top_k=top_k, filter_expr=filter_expr, search_params=search_params
+        )
+
+    async def range_search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        radius: float,
+        top_k: int = 10,
+        filter_expr: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        return await self._route(collection_name).range_search(
+            collection_name, vectors, radius, top_k=top_k, filter_expr=filter_expr, search_params=search_params
+        )
+
+    async def sparse_search(
+        self,
+        collection_name: str,
+        sparse_vectors: List[Dict[int, float]],
+        top_k: int = 10,
+        filter_expr: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        return await self._route(collection_name).sparse_search(collection_name, sparse_vectors, top_k, filter_expr)
+
+    async def hybrid_search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        sparse_vectors: List[Dict[int, float]],
+        top_k: int = 10,
+        filter_expr: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+        weights: Optional[Tuple[float, float]] = None,
+        candidate_k: Optional[int] = None
+    ) -> List[List[Dict[str, Any]]]:
+        return await self._route(collection_name).hybrid_search(
+            collection_name, vectors, sparse_vectors, top_k=top_k, filter_expr=filter_expr,
+            search_params=search_params, weights=weights, candidate_k=candidate_k
+        )
+
+    async def delete(self, collection_name: str, filter_expr: str) -> int:
+        return await self._route(collection_name).delete(collection_name, filter_expr)
+
+    async def count(self, collection_name: str) -> int:
+        return await self._route(collection_name).count(collection_name)
+
+    async def compact(self, collection_name: str):
+        await self._route(collection_name).compact(collection_name)
+
+    async def document_ids(self, collection_name: str, filter_expr: Optional[str] = None) -> Set[str]:
+        return await self._route(collection_name).document_ids(collection_name, filter_expr)
+
+    async def rebuild_index(self, collection_name: str, index_params: Dict[str, Any]):
+        await self._route(collection_name).rebuild_index(collection_name, index_params)
+
+    async def describe_index(self, collection_name: str) -> Dict[str, Any]:
+        return await self._route(collection_name).describe_index(collection_name)
+
+    async def sample_vectors(self, collection_name: str, limit: int) -> List[Tuple[str, List[float]]]:
+        return await self._route(collection_name).sample_vectors(collection_name, limit)
+
+    async def scan(
+        self, collection_name: str, batch_size: int = 1000, filter_expr: Optional[str] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        async for rows in self._route(collection_name).scan(collection_name, batch_size, filter_expr):
+            yield rows
+
+    async def rename_collection(self, collection_name: str, new_name: str):
+        await self._route(collection_name).rename_collection(collection_name, new_name)
+
+    async def preload(self, collection_names: List[str]) -> int:
+        embedded = [name for name in collection_names if self.embedded.contains(name)]
+        milvus = [name for name in collection_names if name not in embedded]
+        loaded = await self.embedded.preload(embedded)
+        if milvus:
+            loaded += await self.milvus.preload(milvus)
+        return loaded
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "auto",
+            "max_embedded_vectors": self.max_vectors,
+            "migrations": self.migrations,
+            "embedded": self.embedded.stats(),
+            "milvus": self.milvus.stats()
+        }
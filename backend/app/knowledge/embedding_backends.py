@@ -0,0 +1,233 @@
+"""
+Embedding 推理后端
+- torch: SentenceTransformer / BGEM3FlagModel（默认）
+- onnx: 导出并动态 int8 量化后的模型，由 ONNX Runtime 在 CPU 上推理，
+  速度更快、内存更小；导出时记录与 PyTorch 后端的向量一致性
+"""
+import json
+import shutil
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logger import logger
+
+EMBEDDING_BACKENDS = ("torch", "onnx")
+ONNX_METADATA_FILE = "agonx_onnx.json"
+
+
+def embedding_model_id() -> str:
+    """
+    当前 Embedding 模型标识（用于查询缓存和分块向量存储的键）
+
+    int8 模型的向量与全精度模型略有差异，两种后端的向量不互相复用。
+    启用稀疏向量时始终使用 BGEM3FlagModel（torch）。
+    """
+    if settings.EMBEDDING_BACKEND == "onnx" and not settings.EMBEDDING_SPARSE_ENABLED:
+        return f"{settings.EMBEDDING_MODEL}#onnx-int8"
+    return settings.EMBEDDING_MODEL
+
+
+def _pooling_mode(model_dir: Path) -> str:
+    """读取 SentenceTransformer 的池化配置（bge-m3 为 CLS）"""
+    config_path = model_dir / "1_Pooling" / "config.json"
+    if not config_path.exists():
+        return "cls"
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    return "mean" if config.get("pooling_mode_mean_tokens") else "cls"
+
+
+class OnnxEmbeddingModel:
+    """
+    ONNX Runtime 推理的 Embedding 模型
+
+    encode() 与 SentenceTransformer.encode 的常用参数一致，可直接替换。
+    模型目录由 download/export_onnx.py 生成，包含 ONNX 文件、分词器和 agonx_onnx.json。
+    """
+
+    def __init__(self, model_dir: str, threads: int = None, max_length: int = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_dir = Path(model_dir)
+        metadata_path = self.model_dir / ONNX_METADATA_FILE
+        if not metadata_path.exists():
+            raise ValueError(f"ONNX 模型目录缺少 {ONNX_METADATA_FILE}，请先运行 download/export_onnx.py: {model_dir}")
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            self.metadata: Dict[str, Any] = json.load(f)
+
+        self.threads = settings.EMBEDDING_ONNX_THREADS if threads is None else threads
+        self.max_length = max_length or settings.EMBEDDING_ONNX_MAX_LENGTH or self.metadata.get("max_length", 8192)
+        self.pooling = self.metadata.get("pooling", "cls")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads > 0:
+            options.intra_op_num_threads = self.threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            str(self.model_dir / self.metadata["file"]),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {node.name for node in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(str(self.model_dir))
+
+    def encode(
+        self,
+        sentences: List[str],
+        batch_size: int = 32,
+        normalize_embeddings: bool = True,
+        show_progress_bar: bool = False,
+        **kwargs
+    ) -> np.ndarray:
+        """编码文本，返回 (数量, 维度) 的 float32 数组"""
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        outputs = []
+        for start in range(0, len(sentences), max(1, batch_size)):
+            batch = sentences[start:start + batch_size]
+            tokens = self.tokenizer(
+                batch, padding=True, truncation=True, max_length=self.max_length, return_tensors="np"
+            )
+            feed = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+            hidden = self.session.run(None, feed)[0]
+            if self.pooling == "mean":
+                mask = tokens["attention_mask"][..., None].astype(np.float32)
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            else:
+                pooled = hidden[:, 0]
+            outputs.append(pooled.astype(np.float32))
+
+        embeddings = np.concatenate(outputs) if outputs else np.zeros((0, settings.EMBEDDING_DIMENSION), np.float32)
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings /= np.where(norms == 0, 1.0, norms)
+        return embeddings
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "onnx",
+            "model_dir": str(self.model_dir),
+            "file": self.metadata.get("file"),
+            "quantized": self.metadata.get("quantized"),
+            "threads": self.threads,
+            "max_length": self.max_length,
+            "agreement": self.metadata.get("agreement")
+        }
+
+
+def export_onnx(
+    model_path: str,
+    output_dir: str,
+    quantize: bool = True,
+    keep_fp32: bool = False,
+    opset: int = 17
+) -> Path:
+    """
+    导出 ONNX 模型（可选动态 int8 量化）
+
+    Args:
+        model_path: 本地模型目录或 HuggingFace 模型 ID
+        output_dir: 输出目录
+        quantize: 是否做动态 int8 量化（权重 int8，激活运行时量化）
+        keep_fp32: 量化后是否保留 fp32 模型（bge-m3 约 2.2GB）
+
+    Returns:
+        输出目录
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    output = Path(output_dir)
+    output.mkdir(parents=True, exist_ok=True)
+    # fp32 模型超过 2GB 时权重以外部数据文件保存，单独放在子目录
+    fp32_dir = output / "fp32"
+    fp32_dir.mkdir(exist_ok=True)
+    fp32_path = fp32_dir / "model.onnx"
+
+    logger.info(f"🔄 导出 ONNX 模型: {model_path} -> {fp32_path}")
+    tokenizer = AutoTokenizer.from_pretrained(model_path)
+    model = AutoModel.from_pretrained(model_path).eval()
+    dummy = tokenizer(["AgonX ONNX 导出"], return_tensors="pt")
+    axes = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (dummy["input_ids"], dummy["attention_mask"]),
+            str(fp32_path),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={"input_ids": axes, "attention_mask": axes, "last_hidden_state": axes},
+            opset_version=opset
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info("🔄 动态 int8 量化...")
+        quantize_dynamic(str(fp32_path), str(output / "model_int8.onnx"), weight_type=QuantType.QInt8)
+        model_file = "model_int8.onnx"
+        if not keep_fp32:
+            shutil.rmtree(fp32_dir)
+    else:
+        model_file = "fp32/model.onnx"
+
+    tokenizer.save_pretrained(str(output))
+    source = Path(model_path)
+    max_length = getattr(tokenizer, "model_max_length", 8192)
+    if source.exists() and (source / "sentence_bert_config.json").exists():
+        with open(source / "sentence_bert_config.json", "r", encoding="utf-8") as f:
+            max_length = json.load(f).get("max_seq_length", max_length)
+    write_onnx_metadata(output, {
+        "source": str(model_path),
+        "file": model_file,
+        "quantized": quantize,
+        "pooling": _pooling_mode(source) if source.exists() else "cls",
+        "max_length": min(int(max_length), 8192),
+        "exported_at": time.strftime("%Y-%m-%d %H:%M:%S")
+    })
+    logger.info(f"✅ ONNX 模型导出完成: {output / model_file}")
+    return output
+
+
+def write_onnx_metadata(model_dir: Path, updates: Dict[str, Any]):
+    """合并写入 agonx_onnx.json"""
+    path = Path(model_dir) / ONNX_METADATA_FILE
+    metadata = {}
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+    metadata.update(updates)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+
+
+def embedding_agreement(reference, candidate, texts: List[str], batch_size: int = 16) -> Dict[str, Any]:
+    """
+    比较两个后端的向量一致性
+
+    - 同一文本两种向量的余弦相似度（均值、最小值）
+    - 近邻一致率：每个文本在样本中的最近邻（排除自身）是否相同，反映检索排序是否受影响
+    """
+    a = np.asarray(reference.encode(texts, batch_size=batch_size, normalize_embeddings=True, show_progress_bar=False))
+    b = np.asarray(candidate.encode(texts, batch_size=batch_size, normalize_embeddings=True, show_progress_bar=False))
+    cosine = (a * b).sum(axis=1)
+
+    neighbor_agreement: Optional[float] = None
+    if len(texts) > 2:
+        sim_a, sim_b = a @ a.T, b @ b.T
+        np.fill_diagonal(sim_a, -np.inf)
+        np.fill_diagonal(sim_b, -np.inf)
+        neighbor_agreement = float((sim_a.argmax(axis=1) == sim_b.argmax(axis=1)).mean())
+
+    return {
+        "samples": len(texts),
+        "mean_cosine": round(float(cosine.mean()), 6),
+        "min_cosine": round(float(cosine.min()), 6),
+        "neighbor_agreement": round(neighbor_agreement, 4) if neighbor_agreement is not None else None
+    }
@@ -0,0 +1,297 @@
+"""
+Embedding 提供方
+统一本地模型与远程 OpenAI 兼容接口的向量化入口，每个知识库选择一个提供方，
+入库和查询始终使用同一个模型和同样的批处理方式
+"""
+import asyncio
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.knowledge.embedding_backends import embedding_model_id
+
+LOCAL_PROVIDER = "local"
+
+
+class EmbeddingProvider(ABC):
+    """Embedding 提供方接口"""
+
+    name: str
+    dimension: int
+
+    @property
+    @abstractmethod
+    def model_id(self) -> str:
+        """模型标识（查询缓存和分块向量存储的键包含该标识，不同模型的向量不互相复用）"""
+
+    @property
+    def supports_sparse(self) -> bool:
+        """是否能同时输出 BGE-M3 稀疏向量"""
+        return False
+
+    @abstractmethod
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """批量编码文档分块"""
+
+    async def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """批量编码查询（默认与文档相同）"""
+        return await self.embed_documents(texts)
+
+    async def close(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"name": self.name, "model": self.model_id, "dimension": self.dimension}
+
+
+class LocalEmbeddingProvider(EmbeddingProvider):
+    """
+    本地模型（SentenceTransformer / BGE-M3 / ONNX Runtime）
+
+    模型加载和推理由检索服务负责（在推理执行器中运行），这里只做适配。
+    """
+
+    name = LOCAL_PROVIDER
+
+    def __init__(self, embed: Callable[[List[str]], Awaitable[List[List[float]]]]):
+        self._embed = embed
+        self.dimension = settings.EMBEDDING_DIMENSION
+
+    @property
+    def model_id(self) -> str:
+        return embedding_model_id()
+
+    @property
+    def supports_sparse(self) -> bool:
+        return settings.EMBEDDING_SPARSE_ENABLED
+
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self._embed(texts)
+
+
+class RemoteEmbeddingProvider(EmbeddingProvider):
+    """
+    OpenAI 兼容的远程 Embedding 接口（POST {base_url}/embeddings）
+
+    - 复用一个带连接池的 httpx.AsyncClient
+    - 输入按 batch_size 切分，多批并发发送，同时在途的请求不超过 max_concurrency
+    - 429 / 5xx / 网络错误按指数退避重试（优先使用 Retry-After）
+    """
+
+    RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        name: str,
+        base_url: str,
+        model: str,
+        dimension: int,
+        api_key: str = None,
+        batch_size: int = 64,
+        max_concurrency: int = 4,
+        timeout: float = 30.0,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        send_dimensions: bool = False
+    ):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.dimension = dimension
+        self.api_key = api_key
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = timeout
+        self.max_retries = max(0, max_retries)
+        self.retry_backoff = retry_backoff
+        # 支持 dimensions 参数的模型（如 text-embedding-3）可直接输出指定维度
+        self.send_dimensions = send_dimensions
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._stats = {"requests": 0, "texts": 0, "retries": 0, "failures": 0, "total_ms": 0.0}
+
+    @classmethod
+    def from_config(cls, name: str, config: Dict[str, Any]) -> "RemoteEmbeddingProvider":
+        if not config.get("base_url") or not config.get("model"):
+            raise ValueError(f"Embedding 提供方 {name} 缺少 base_url 或 model 配置")
+        return cls(
+            name=name,
+            base_url=config["base_url"],
+            model=config["model"],
+            dimension=int(config.get("dimension", settings.EMBEDDING_DIMENSION)),
+            api_key=config.get("api_key"),
+            batch_size=int(config.get("batch_size", 64)),
+            max_concurrency=int(config.get("max_concurrency", 4)),
+            timeout=float(config.get("timeout", 30.0)),
+            max_retries=int(config.get("max_retries", 3)),
+            retry_backoff=float(config.get("retry_backoff", 0.5)),
+            send_dimensions=bool(config.get("send_dimensions", False))
+        )
+
+    @property
+    def model_id(self) -> str:
+        return f"{self.name}:{self.model}"
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """获取连接池客户端（懒加载，在事件循环中创建）"""
+        if self._client is None:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                )
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._client
+
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        results = await asyncio.gather(*(self._embed_batch(batch) for batch in batches))
+        return [vector for batch in results for vector in batch]
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        client = self._get_client()
+        payload: Dict[str, Any] = {"model": self.model, "input": texts}
+        if self.send_dimensions:
+            payload["dimensions"] = self.dimension
+
+        async with self._semaphore:
+            self._in_flight += 1
+            try:
+                for attempt in range(self.max_retries + 1):
+                    started = time.perf_counter()
+                    delay = None
+                    try:
+                        response = await client.post("/embeddings", json=payload)
+                        if response.status_code in self.RETRYABLE_STATUS and attempt < self.max_retries:
+                            delay = self._retry_delay(attempt, response.headers.get("retry-after"))
+                            logger.warning(
+                                f"Embedding 接口 {self.name} 返回 {response.status_code}，{delay:.1f}s 后重试"
+                            )
+                        else:
+                            response.raise_for_status()
+                            vectors = self._parse(response.json(), len(texts))
+                            self._stats["requests"] += 1
+                            self._stats["texts"] += len(texts)
+                            self._stats["total_ms"] += (time.perf_counter() - started) * 1000
+                            return vectors
+                    except (httpx.TransportError, httpx.TimeoutException) as e:
+                        if attempt >= self.max_retries:
+                            raise
+                        delay = self._retry_delay(attempt)
+                        logger.warning(f"Embedding 接口 {self.name} 请求失败: {str(e)}，{delay:.1f}s 后重试")
+                    self._stats["retries"] += 1
+                    await asyncio.sleep(delay)
+            except Exception:
+                self._stats["failures"] += 1
+                raise
+            finally:
+                self._in_flight -= 1
+
+    def _retry_delay(self, attempt: int, retry_after: str = None) -> float:
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return self.retry_backoff * (2 ** attempt)
+
+    def _parse(self, body: Dict[str, Any], expected: int) -> List[List[float]]:
+        """按 index 还原顺序并归一化（与本地模型 normalize_embeddings=True 一致）"""
+        data = sorted(body.get("data", []), key=lambda item: item.get("index", 0))
+        if len(data) != expected:
+            raise ValueError(f"Embedding 接口 {self.name} 返回 {len(data)} 个向量，期望 {expected} 个")
+        vectors = []
+        for item in data:
+            vector = item["embedding"]
+            if len(vector) != self.dimension:
+                raise ValueError(f"Embedding 接口 {self.name} 返回维度 {len(vector)}，配置为 {self.dimension}")
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            vectors.append([v / norm for v in vector])
+        return vectors
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self._stats["requests"]
+        return {
+            **super().stats(),
+            "base_url": self.base_url,
+            "batch_size": self.batch_size,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self._in_flight,
+            "requests": requests,
+            "texts": self._stats["texts"],
+            "retries": self._stats["retries"],
+            "failures": self._stats["failures"],
+            "avg_latency_ms": round(self._stats["total_ms"] / requests, 2) if requests else 0.0
+        }
+
+
+class EmbeddingProviderRegistry:
+    """
+    Embedding 提供方注册表
+
+    local 由检索服务创建时注册；远程提供方按 embedding.providers 配置懒加载。
+    """
+
+    def __init__(self, configs: Dict[str, Dict[str, Any]] = None):
+        self.configs = dict(configs if configs is not None else settings.EMBEDDING_PROVIDERS)
+        self._providers: Dict[str, EmbeddingProvider] = {}
+
+    def register(self, provider: EmbeddingProvider):
+        self._providers[provider.name] = provider
+
+    def names(self) -> List[str]:
+        return [LOCAL_PROVIDER] + [name for name in self.configs if name != LOCAL_PROVIDER]
+
+    def validate(self, name: Optional[str]) -> str:
+        """校验提供方名称，返回规范化后的名称（空值为默认提供方）"""
+        name = name or settings.EMBEDDING_DEFAULT_PROVIDER or LOCAL_PROVIDER
+        if name not in self.names():
+            raise ValueError(f"未知的 Embedding 提供方: {name}，可选: {', '.join(self.names())}")
+        return name
+
+    def get(self, name: Optional[str] = None) -> EmbeddingProvider:
+        """获取提供方（name 为空表示本地模型，兼容未记录提供方的旧知识库）"""
+        name = name or LOCAL_PROVIDER
+        provider = self._providers.get(name)
+        if provider is not None:
+            return provider
+        if name == LOCAL_PROVIDER:
+            # 本地提供方由检索服务在初始化时注册
+            import app.knowledge.retrieval  # noqa: F401
+            return self._providers[LOCAL_PROVIDER]
+        if name not in self.configs:
+            raise ValueError(f"未知的 Embedding 提供方: {name}")
+        provider = RemoteEmbeddingProvider.from_config(name, self.configs[name])
+        self._providers[name] = provider
+        logger.info(f"🌐 Embedding 提供方已创建: {name} ({provider.model}, {provider.dimension} 维)")
+        return provider
+
+    async def close(self):
+        for provider in self._providers.values():
+            await provider.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: provider.stats() for name, provider in self._providers.items()}
+
+
+# 全局实例
+embedding_providers = EmbeddingProviderRegistry()
@@ -1,64 +1,54 @@
 """
 嵌入服务
-支持多种嵌入模型
+基于 Embedding 提供方（本地模型或远程 OpenAI 兼容接口）的文本向量化入口
 """
 from typing import List, Optional
-from langchain_openai import OpenAIEmbeddings
-from app.core.config import settings
+from app.knowledge.embedding_providers import EmbeddingProvider, embedding_providers
 
 
 class EmbeddingService:
-    """嵌入服务"""
-    
-    def __init__(
-        self,
-        model: str = None,
-        api_key: str = None,
-        base_url: str = None
-    ):
-        self.model = model or settings.DEFAULT_EMBEDDING_MODEL
-        self.api_key = api_key or settings.DEFAULT_LLM_API_KEY
-        self.base_url = base_url or settings.DEFAULT_LLM_BASE_URL
-        self.dimension = settings.EMBEDDING_DIMENSION
-        
-        # 初始化嵌入模型
-        self.embeddings = self._create_embeddings()
-    
-    def _create_embeddings(self) -> OpenAIEmbeddings:
-        """创建嵌入模型"""
-        return OpenAIEmbeddings(
-            model=self.model,
-            api_key=self.api_key,
-            base_url=self.base_url
-        )
-    
+    """
+    嵌入服务
+
+    与知识库入库、检索使用同一套提供方和批处理，provider 为空时使用本地模型。
+    """
+
+    def __init__(self, provider: Optional[str] = None):
+        self.provider_name = provider
+
+    @property
+    def provider(self) -> EmbeddingProvider:
+        """当前提供方（懒加载，本地模型在首次编码时才加载）"""
+        return embedding_providers.get(self.provider_name)
+
     async def embed_text(self, text: str) -> List[float]:
         """
         将文本转换为向量
-        
+
         Args:
             text: 输入文本
-        
+
         Returns:
             向量列表
         """
-        return await self.embeddings.aembed_query(text)
-    
+        vectors = await self.provider.embed_queries([text])
+        return vectors[0]
+
     async def embed_texts(self, texts: List[str]) -> List[List[float]]:
         """
         批量将文本转换为向量
-        
+
         Args:
             texts: 输入文本列表
-        
+
         Returns:
             向量列表的列表
         """
-        return await self.embeddings.aembed_documents(texts)
-    
+        return await self.provider.embed_documents(texts)
+
     def get_dimension(self) -> int:
         """获取向量维度"""
-        return self.dimension
+        return self.provider.dimension
 
 
 # 全局实例
@@ -0,0 +1,178 @@
+"""
+模型推理执行器
+将同步的模型推理放到独立线程池中执行，避免阻塞事件循环
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import settings
+from app.core.logger import logger
+
+
+class InferenceExecutor:
+    """
+    带有界队列的推理执行器
+
+    同时在执行和排队的任务总数不超过 max_workers + max_queue_size，
+    超出部分在 await 处等待（背压），而不是无限堆积在线程池队列中。
+    等待方被取消（超时、客户端断开）时，已开始的任务仍占用名额直到执行结束。
+    """
+
+    def __init__(self, name: str, max_workers: int = 1, max_queue_size: int = 64):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue_size = max(0, max_queue_size)
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._slots = asyncio.Semaphore(self.max_workers + self.max_queue_size)
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._wait_times: deque = deque(maxlen=1000)
+        self._run_times: deque = deque(maxlen=1000)
+        self._max_latency = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取线程池（懒加载）"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix=f"agonx-{self.name}"
+            )
+            logger.info(f"推理执行器已启动: {self.name} (workers={self.max_workers}, queue={self.max_queue_size})")
+        return self._executor
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        在执行器中运行同步函数并等待结果
+
+        Args:
+            fn: 同步函数
+            *args, **kwargs: 函数参数
+
+        Returns:
+            函数返回值
+        """
+        submitted = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+            raise
+
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._get_executor().submit(self._invoke, submitted, fn, args, kwargs)
+        except BaseException:
+            with self._lock:
+                self._queued -= 1
+            self._slots.release()
+            raise
+        # 名额和排队计数随线程池任务结束而结算，而不是随等待方：等待方被取消时
+        # 已开始的推理仍在占用线程，未开始的任务被取消后 _invoke 不会执行
+        future.add_done_callback(lambda f: self._settle(loop, f))
+        return await asyncio.wrap_future(future)
+
+    def _settle(self, loop: asyncio.AbstractEventLoop, future: Future):
+        """线程池任务结束（完成、失败或开始前被取消）后释放名额"""
+        if future.cancelled():
+            with self._lock:
+                self._queued -= 1
+        try:
+            loop.call_soon_threadsafe(self._slots.release)
+        except RuntimeError:
+            # 事件循环已关闭（应用退出）
+            pass
+
+    def _invoke(self, submitted: float, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        """在工作线程中执行任务并记录耗时"""
+        started = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+
+        failed = False
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._running -= 1
+                if failed:
+                    self._failed += 1
+                else:
+                    self._completed += 1
+                self._wait_times.append(started - submitted)
+                self._run_times.append(finished - started)
+                self._max_latency = max(self._max_latency, finished - submitted)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取队列深度与延迟统计（毫秒）"""
+        with self._lock:
+            wait_times = list(self._wait_times)
+            run_times = list(self._run_times)
+            latencies = sorted(w + r for w, r in zip(wait_times, run_times))
+            stats = {
+                "name": self.name,
+                "workers": self.max_workers,
+                "max_queue_size": self.max_queue_size,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "max_latency_ms": round(self._max_latency * 1000, 2)
+            }
+
+        def _avg(values):
+            return round(sum(values) / len(values) * 1000, 2) if values else 0.0
+
+        def _percentile(values, q):
+            if not values:
+                return 0.0
+            return round(values[min(len(values) - 1, int(len(values) * q))] * 1000, 2)
+
+        stats["avg_wait_ms"] = _avg(wait_times)
+        stats["avg_run_ms"] = _avg(run_times)
+        stats["p50_latency_ms"] = _percentile(latencies, 0.5)
+        stats["p95_latency_ms"] = _percentile(latencies, 0.95)
+        return stats
+
+    def shutdown(self):
+        """关闭线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+            logger.info(f"推理执行器已关闭: {self.name}")
+
+
+# 全局实例
+embedding_executor = InferenceExecutor(
+    "embedding",
+    max_workers=settings.EMBEDDING_EXECUTOR_WORKERS,
+    max_queue_size=settings.EMBEDDING_EXECUTOR_QUEUE_SIZE
+)
+rerank_executor = InferenceExecutor(
+    "rerank",
+    max_workers=settings.RERANK_EXECUTOR_WORKERS,
+    max_queue_size=settings.RERANK_EXECUTOR_QUEUE_SIZE
+)
+keyword_executor = InferenceExecutor(
+    "keyword",
+    max_workers=settings.KEYWORD_EXECUTOR_WORKERS,
+    max_queue_size=settings.KEYWORD_EXECUTOR_QUEUE_SIZE
+)
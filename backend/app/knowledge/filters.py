@@ -0,0 +1,58 @@
+"""
+检索过滤条件
+按分块的标量字段（知识库、文档、分块、页面）构造过滤表达式，代替手写表达式字符串
+"""
+import json
+from dataclasses import dataclass, fields
+from typing import Any, Callable, Dict, List, Optional
+
+from app.knowledge.vector_store import compile_filter
+
+
+@dataclass
+class SearchFilter:
+    """
+    检索过滤条件
+
+    每个字段为允许的取值列表，为 None 时不限制；多个字段之间为“且”关系。
+    typed 集合（标量字段已建索引）直接按字段过滤，旧集合按 metadata JSON 中的键过滤。
+    """
+    kb_ids: Optional[List[str]] = None
+    document_ids: Optional[List[str]] = None
+    chunk_ids: Optional[List[str]] = None
+    page_ids: Optional[List[str]] = None
+
+    @classmethod
+    def for_document(cls, document_id: str) -> "SearchFilter":
+        return cls(document_ids=[document_id])
+
+    def is_empty(self) -> bool:
+        return all(getattr(self, f.name) is None for f in fields(self))
+
+    def to_expr(self, typed: bool = False) -> Optional[str]:
+        """
+        生成过滤表达式（没有条件时返回 None）
+
+        Args:
+            typed: 集合是否包含标量字段；为 False 时使用 metadata["key"] 形式，
+                   对任何集合都有效，但无法利用标量索引
+        """
+        conditions = []
+        for name, values in self._conditions():
+            field = name if typed else f'metadata["{name}"]'
+            if len(values) == 1:
+                conditions.append(f"{field} == {json.dumps(values[0], ensure_ascii=False)}")
+            else:
+                conditions.append(f"{field} in {json.dumps(values, ensure_ascii=False)}")
+        return " and ".join(conditions) or None
+
+    def matches(self) -> Callable[[Dict[str, Any]], bool]:
+        """生成行判定函数（用于本地索引的结果过滤）"""
+        return compile_filter(self.to_expr())
+
+    def _conditions(self):
+        for f in fields(self):
+            values = getattr(self, f.name)
+            if values is not None:
+                # 字段名为复数形式（document_ids -> document_id）
+                yield f.name[:-1], [str(value) for value in values]
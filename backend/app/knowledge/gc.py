@@ -0,0 +1,429 @@
+"""
+向量与对象存储垃圾回收
+
+删除文档时立即删除数据库记录和向量，其余工作提交回收任务，由后台清理器异步完成：
+- 同步删除向量失败的任务按集合合并，用一条 document_id in [...] 表达式批量删除向量
+  （有标量字段的集合按分区键只涉及相关分区），删除后使知识库的检索缓存失效
+- 删除 MinIO 中的原文件及页面截图、缩略图、提取的图片（{kb_id}/{doc_id}/ 前缀）
+- 累计删除行数达到阈值后提交集合压缩，回收墓碑占用的空间
+- 对账模式扫描向量集合与 MinIO，找出数据库中已不存在的文档遗留的数据
+"""
+import asyncio
+import re
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from minio import Minio
+from minio.deleteobjects import DeleteObject
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.knowledge.cache import search_result_cache
+from app.knowledge.filters import SearchFilter
+from app.knowledge.index_profiles import CollectionSpec
+from app.knowledge.quantization import quantized_searcher
+from app.knowledge.vector_store import VectorStore, vector_store
+
+_UUID = r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"
+# 上传的原文件 {kb_id}/{doc_id}.ext，页面截图、缩略图、提取的图片 {kb_id}/{doc_id}/...
+_DOCUMENT_OBJECT = re.compile(rf"^(?P<kb_id>{_UUID})/(?P<doc_id>{_UUID})(?:\.[A-Za-z0-9]+|/.+)?$")
+
+
+@dataclass
+class DeletionTask:
+    """
+    回收任务
+
+    spec 为 None 表示集合已整体删除（如删除知识库），只需清理对象存储；
+    document_ids 为空表示向量已同步删除，spec 只用于判断是否需要压缩集合。
+    """
+    spec: Optional[CollectionSpec] = None
+    document_ids: List[str] = field(default_factory=list)
+    object_paths: List[str] = field(default_factory=list)
+    object_prefixes: List[str] = field(default_factory=list)
+    attempts: int = 0
+
+    @classmethod
+    def for_document(
+        cls,
+        spec: CollectionSpec,
+        document_id: str,
+        file_path: Optional[str] = None,
+        vectors: bool = True
+    ) -> "DeletionTask":
+        return cls(
+            spec=spec,
+            document_ids=[document_id] if vectors else [],
+            object_paths=[file_path] if file_path else [],
+            object_prefixes=[f"{spec.kb_id}/{document_id}/"]
+        )
+
+    @classmethod
+    def for_knowledge_base(cls, kb_id: str) -> "DeletionTask":
+        return cls(object_prefixes=[f"{kb_id}/"])
+
+
+@dataclass
+class ReconcileReport:
+    """对账结果"""
+    dry_run: bool
+    collections_checked: int = 0
+    orphan_documents: Dict[str, List[str]] = field(default_factory=dict)  # 集合 -> 孤立文档 ID
+    orphan_objects: List[str] = field(default_factory=list)
+    unknown_objects: List[str] = field(default_factory=list)  # 不属于任何现存知识库的文档对象，只报告不删除
+    recent_objects: int = 0  # 处于宽限期内而跳过的对象数
+    deleted_vectors: int = 0
+    deleted_objects: int = 0
+    elapsed_ms: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "dry_run": self.dry_run,
+            "collections_checked": self.collections_checked,
+            "orphan_documents": self.orphan_documents,
+            "orphan_document_count": sum(len(ids) for ids in self.orphan_documents.values()),
+            "orphan_objects": self.orphan_objects[:100],
+            "orphan_object_count": len(self.orphan_objects),
+            "unknown_objects": self.unknown_objects[:100],
+            "unknown_object_count": len(self.unknown_objects),
+            "recent_objects": self.recent_objects,
+            "deleted_vectors": self.deleted_vectors,
+            "deleted_objects": self.deleted_objects,
+            "elapsed_ms": round(self.elapsed_ms, 2)
+        }
+
+
+class VectorGarbageCollector:
+    """
+    后台垃圾回收器
+
+    任务进入队列后，清理器等待 sweep_interval 秒收集更多任务（最多 batch_size 个），
+    再按集合合并删除。失败的任务重新入队，超过 max_attempts 次后放弃并记录日志。
+    """
+
+    def __init__(
+        self,
+        store: VectorStore = None,
+        sweep_interval: float = None,
+        batch_size: int = None,
+        compaction_threshold: int = None,
+        max_attempts: int = None
+    ):
+        self.store = store or vector_store
+        self.sweep_interval = settings.GC_SWEEP_INTERVAL if sweep_interval is None else sweep_interval
+        self.batch_size = batch_size or settings.GC_BATCH_SIZE
+        self.compaction_threshold = compaction_threshold or settings.GC_COMPACTION_THRESHOLD
+        self.max_attempts = max_attempts or settings.GC_MAX_ATTEMPTS
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._minio: Optional[Minio] = None
+        # 集合自上次压缩以来删除的行数
+        self._tombstones: Counter = Counter()
+        self._specs: Dict[str, CollectionSpec] = {}
+        self._stats = Counter()
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        """启动后台清理器（需在事件循环中调用，重复调用无副作用）"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+            logger.info("🧹 向量垃圾回收器已启动")
+
+    async def stop(self):
+        """停止清理器，退出前处理完队列中剩余的任务"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        pending = self._drain()
+        if pending:
+            await self.sweep(pending, retry=False)
+
+    def submit(self, task: DeletionTask):
+        """提交回收任务"""
+        self.start()
+        self._queue.put_nowait(task)
+        self._stats["submitted"] += 1
+
+    def _drain(self, limit: Optional[int] = None) -> List[DeletionTask]:
+        tasks = []
+        while self._queue is not None and not self._queue.empty():
+            if limit is not None and len(tasks) >= limit:
+                break
+            tasks.append(self._queue.get_nowait())
+        return tasks
+
+    async def _run(self):
+        while True:
+            task = await self._queue.get()
+            # 等待一个窗口，把同一时间段内的删除合并成少量批量操作
+            if self.sweep_interval > 0:
+                await asyncio.sleep(self.sweep_interval)
+            batch = [task] + self._drain(self.batch_size - 1)
+            try:
+                await self.sweep(batch)
+            except Exception as e:
+                logger.error(f"垃圾回收批次执行失败: {str(e)}")
+
+    # ---------- 清理 ----------
+
+    async def sweep(self, tasks: List[DeletionTask], retry: bool = True) -> int:
+        """
+        执行一批回收任务
+
+        Returns:
+            删除的向量条数
+        """
+        groups: Dict[Tuple[str, str], List[DeletionTask]] = defaultdict(list)
+        paths: List[str] = []
+        prefixes: List[str] = []
+        for task in tasks:
+            if task.spec is not None:
+                self._specs[task.spec.collection_name] = task.spec
+            if task.spec is not None and task.document_ids:
+                groups[(task.spec.collection_name, task.spec.kb_id)].append(task)
+            paths.extend(task.object_paths)
+            prefixes.extend(task.object_prefixes)
+
+        deleted = 0
+        for group in groups.values():
+            spec = group[0].spec
+            document_ids = sorted({doc_id for task in group for doc_id in task.document_ids})
+            try:
+                deleted += await self.delete_vectors(spec, document_ids)
+            except Exception as e:
+                logger.warning(f"批量删除向量失败 ({spec.collection_name}, {len(document_ids)} 个文档): {str(e)}")
+                self._retry(group, retry)
+
+        if paths or prefixes:
+            try:
+                removed = await asyncio.to_thread(self._remove_objects_sync, paths, prefixes)
+                self._stats["objects_deleted"] += removed
+            except Exception as e:
+                logger.warning(f"删除 MinIO 对象失败 ({len(paths)} 个文件, {len(prefixes)} 个前缀): {str(e)}")
+                self._retry(
+                    [DeletionTask(object_paths=t.object_paths, object_prefixes=t.object_prefixes, attempts=t.attempts)
+                     for t in tasks if t.object_paths or t.object_prefixes],
+                    retry
+                )
+
+        await self._compact_due()
+        self._stats["batches"] += 1
+        self._stats["tasks"] += len(tasks)
+        return deleted
+
+    async def delete_vectors(self, spec: CollectionSpec, document_ids: List[str]) -> int:
+        """
+        删除文档的向量并使知识库的检索缓存失效
+
+        只记录墓碑数，集合压缩由后台清理器在累计删除行数达到阈值后提交。
+        """
+        filters = SearchFilter(document_ids=document_ids)
+        deleted = await self.store.delete(spec.collection_name, spec.filter_expr(filters))
+        if spec.compressed:
+            await quantized_searcher.cold_store.delete(spec.collection_name, filters.to_expr())
+        self._stats["documents_deleted"] += len(document_ids)
+        self._stats["vectors_deleted"] += deleted
+        logger.info(f"🧹 已从集合 {spec.collection_name} 删除 {len(document_ids)} 个文档的 {deleted} 条向量")
+
+        self._tombstones[spec.collection_name] += deleted
+        self._specs[spec.collection_name] = spec
+        # 删除前缓存的检索结果可能仍包含这些文档
+        await search_result_cache.bump_version(spec.kb_id)
+        return deleted
+
+    async def _compact_due(self):
+        for name, count in list(self._tombstones.items()):
+            if count >= self.compaction_threshold and name in self._specs:
+                await self.compact(self._specs[name])
+
+    async def compact(self, spec: CollectionSpec):
+        """压缩集合（Milvus 异步执行，提交后即返回）"""
+        try:
+            await self.store.compact(spec.collection_name)
+            if spec.compressed:
+                await quantized_searcher.cold_store.compact(spec.collection_name)
+            self._tombstones.pop(spec.collection_name, None)
+            self._stats["compactions"] += 1
+        except Exception as e:
+            logger.warning(f"集合压缩失败 ({spec.collection_name}): {str(e)}")
+
+    def _retry(self, tasks: List[DeletionTask], retry: bool):
+        for task in tasks:
+            task.attempts += 1
+            if retry and task.attempts < self.max_attempts:
+                self._queue.put_nowait(task)
+                self._stats["retried"] += 1
+            else:
+                self._stats["failed"] += 1
+                logger.error(
+                    f"回收任务放弃 (文档 {task.document_ids}, 对象前缀 {task.object_prefixes})，"
+                    f"可通过对账接口清理"
+                )
+
+    # ---------- 对象存储 ----------
+
+    def _minio_client(self) -> Minio:
+        if self._minio is None:
+            self._minio = Minio(
+                settings.MINIO_ENDPOINT.replace('http://', '').replace('https://', ''),
+                access_key=settings.MINIO_ACCESS_KEY,
+                secret_key=settings.MINIO_SECRET_KEY,
+                secure=settings.MINIO_SECURE
+            )
+        return self._minio
+
+    def _list_objects_sync(self, prefix: Optional[str] = None) -> List[str]:
+        client = self._minio_client()
+        if not client.bucket_exists(settings.MINIO_BUCKET):
+            return []
+        return [
+            obj.object_name
+            for obj in client.list_objects(settings.MINIO_BUCKET, prefix=prefix, recursive=True)
+        ]
+
+    def _list_object_ages_sync(self) -> List[Tuple[str, Optional[float]]]:
+        """列出存储桶中的全部对象及其最后修改距今的秒数"""
+        client = self._minio_client()
+        if not client.bucket_exists(settings.MINIO_BUCKET):
+            return []
+        now = datetime.now(timezone.utc)
+        return [
+            (obj.object_name, (now - obj.last_modified).total_seconds() if obj.last_modified else None)
+            for obj in client.list_objects(settings.MINIO_BUCKET, recursive=True)
+        ]
+
+    def _remove_objects_sync(self, paths: List[str], prefixes: List[str]) -> int:
+        names = set(paths)
+        for prefix in prefixes:
+            names.update(self._list_objects_sync(prefix))
+        if not names:
+            return 0
+        errors = self._minio_client().remove_objects(
+            settings.MINIO_BUCKET, [DeleteObject(name) for name in sorted(names)]
+        )
+        # remove_objects 是惰性的，必须迭代结果才会真正执行删除
+        failed = [error.name for error in errors]
+        if failed:
+            raise RuntimeError(f"{len(failed)} 个对象删除失败: {failed[:5]}")
+        return len(names)
+
+    # ---------- 对账 ----------
+
+    async def reconcile(
+        self,
+        live_documents: List[Tuple[CollectionSpec, Set[str]]],
+        dry_run: bool = True,
+        check_objects: bool = True,
+        recheck: Optional[Callable[[List[str]], Awaitable[Set[str]]]] = None
+    ) -> ReconcileReport:
+        """
+        对账：找出数据库中已不存在的文档遗留的向量和对象
+
+        Args:
+            live_documents: 每个知识库的 (集合规格, 数据库中存在的文档 ID)
+            dry_run: 只报告不删除
+            check_objects: 是否扫描 MinIO（整个存储桶）。只回收路径符合文档布局
+                （知识库 ID、文档 ID 均为 UUID）且所属知识库仍存在的对象；
+                其他对象一律不动，所属知识库不存在的只在 unknown_objects 中报告
+            recheck: 返回给定文档 ID 中当前数据库仍存在的部分。live_documents 在扫描前读取，
+                扫描期间上传的文档会被误判为孤立，删除前用它重新核对
+
+        最近 gc_reconcile_grace_period 秒内写入的对象不视为孤立：上传时先写对象再提交文档记录。
+        """
+        start = time.perf_counter()
+        report = ReconcileReport(dry_run=dry_run)
+
+        for spec, alive in live_documents:
+            try:
+                stored = await self.store.document_ids(spec.collection_name, spec.filter_expr())
+            except Exception as e:
+                logger.warning(f"对账扫描集合失败 ({spec.collection_name}): {str(e)}")
+                continue
+            report.collections_checked += 1
+            orphans = await self._recheck(sorted(stored - alive), recheck)
+            if not orphans:
+                continue
+            report.orphan_documents[spec.collection_name] = orphans
+            if not dry_run:
+                for i in range(0, len(orphans), self.batch_size):
+                    report.deleted_vectors += await self.delete_vectors(spec, orphans[i:i + self.batch_size])
+        if not dry_run:
+            await self._compact_due()
+
+        if check_objects:
+            alive_by_kb = {spec.kb_id: alive for spec, alive in live_documents}
+            objects = await asyncio.to_thread(self._list_object_ages_sync)
+            candidates: Dict[str, List[str]] = defaultdict(list)
+            for name, age in objects:
+                owner = self._document_object_owner(name)
+                if owner is None:
+                    continue
+                kb_id, doc_id = owner
+                if kb_id not in alive_by_kb:
+                    report.unknown_objects.append(name)
+                elif doc_id not in alive_by_kb[kb_id]:
+                    if age is not None and age < settings.GC_RECONCILE_GRACE_PERIOD:
+                        report.recent_objects += 1
+                        continue
+                    candidates[doc_id].append(name)
+            for doc_id in await self._recheck(sorted(candidates), recheck):
+                report.orphan_objects.extend(candidates[doc_id])
+            if report.orphan_objects and not dry_run:
+                report.deleted_objects = await asyncio.to_thread(
+                    self._remove_objects_sync, report.orphan_objects, []
+                )
+                self._stats["objects_deleted"] += report.deleted_objects
+
+        report.elapsed_ms = (time.perf_counter() - start) * 1000
+        self._stats["reconciles"] += 1
+        logger.info(
+            f"🧹 对账完成{'（仅报告）' if dry_run else ''}: 集合 {report.collections_checked} 个, "
+            f"孤立文档 {sum(len(ids) for ids in report.orphan_documents.values())} 个, "
+            f"孤立对象 {len(report.orphan_objects)} 个"
+            + (f", 未知知识库的对象 {len(report.unknown_objects)} 个（未删除）" if report.unknown_objects else "")
+        )
+        return report
+
+    @staticmethod
+    async def _recheck(
+        document_ids: List[str],
+        recheck: Optional[Callable[[List[str]], Awaitable[Set[str]]]]
+    ) -> List[str]:
+        """排除扫描期间已写入数据库的文档"""
+        if not document_ids or recheck is None:
+            return document_ids
+        alive = await recheck(document_ids)
+        return [doc_id for doc_id in document_ids if doc_id not in alive]
+
+    @staticmethod
+    def _document_object_owner(name: str) -> Optional[Tuple[str, str]]:
+        """解析文档对象路径，返回 (kb_id, doc_id)；不符合文档布局的对象返回 None"""
+        match = _DOCUMENT_OBJECT.match(name)
+        if match is None:
+            return None
+        return match.group("kb_id"), match.group("doc_id")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._worker is not None and not self._worker.done(),
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "sweep_interval": self.sweep_interval,
+            "batch_size": self.batch_size,
+            "compaction_threshold": self.compaction_threshold,
+            "tombstones": dict(self._tombstones),
+            **dict(self._stats)
+        }
+
+
+# 全局实例
+vector_gc = VectorGarbageCollector()
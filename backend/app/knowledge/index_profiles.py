@@ -0,0 +1,248 @@
+"""
+向量索引配置
+定义可按知识库选择的 ANN 索引类型及其构建、检索参数
+"""
+import math
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+
+# 相似度度量（bge 系列模型输出归一化向量，使用余弦相似度；二值量化向量使用汉明距离）
+METRIC_TYPE = "COSINE"
+BINARY_METRIC_TYPE = "HAMMING"
+
+# 向量量化方式
+QUANTIZATION_MODES = ("none", "int8", "binary")
+
+
+def ivf_nlist(num_entities: int) -> int:
+    """按数据量估算 IVF 聚类数（约 4 * sqrt(N)，限制在 [128, 65536]）"""
+    return int(min(65536, max(128, 4 * math.sqrt(max(num_entities, 1)))))
+
+
+@dataclass(frozen=True)
+class IndexProfile:
+    """
+    索引配置
+
+    Attributes:
+        name: 配置名称
+        index_type: Milvus 索引类型
+        build_params: 建索引参数
+        search_param: 检索时控制召回/延迟的参数名（nprobe/ef/search_list），FLAT 没有
+        default_search_value: 检索参数默认值
+        search_candidates: 自动调优时依次尝试的检索参数取值（从快到准）
+        metric_type: 相似度度量
+    """
+    name: str
+    index_type: str
+    build_params: Dict[str, Any] = field(default_factory=dict)
+    search_param: Optional[str] = None
+    default_search_value: Optional[int] = None
+    search_candidates: Tuple[int, ...] = ()
+    metric_type: str = METRIC_TYPE
+
+    @property
+    def tunable(self) -> bool:
+        return self.search_param is not None
+
+    @property
+    def binary(self) -> bool:
+        """是否为二值向量索引"""
+        return self.metric_type == BINARY_METRIC_TYPE
+
+    def index_params(self, num_entities: int = 0) -> Dict[str, Any]:
+        """生成建索引参数（IVF 类索引按数据量调整 nlist）"""
+        params = dict(self.build_params)
+        if "nlist" in params and num_entities:
+            params["nlist"] = ivf_nlist(num_entities)
+        return {"metric_type": self.metric_type, "index_type": self.index_type, "params": params}
+
+    def search_params(self, value: Optional[int] = None) -> Dict[str, Any]:
+        """生成检索参数"""
+        params = {}
+        if self.search_param:
+            params[self.search_param] = int(value or self.default_search_value)
+        return {"metric_type": self.metric_type, "params": params}
+
+    def candidate_values(self, top_k: int, index_params: Dict[str, Any] = None) -> Tuple[int, ...]:
+        """自动调优的候选取值（IVF 不超过 nlist，图索引不小于 top_k）"""
+        if self.search_param == "nprobe":
+            nlist = (index_params or {}).get("params", {}).get("nlist") or self.build_params.get("nlist")
+            return tuple(v for v in self.search_candidates if v <= nlist) or (nlist,)
+        return tuple(sorted({max(v, top_k) for v in self.search_candidates}))
+
+
+INDEX_PROFILES: Dict[str, IndexProfile] = {
+    profile.name: profile
+    for profile in (
+        # 精确检索，适合几万条以内的小知识库
+        IndexProfile(name="FLAT", index_type="FLAT"),
+        IndexProfile(
+            name="IVF_FLAT",
+            index_type="IVF_FLAT",
+            build_params={"nlist": 128},
+            search_param="nprobe",
+            default_search_value=10,
+            search_candidates=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048),
+        ),
+        # 向量按 int8 标量量化，内存约为 IVF_FLAT 的 1/4
+        IndexProfile(
+            name="IVF_SQ8",
+            index_type="IVF_SQ8",
+            build_params={"nlist": 128},
+            search_param="nprobe",
+            default_search_value=16,
+            search_candidates=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048),
+        ),
+        IndexProfile(
+            name="HNSW",
+            index_type="HNSW",
+            build_params={"M": 16, "efConstruction": 200},
+            search_param="ef",
+            default_search_value=64,
+            search_candidates=(16, 32, 64, 128, 256, 512),
+        ),
+        # 磁盘索引，适合内存放不下的超大知识库（需 Milvus 开启 DiskANN）
+        IndexProfile(
+            name="DISKANN",
+            index_type="DISKANN",
+            search_param="search_list",
+            default_search_value=100,
+            search_candidates=(16, 32, 64, 100, 200, 400),
+        ),
+        # 二值量化向量（每维 1 bit），配合全精度重打分使用
+        IndexProfile(name="BIN_FLAT", index_type="BIN_FLAT", metric_type=BINARY_METRIC_TYPE),
+        IndexProfile(
+            name="BIN_IVF_FLAT",
+            index_type="BIN_IVF_FLAT",
+            build_params={"nlist": 128},
+            search_param="nprobe",
+            default_search_value=16,
+            search_candidates=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048),
+            metric_type=BINARY_METRIC_TYPE,
+        ),
+    )
+}
+
+
+def get_index_profile(name: Optional[str]) -> IndexProfile:
+    """按名称获取索引配置（为空时使用默认配置）"""
+    name = (name or settings.MILVUS_DEFAULT_INDEX_PROFILE).upper()
+    if name not in INDEX_PROFILES:
+        raise ValueError(f"不支持的索引类型: {name}，可选: {', '.join(INDEX_PROFILES)}")
+    return INDEX_PROFILES[name]
+
+
+def recommend_index_profile(num_entities: int, quantization: str = "none") -> IndexProfile:
+    """按数据量和量化方式推荐索引配置"""
+    if quantization == "binary":
+        return INDEX_PROFILES["BIN_FLAT" if num_entities < 20_000 else "BIN_IVF_FLAT"]
+    if quantization == "int8":
+        return INDEX_PROFILES["IVF_SQ8"]
+    if num_entities < 20_000:
+        return INDEX_PROFILES["FLAT"]
+    if num_entities < 2_000_000:
+        return INDEX_PROFILES["HNSW"]
+    return INDEX_PROFILES["IVF_SQ8"]
+
+
+def check_quantization(profile: IndexProfile, quantization: str):
+    """校验索引配置与量化方式是否匹配"""
+    if quantization not in QUANTIZATION_MODES:
+        raise ValueError(f"不支持的量化方式: {quantization}，可选: {', '.join(QUANTIZATION_MODES)}")
+    if profile.binary != (quantization == "binary"):
+        raise ValueError(f"索引类型 {profile.name} 与量化方式 {quantization} 不匹配")
+
+
+@dataclass
+class CollectionSpec:
+    """
+    知识库的向量集合描述
+
+    由 KnowledgeBase 生成，随检索请求一起传给检索服务，
+    使每个知识库按自己的索引配置检索。
+    共享集合（shared）中的每次检索和删除都限定在该知识库的 kb_id 分区内。
+    """
+    collection_name: str
+    index_profile: str = None
+    search_value: Optional[int] = None
+    kb_id: Optional[str] = None
+    quantization: str = "none"
+    projection_dim: Optional[int] = None
+    projection_rescore: bool = True
+    sparse: bool = False
+    scalar_fields: bool = False
+    shared: bool = False
+    embedding_provider: Optional[str] = None
+
+    @classmethod
+    def from_knowledge_base(cls, kb) -> "CollectionSpec":
+        tuned = kb.index_search_params or {}
+        return cls(
+            collection_name=kb.collection_name,
+            index_profile=kb.index_profile,
+            search_value=tuned.get("value"),
+            kb_id=kb.id,
+            quantization=kb.quantization or "none",
+            projection_dim=kb.projection_dim,
+            projection_rescore=kb.projection_rescore is not False,
+            sparse=bool(kb.sparse_enabled),
+            scalar_fields=bool(kb.scalar_fields),
+            shared=bool(kb.shared_collection),
+            embedding_provider=kb.embedding_provider
+        )
+
+    @property
+    def profile(self) -> IndexProfile:
+        return get_index_profile(self.index_profile)
+
+    @property
+    def quantized(self) -> bool:
+        """首轮检索使用量化向量，需要全精度重打分"""
+        return self.quantization != "none"
+
+    @property
+    def projected(self) -> bool:
+        """首轮检索使用 PCA 降维后的向量"""
+        return bool(self.projection_dim)
+
+    @property
+    def compressed(self) -> bool:
+        """向量存储中保存的不是原始向量（全精度向量在冷存储中）"""
+        return self.quantized or self.projected
+
+    @property
+    def rescored(self) -> bool:
+        """首轮候选是否用全精度向量重打分（量化必须重打分，降维可选）"""
+        return self.quantized or (self.projected and self.projection_rescore)
+
+    @property
+    def stores_full_vectors(self) -> bool:
+        """向量存储中是否保存了原始维度的浮点向量（int8 只量化索引，原始向量仍保留）"""
+        return not self.projected and self.quantization != "binary"
+
+    def search_params(self) -> Dict[str, Any]:
+        """检索参数（优先使用自动调优结果）"""
+        return self.profile.search_params(self.search_value)
+
+    @property
+    def keyword_index_name(self) -> str:
+        """BM25 关键词索引名（共享集合中每个知识库单独建索引）"""
+        return f"{self.collection_name}__{self.kb_id}" if self.shared else self.collection_name
+
+    def filter_expr(self, filters=None) -> Optional[str]:
+        """
+        将 SearchFilter 转换为该集合的过滤表达式（有标量字段时直接按字段过滤）
+
+        共享集合始终加上 kb_id 条件，没有其他条件时也不会返回 None。
+        """
+        from app.knowledge.filters import SearchFilter
+
+        if self.shared:
+            filters = replace(filters or SearchFilter(), kb_ids=[self.kb_id])
+        if filters is None or filters.is_empty():
+            return None
+        return filters.to_expr(typed=self.scalar_fields)
@@ -0,0 +1,185 @@
+"""
+向量索引自动调优
+在抽样查询上对比近似检索与精确检索的召回率，选出满足召回目标的最快检索参数
+"""
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+from app.core.logger import logger
+from app.knowledge.index_profiles import BINARY_METRIC_TYPE, IndexProfile
+from app.knowledge.vector_store import VectorStore, vector_store
+
+
+@dataclass
+class TuningResult:
+    """调优结果"""
+    index_profile: str
+    search_param: Optional[str]
+    value: Optional[int]
+    recall: float
+    latency_ms: float
+    recall_target: float
+    sample_size: int
+    measurements: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def met_target(self) -> bool:
+        return self.recall >= self.recall_target
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["met_target"] = self.met_target
+        return data
+
+
+class IndexAutoTuner:
+    """
+    索引检索参数自动调优器
+
+    以集合中抽样的向量作为查询，先遍历集合暴力计算精确的 top_k 近邻作为参考结果，
+    再从小到大尝试候选参数，选出第一个平均 recall@k 达到目标的取值。
+    查询向量自身的命中不计入召回。
+    """
+
+    def __init__(self, store: VectorStore = None):
+        self.store = store or vector_store
+
+    @staticmethod
+    def _neighbors(hits: List[Dict[str, Any]], own_id: str, top_k: int) -> List[str]:
+        return [hit["id"] for hit in hits if hit["id"] != own_id][:top_k]
+
+    async def _exact_neighbors(
+        self,
+        collection_name: str,
+        vectors: List[Any],
+        own_ids: List[str],
+        top_k: int,
+        metric_type: str
+    ) -> List[Set[str]]:
+        """遍历集合，用 numpy 暴力计算每个查询的精确 top_k 近邻（分数越大越相似）"""
+        binary = metric_type == BINARY_METRIC_TYPE
+        queries = self._as_matrix(vectors, binary)
+        if metric_type == "COSINE":
+            queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        keep = top_k + 1
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.empty((len(queries), 0), dtype=object)
+        async for rows in self.store.scan(collection_name):
+            ids = np.array([str(row["id"]) for row in rows], dtype=object)
+            matrix = self._as_matrix([row["embedding"] for row in rows], binary)
+            dots = queries @ matrix.T
+            if binary:
+                # 汉明距离 = |q| + |r| - 2 q·r（按位）
+                scores = -(queries.sum(axis=1, keepdims=True) + matrix.sum(axis=1) - 2 * dots)
+            elif metric_type == "L2":
+                scores = 2 * dots - (matrix * matrix).sum(axis=1)
+            elif metric_type == "COSINE":
+                scores = dots / np.maximum(np.linalg.norm(matrix, axis=1), 1e-12)
+            else:
+                scores = dots
+            best_scores = np.concatenate([best_scores, scores.astype(np.float32)], axis=1)
+            best_ids = np.concatenate([best_ids, np.broadcast_to(ids, scores.shape)], axis=1)
+            if best_scores.shape[1] > keep:
+                top = np.argpartition(-best_scores, keep - 1, axis=1)[:, :keep]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_ids = np.take_along_axis(best_ids, top, axis=1)
+
+        truth = []
+        for scores, ids, own_id in zip(best_scores, best_ids, own_ids):
+            ranked = [ids[i] for i in np.argsort(-scores)]
+            truth.append(set([pk for pk in ranked if pk != own_id][:top_k]))
+        return truth
+
+    @staticmethod
+    def _as_matrix(vectors: List[Any], binary: bool) -> np.ndarray:
+        if not binary:
+            return np.asarray(vectors, dtype=np.float32)
+        # 二值向量以 bytes 存储（部分版本包装在单元素列表中），展开为 0/1 位
+        packed = [vector[0] if isinstance(vector, list) else vector for vector in vectors]
+        return np.unpackbits(np.frombuffer(b"".join(packed), dtype=np.uint8).reshape(len(packed), -1), axis=1).astype(np.float32)
+
+    @staticmethod
+    def _recall(truth: List[Set[str]], approx: List[List[str]]) -> float:
+        ratios = [len(t.intersection(a)) / len(t) for t, a in zip(truth, approx) if t]
+        return sum(ratios) / len(ratios) if ratios else 1.0
+
+    async def tune(
+        self,
+        collection_name: str,
+        profile: IndexProfile,
+        recall_target: float = 0.95,
+        sample_size: int = 50,
+        top_k: int = 10
+    ) -> TuningResult:
+        """
+        调优检索参数
+
+        Args:
+            collection_name: 集合名称
+            profile: 集合当前使用的索引配置
+            recall_target: 召回率目标（0~1）
+            sample_size: 抽样查询数量
+            top_k: 计算 recall@k 的 k
+
+        Returns:
+            调优结果
+        """
+        samples = await self.store.sample_vectors(collection_name, sample_size)
+        if not samples:
+            raise ValueError(f"集合为空，无法调优: {collection_name}")
+
+        own_ids = [sample_id for sample_id, _ in samples]
+        vectors = [vector for _, vector in samples]
+
+        if not profile.tunable:
+            return TuningResult(
+                index_profile=profile.name, search_param=None, value=None, recall=1.0,
+                latency_ms=0.0, recall_target=recall_target, sample_size=len(samples)
+            )
+
+        index_params = await self.store.describe_index(collection_name)
+        truth = await self._exact_neighbors(
+            collection_name, vectors, own_ids, top_k, (index_params or {}).get("metric_type") or profile.metric_type
+        )
+
+        measurements: List[Dict[str, Any]] = []
+        chosen = None
+        for value in profile.candidate_values(top_k, index_params):
+            started = time.perf_counter()
+            results = await self.store.search(
+                collection_name, vectors, top_k=top_k + 1,
+                search_params=profile.search_params(value)
+            )
+            latency_ms = (time.perf_counter() - started) * 1000 / len(vectors)
+            recall = self._recall(
+                truth, [self._neighbors(hits, own_id, top_k) for hits, own_id in zip(results, own_ids)]
+            )
+            measurements.append({"value": value, "recall": round(recall, 4), "latency_ms": round(latency_ms, 3)})
+            logger.info(f"索引调优 {collection_name}: {profile.search_param}={value}, recall@{top_k}={recall:.4f}, {latency_ms:.2f}ms/查询")
+            if recall >= recall_target:
+                chosen = measurements[-1]
+                break
+
+        if chosen is None:
+            # 所有候选都达不到目标时，取召回率最高的取值
+            chosen = max(measurements, key=lambda m: m["recall"])
+            logger.warning(f"索引调优未达到召回目标 {recall_target}: {collection_name}，使用召回率最高的参数")
+
+        return TuningResult(
+            index_profile=profile.name,
+            search_param=profile.search_param,
+            value=chosen["value"],
+            recall=chosen["recall"],
+            latency_ms=chosen["latency_ms"],
+            recall_target=recall_target,
+            sample_size=len(samples),
+            measurements=measurements
+        )
+
+
+# 全局实例
+index_auto_tuner = IndexAutoTuner()
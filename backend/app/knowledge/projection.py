@@ -0,0 +1,131 @@
+"""
+向量降维投影
+在知识库自己的分块向量上拟合 PCA，把 1024 维向量投影到更低维度后建索引，
+入库和查询使用同一投影（保存为 .npz 文件）
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logger import logger
+
+
+class PCAProjection:
+    """
+    PCA 投影
+
+    transform 先减去均值再乘以主成分矩阵，输出重新归一化，
+    使投影后的内积仍可作为余弦相似度使用。
+    """
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, explained_variance_ratio: np.ndarray):
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)  # (目标维度, 原始维度)
+        self.explained_variance_ratio = explained_variance_ratio.astype(np.float32)
+
+    @property
+    def input_dimension(self) -> int:
+        return self.components.shape[1]
+
+    @property
+    def dimension(self) -> int:
+        return self.components.shape[0]
+
+    @property
+    def explained_variance(self) -> float:
+        """保留的方差比例"""
+        return float(self.explained_variance_ratio.sum())
+
+    @classmethod
+    def fit(cls, vectors: List[List[float]], dimension: int) -> "PCAProjection":
+        """在样本向量上拟合 PCA（样本数必须大于目标维度）"""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2 or len(matrix) <= dimension:
+            raise ValueError(f"拟合 {dimension} 维投影至少需要 {dimension + 1} 条向量，当前 {len(matrix)} 条")
+        if dimension >= matrix.shape[1]:
+            raise ValueError(f"投影维度必须小于原始维度 {matrix.shape[1]}")
+
+        mean = matrix.mean(axis=0)
+        centered = matrix - mean
+        _, singular_values, vt = np.linalg.svd(centered, full_matrices=False)
+        variance = singular_values ** 2
+        return cls(mean, vt[:dimension], variance[:dimension] / variance.sum())
+
+    def transform(self, vectors: List[List[float]]) -> np.ndarray:
+        """投影并归一化"""
+        projected = (np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T
+        norms = np.linalg.norm(projected, axis=1, keepdims=True)
+        return projected / np.where(norms == 0, 1.0, norms)
+
+    def save(self, path: Path):
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp_path,
+            mean=self.mean,
+            components=self.components,
+            explained_variance_ratio=self.explained_variance_ratio
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "PCAProjection":
+        with np.load(path) as data:
+            return cls(data["mean"], data["components"], data["explained_variance_ratio"])
+
+
+class ProjectionStore:
+    """
+    投影文件管理
+
+    每个集合一个 {集合名}.npz 文件，首次使用时加载并缓存在内存中
+    （1024 -> 256 维的投影矩阵约 1MB）。
+    """
+
+    def __init__(self, data_dir: str = None):
+        self.data_dir = Path(data_dir or settings.PROJECTION_DIR)
+        self._projections: Dict[str, PCAProjection] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, collection_name: str) -> Path:
+        return self.data_dir / f"{collection_name}.npz"
+
+    def get(self, collection_name: str) -> Optional[PCAProjection]:
+        """获取集合的投影（没有投影时返回 None）"""
+        projection = self._projections.get(collection_name)
+        if projection is not None:
+            return projection
+        with self._lock:
+            if collection_name not in self._projections:
+                path = self._path(collection_name)
+                if not path.exists():
+                    return None
+                self._projections[collection_name] = PCAProjection.load(path)
+            return self._projections[collection_name]
+
+    def save(self, collection_name: str, projection: PCAProjection):
+        with self._lock:
+            self.data_dir.mkdir(parents=True, exist_ok=True)
+            projection.save(self._path(collection_name))
+            self._projections[collection_name] = projection
+        logger.info(
+            f"向量投影已保存: {collection_name} ({projection.input_dimension} -> {projection.dimension} 维, "
+            f"保留方差 {projection.explained_variance:.2%})"
+        )
+
+    def drop(self, collection_name: str):
+        with self._lock:
+            self._projections.pop(collection_name, None)
+            path = self._path(collection_name)
+            if path.exists():
+                path.unlink()
+
+    def stats(self) -> Dict[str, int]:
+        return {"loaded_projections": len(self._projections)}
+
+
+# 全局实例
+projection_store = ProjectionStore()
@@ -0,0 +1,286 @@
+"""
+向量量化与全精度重打分
+知识库可选择 int8（IVF_SQ8 标量量化索引）、二值量化或 PCA 降维后的向量做首轮检索，
+全精度向量保存在磁盘冷存储（内存映射文件）中，对首轮候选精确重打分
+"""
+import time
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.knowledge.embedded_store import EmbeddedVectorStore
+from app.knowledge.index_profiles import CollectionSpec
+from app.knowledge.projection import PCAProjection, projection_store
+from app.knowledge.vector_store import VectorStore, vector_store
+
+
+def binarize(vectors: List[List[float]]) -> List[bytes]:
+    """按符号位将浮点向量量化为二值向量（每维 1 bit，打包为 bytes）"""
+    bits = np.packbits(np.asarray(vectors, dtype=np.float32) > 0, axis=1)
+    return [row.tobytes() for row in bits]
+
+
+def bytes_per_vector(dimension: int, quantization: str) -> int:
+    """单条向量在首轮检索索引中占用的字节数"""
+    if quantization == "binary":
+        return (dimension + 7) // 8
+    if quantization == "int8":
+        return dimension
+    return dimension * 4
+
+
+@dataclass
+class QuantizationReport:
+    """量化检索与全精度检索的召回/延迟对比"""
+    quantization: str
+    projection_dim: Optional[int]
+    index_profile: str
+    top_k: int
+    rescore_multiplier: int
+    real_queries: int
+    sampled_queries: int
+    float_latency_ms: float
+    quantized_latency_ms: float
+    rescored_latency_ms: float
+    quantized_recall: float
+    rescored_recall: float
+    float_bytes_per_vector: int
+    quantized_bytes_per_vector: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class QuantizedSearcher:
+    """
+    量化检索器
+
+    首轮在向量存储中用压缩向量（量化和/或降维）检索 top_k * rescore_multiplier 个候选，
+    再从冷存储读取候选的全精度向量计算精确余弦相似度，取前 top_k。
+    冷存储以向量存储的主键为键，只在重打分时按需读取，不常驻内存。
+    只降维且关闭重打分的知识库直接返回首轮结果。
+    """
+
+    def __init__(self, store: VectorStore = None, cold_store: EmbeddedVectorStore = None):
+        self.store = store or vector_store
+        self.cold_store = cold_store or EmbeddedVectorStore(settings.QUANTIZATION_COLD_STORE_DIR)
+
+        # 统计信息
+        self.searches = 0
+        self.candidates_rescored = 0
+        self.candidates_missing = 0
+
+    @staticmethod
+    def compress(
+        spec: CollectionSpec,
+        vectors: List[List[float]],
+        projection: PCAProjection = None
+    ) -> List[Any]:
+        """将原始向量转换为向量存储中的形式（先降维，再二值化）"""
+        if spec.projected:
+            projection = projection or projection_store.get(spec.collection_name)
+            if projection is None:
+                raise ValueError(f"集合缺少降维投影: {spec.collection_name}")
+            vectors = projection.transform(vectors)
+        if spec.quantization == "binary":
+            return binarize(vectors)
+        return vectors.tolist() if isinstance(vectors, np.ndarray) else vectors
+
+    async def create(self, collection_name: str, dimension: int):
+        """创建冷存储集合"""
+        await self.cold_store.create_collection(collection_name, dimension)
+
+    async def drop(self, collection_name: str):
+        """删除冷存储集合"""
+        await self.cold_store.drop_collection(collection_name)
+
+    def prepare_rows(
+        self,
+        spec: CollectionSpec,
+        rows: List[Dict[str, Any]],
+        projection: PCAProjection = None
+    ) -> List[Dict[str, Any]]:
+        """生成写入向量存储的行（降维/二值量化时替换向量，int8 由索引量化）"""
+        if spec.stores_full_vectors:
+            return rows
+        compressed = self.compress(spec, [row["embedding"] for row in rows], projection)
+        return [{**row, "embedding": vector} for row, vector in zip(rows, compressed)]
+
+    async def add(
+        self,
+        collection_name: str,
+        ids: List[str],
+        vectors: List[List[float]],
+        metadatas: List[Dict[str, Any]]
+    ):
+        """以向量存储的主键写入全精度向量（保留元数据，使过滤表达式同样适用）"""
+        if not await self.cold_store.has_collection(collection_name):
+            await self.create(collection_name, len(vectors[0]))
+        await self.cold_store.insert(collection_name, [
+            {"id": row_id, "embedding": vector, "content": "", "metadata": metadata}
+            for row_id, vector, metadata in zip(ids, vectors, metadatas)
+        ])
+        await self.cold_store.flush(collection_name)
+
+    async def remap_ids(self, collection_name: str, mapping: Dict[str, str]):
+        """向量存储主键变化（集合迁移）后同步冷存储"""
+        if await self.cold_store.has_collection(collection_name):
+            await self.cold_store.remap_ids(collection_name, mapping)
+
+    async def first_pass(
+        self,
+        spec: CollectionSpec,
+        vectors: List[List[float]],
+        top_k: int,
+        filter_expr: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """只用压缩向量检索（分数为压缩空间的相似度/距离）"""
+        return await self.store.search(
+            spec.collection_name,
+            self.compress(spec, vectors),
+            top_k=top_k,
+            filter_expr=filter_expr,
+            search_params=spec.search_params()
+        )
+
+    async def rescore(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        candidates: List[List[Dict[str, Any]]],
+        top_k: int
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        用全精度向量对候选精确重打分
+
+        冷存储中找不到的候选（如冷存储功能上线前写入的数据）被丢弃，
+        首轮分数保存在 quantized_score 中。
+        """
+        ids = list({hit["id"] for hits in candidates for hit in hits})
+        stored = await self.cold_store.fetch_vectors(collection_name, ids) if ids else {}
+
+        queries = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries /= np.where(norms == 0, 1.0, norms)
+
+        results = []
+        for query, hits in zip(queries, candidates):
+            kept = [hit for hit in hits if hit["id"] in stored]
+            self.candidates_rescored += len(kept)
+            self.candidates_missing += len(hits) - len(kept)
+            if not kept:
+                results.append([])
+                continue
+            scores = np.stack([stored[hit["id"]] for hit in kept]) @ query
+            order = np.argsort(-scores)[:top_k]
+            results.append([
+                {**kept[i], "score": float(scores[i]), "quantized_score": kept[i]["score"]}
+                for i in order
+            ])
+        return results
+
+    async def search(
+        self,
+        spec: CollectionSpec,
+        vectors: List[List[float]],
+        top_k: int,
+        filter_expr: Optional[str] = None,
+        rescore_multiplier: int = None
+    ) -> List[List[Dict[str, Any]]]:
+        """压缩向量首轮检索 + 全精度重打分"""
+        if not spec.rescored:
+            self.searches += len(vectors)
+            return await self.first_pass(spec, vectors, top_k, filter_expr)
+        multiplier = max(1, rescore_multiplier or settings.QUANTIZATION_RESCORE_MULTIPLIER)
+        candidates = await self.first_pass(spec, vectors, top_k * multiplier, filter_expr)
+        self.searches += len(vectors)
+        return await self.rescore(spec.collection_name, vectors, candidates, top_k)
+
+    @staticmethod
+    def _recall(truth: List[Set[str]], approx: List[List[Dict[str, Any]]]) -> float:
+        ratios = [
+            len(t.intersection(hit["id"] for hit in hits)) / len(t)
+            for t, hits in zip(truth, approx) if t
+        ]
+        return sum(ratios) / len(ratios) if ratios else 1.0
+
+    async def report(
+        self,
+        spec: CollectionSpec,
+        query_vectors: List[List[float]],
+        top_k: int = 10,
+        real_queries: int = None
+    ) -> QuantizationReport:
+        """
+        生成召回/延迟报告
+
+        以冷存储上的全精度暴力检索为参考结果，分别测量只用压缩向量的首轮检索
+        与首轮检索 + 重打分的 recall@k；延迟为逐条查询的平均耗时。
+
+        Args:
+            spec: 量化或降维知识库的集合描述
+            query_vectors: 查询向量（优先使用真实查询）
+            top_k: 计算 recall@k 的 k
+            real_queries: query_vectors 中真实查询的数量，其余为抽样的分块向量
+        """
+        if not spec.compressed:
+            raise ValueError(f"知识库未启用向量量化或降维: {spec.collection_name}")
+        if not query_vectors:
+            raise ValueError(f"没有可用于生成报告的查询: {spec.collection_name}")
+        if real_queries is None:
+            real_queries = len(query_vectors)
+
+        async def _timed(fn) -> tuple:
+            results, started = [], time.perf_counter()
+            for vector in query_vectors:
+                results.extend(await fn([vector]))
+            return results, (time.perf_counter() - started) * 1000 / len(query_vectors)
+
+        exact, float_ms = await _timed(
+            lambda v: self.cold_store.search(spec.collection_name, v, top_k=top_k)
+        )
+        quantized, quantized_ms = await _timed(lambda v: self.first_pass(spec, v, top_k))
+        # 降维知识库关闭重打分时同样测量重打分路径，便于决定是否开启
+        rescore_spec = replace(spec, projection_rescore=True)
+        rescored, rescored_ms = await _timed(lambda v: self.search(rescore_spec, v, top_k))
+
+        truth = [{hit["id"] for hit in hits} for hits in exact]
+        dimension = len(query_vectors[0])
+        report = QuantizationReport(
+            quantization=spec.quantization,
+            projection_dim=spec.projection_dim,
+            index_profile=spec.profile.name,
+            top_k=top_k,
+            rescore_multiplier=settings.QUANTIZATION_RESCORE_MULTIPLIER,
+            real_queries=real_queries,
+            sampled_queries=len(query_vectors) - real_queries,
+            float_latency_ms=round(float_ms, 3),
+            quantized_latency_ms=round(quantized_ms, 3),
+            rescored_latency_ms=round(rescored_ms, 3),
+            quantized_recall=round(self._recall(truth, quantized), 4),
+            rescored_recall=round(self._recall(truth, rescored), 4),
+            float_bytes_per_vector=bytes_per_vector(dimension, "none"),
+            quantized_bytes_per_vector=bytes_per_vector(spec.projection_dim or dimension, spec.quantization)
+        )
+        logger.info(
+            f"量化报告 {spec.collection_name} (量化: {spec.quantization}, 降维: {spec.projection_dim or '无'}): "
+            f"首轮 recall@{top_k}={report.quantized_recall}, 重打分 recall@{top_k}={report.rescored_recall}, "
+            f"延迟 全精度 {report.float_latency_ms}ms / 量化 {report.quantized_latency_ms}ms / "
+            f"重打分 {report.rescored_latency_ms}ms"
+        )
+        return report
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "searches": self.searches,
+            "candidates_rescored": self.candidates_rescored,
+            "candidates_missing": self.candidates_missing,
+            "cold_store": self.cold_store.stats()
+        }
+
+
+# 全局实例
+quantized_searcher = QuantizedSearcher()
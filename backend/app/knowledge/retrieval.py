@@ -2,11 +2,28 @@
 知识库检索服务
 支持向量检索、关键词检索、混合检索
 """
-from typing import List, Dict, Any, Optional
+import asyncio
+import hashlib
+import heapq
+import threading
+import time
+from collections import deque
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
-from pymilvus import connections, Collection, utility
 from app.core.config import settings
 from app.core.logger import logger
+from app.knowledge.executor import embedding_executor, rerank_executor
+from app.knowledge.batcher import MicroBatcher
+from app.knowledge.cache import LRUCache, QueryEmbeddingCache, normalize_text
+from app.knowledge.bm25 import keyword_index_manager
+from app.knowledge.vector_store import SPARSE_FIELD, vector_store
+from app.knowledge.index_profiles import CollectionSpec
+from app.knowledge.filters import SearchFilter
+from app.knowledge.quantization import quantized_searcher
+from app.knowledge.content_store import content_embedding_store, content_key
+from app.knowledge.embedding_providers import (
+    LOCAL_PROVIDER, EmbeddingProvider, LocalEmbeddingProvider, embedding_providers
+)
 
 
 @dataclass
@@ -24,23 +41,146 @@ class RetrievalService:
     
     def __init__(self):
         self._connected = False
+        self._embedding_model = None
+        self._model_lock = threading.Lock()
+        # 并发查询向量化请求合并为一次批量前向计算
+        self.query_batcher = MicroBatcher(
+            self._texts_to_vectors,
+            window_ms=settings.EMBEDDING_QUERY_BATCH_WINDOW_MS,
+            max_batch_size=settings.EMBEDDING_QUERY_BATCH_MAX_SIZE,
+            name="query_embedding"
+        )
+        # 本地模型作为 local 提供方注册；远程提供方的查询使用各自的微批调度器
+        embedding_providers.register(LocalEmbeddingProvider(self._texts_to_vectors))
+        self._query_batchers: Dict[str, MicroBatcher] = {LOCAL_PROVIDER: self.query_batcher}
+        self.query_cache = QueryEmbeddingCache(
+            max_size=settings.EMBEDDING_QUERY_CACHE_SIZE,
+            ttl=settings.EMBEDDING_QUERY_CACHE_TTL,
+            use_redis=settings.EMBEDDING_QUERY_CACHE_REDIS
+        )
+        # 稠密 + 稀疏查询向量缓存（稀疏向量为字典，只缓存在进程内）
+        self.sparse_query_cache = LRUCache(
+            max_size=settings.EMBEDDING_QUERY_CACHE_SIZE,
+            ttl=settings.EMBEDDING_QUERY_CACHE_TTL
+        )
+        # 各集合最近的查询文本（用于量化召回/延迟报告）
+        self._recent_queries: Dict[str, deque] = {}
+    
+    def recent_queries(self, collection_name: str, limit: int) -> List[str]:
+        """获取集合最近的查询文本（去重，新的在前）"""
+        queries = list(dict.fromkeys(reversed(self._recent_queries.get(collection_name, ()))))
+        return queries[:limit]
+    
+    def _record_query(self, collection_name: str, query_text: str):
+        if collection_name not in self._recent_queries:
+            self._recent_queries[collection_name] = deque(maxlen=settings.QUANTIZATION_REPORT_SAMPLE_SIZE)
+        self._recent_queries[collection_name].append(query_text)
+    
+    async def _search_vectors(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        top_k: int,
+        filter_expr: str = None,
+        spec: CollectionSpec = None
+    ) -> List[List[Dict[str, Any]]]:
+        """执行向量检索（量化/降维知识库先用压缩向量召回候选，再用全精度向量重打分）"""
+        if spec and spec.compressed:
+            return await quantized_searcher.search(spec, vectors, top_k, filter_expr)
+        return await vector_store.search(
+            collection_name,
+            vectors,
+            top_k=top_k,
+            filter_expr=filter_expr,
+            search_params=spec.search_params() if spec else None
+        )
+    
+    @staticmethod
+    def _filter_expr(filters: Optional[SearchFilter], spec: CollectionSpec = None) -> Optional[str]:
+        """生成过滤表达式（没有集合描述时按 metadata 过滤，对任何集合都有效）"""
+        if spec:
+            return spec.filter_expr(filters)
+        if filters is None or filters.is_empty():
+            return None
+        return filters.to_expr()
+    
+    @staticmethod
+    def _widening_radii(score_threshold: float, min_results: int) -> List[float]:
+        """依次尝试的阈值：原阈值，命中不足时按步长放宽，不低于下限"""
+        radii = [score_threshold]
+        floor, step = settings.RANGE_SEARCH_MIN_SCORE, settings.RANGE_SEARCH_WIDEN_STEP
+        if min_results > 0 and step > 0:
+            while radii[-1] > floor:
+                radii.append(max(floor, radii[-1] - step))
+        return radii
+    
+    async def _threshold_search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        top_k: int,
+        score_threshold: float,
+        filter_expr: str = None,
+        spec: CollectionSpec = None,
+        min_results: int = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        带相似度阈值的向量检索
+        
+        阈值作为范围检索的 radius 下推到向量存储，只传回达到阈值的命中。
+        某个查询达到阈值的命中少于 min_results 时逐步放宽阈值，只对这些查询重新检索。
+        量化/降维知识库的首轮分数不是最终分数，仍在重打分后按阈值过滤。
+        """
+        min_results = settings.RANGE_SEARCH_MIN_RESULTS if min_results is None else min_results
+        min_results = min(min_results, top_k)
+        radii = self._widening_radii(score_threshold, min_results)
+        
+        if not settings.RANGE_SEARCH_ENABLED or (spec and spec.compressed):
+            results = await self._search_vectors(
+                collection_name, vectors, top_k, filter_expr=filter_expr, spec=spec
+            )
+            filtered = []
+            for hits in results:
+                for radius in radii:
+                    kept = [hit for hit in hits if hit["score"] >= radius]
+                    if len(kept) >= min_results:
+                        break
+                filtered.append(kept)
+            return filtered
+        
+        search_params = spec.search_params() if spec else None
+        results: List[List[Dict[str, Any]]] = [[] for _ in vectors]
+        pending = list(range(len(vectors)))
+        for radius in radii:
+            if radius != score_threshold:
+                logger.info(
+                    f"{len(pending)} 个查询达到阈值的命中少于 {min_results} 条，放宽阈值到 {radius:.2f} 重新检索"
+                )
+            hits_list = await vector_store.range_search(
+                collection_name,
+                [vectors[i] for i in pending],
+                radius,
+                top_k=top_k,
+                filter_expr=filter_expr,
+                search_params=search_params
+            )
+            for i, hits in zip(pending, hits_list):
+                results[i] = hits
+            pending = [i for i in pending if len(results[i]) < min_results]
+            if not pending:
+                break
+        return results
     
     async def connect(self):
-        """连接Milvus"""
+        """连接向量存储"""
         if not self._connected:
-            connections.connect(
-                alias="default",
-                host=settings.MILVUS_HOST,
-                port=settings.MILVUS_PORT,
-                user=settings.MILVUS_USER or None,
-                password=settings.MILVUS_PASSWORD or None
-            )
+            await vector_store.connect()
             self._connected = True
     
     async def disconnect(self):
         """断开连接"""
         if self._connected:
-            connections.disconnect("default")
+            await vector_store.close()
             self._connected = False
     
     async def vector_search(
@@ -50,18 +190,24 @@ class RetrievalService:
         query_vector: List[float] = None,
         top_k: int = 10,
         score_threshold: float = 0.7,
-        filter_expr: str = None
+        filters: SearchFilter = None,
+        spec: CollectionSpec = None,
+        min_results: int = None
     ) -> List[Dict[str, Any]]:
         """
         向量检索
         
+        相似度阈值在向量存储中过滤（Milvus 范围检索），低于阈值的命中不会被传回。
+        
         Args:
             collection_name: 集合名称
             query_text: 查询文本（将自动转换为向量）
             query_vector: 查询向量
             top_k: 返回数量
             score_threshold: 相似度阈值
-            filter_expr: 过滤表达式
+            filters: 过滤条件（按知识库、文档、分块、页面）
+            spec: 知识库的集合描述（决定索引检索参数），为空时使用默认参数
+            min_results: 达到阈值的结果少于该数量时放宽阈值，为空时使用配置
         
         Returns:
             检索结果列表
@@ -76,134 +222,474 @@ class RetrievalService:
         # 如果提供的是文本，需要先转换为向量
         if query_text and not query_vector:
             logger.info(f"将查询文本转换为向量...")
-            query_vector = await self._text_to_vector(query_text)
+            query_vector = await self._text_to_vector(query_text, spec)
             logger.info(f"向量转换完成，维度: {len(query_vector)}")
         
         if not query_vector:
             raise ValueError("Must provide either query_text or query_vector")
+        if query_text:
+            self._record_query(collection_name, query_text)
         
-        logger.info(f"加载 Milvus Collection: {collection_name}")
-        collection = Collection(collection_name)
-        collection.load()
-        
-        # 获取集合信息
-        num_entities = collection.num_entities
-        logger.info(f"Collection 中共有 {num_entities} 条向量记录")
-        
-        search_params = {
-            "metric_type": "COSINE",
-            "params": {"nprobe": 10}
-        }
-        
-        logger.info(f"执行 Milvus 向量搜索（相似度算法: COSINE）...")
-        results = collection.search(
-            data=[query_vector],
-            anns_field="embedding",
-            param=search_params,
-            limit=top_k,
-            expr=filter_expr,
-            output_fields=["content", "metadata", "source"]
+        search_params = spec.search_params() if spec else None
+        compression = ""
+        if spec and spec.compressed:
+            compression = f", 量化: {spec.quantization}, 降维: {spec.projection_dim or '无'}"
+        logger.info(f"执行向量搜索（相似度算法: COSINE, 检索参数: {search_params or '默认'}{compression}）...")
+        results = await self._threshold_search(
+            collection_name, [query_vector], top_k, score_threshold,
+            filter_expr=self._filter_expr(filters, spec), spec=spec, min_results=min_results
         )
+        logger.info(f"向量检索完成")
         
-        logger.info(f"Milvus 检索完成")
-        
-        search_results = []
-        for hits in results:
-            logger.info(f"找到 {len(hits)} 条原始结果")
-            for i, hit in enumerate(hits):
-                if hit.score >= score_threshold:
-                    search_results.append({
-                        "id": str(hit.id),
-                        "content": hit.entity.get("content", ""),
-                        "score": float(hit.score),
-                        "metadata": hit.entity.get("metadata", {}),
-                        "source": hit.entity.get("source", "")
-                    })
-                    if i < 3:  # 打印前3条结果
-                        content_preview = hit.entity.get("content", "")[:100].replace('\n', ' ')
-                        logger.info(f"  结果 {i+1}: 分数={hit.score:.4f}, 内容={content_preview}...")
-                else:
-                    logger.debug(f"  结果 {i+1} 被过滤（分数 {hit.score:.4f} < 阈值 {score_threshold}）")
+        search_results = results[0]
+        for i, hit in enumerate(search_results[:3]):  # 打印前3条结果
+            content_preview = hit["content"][:100].replace('\n', ' ')
+            logger.info(f"  结果 {i+1}: 分数={hit['score']:.4f}, 内容={content_preview}...")
         
         logger.info(f"========== 检索完成 ==========")
-        logger.info(f"✅ 过滤后返回 {len(search_results)} 条结果")
+        logger.info(f"✅ 达到阈值的结果 {len(search_results)} 条")
         logger.info(f"====================================")
         
         return search_results
     
-    async def _text_to_vector(self, text: str) -> List[float]:
-        """将文本转换为向量"""
-        try:
+    async def federated_search(
+        self,
+        specs: List[CollectionSpec],
+        query_text: str,
+        top_k: int = 10,
+        score_threshold: float = 0.7,
+        filters: SearchFilter = None
+    ) -> List[Dict[str, Any]]:
+        """
+        跨知识库联合检索
+        
+        查询对每个 Embedding 提供方只编码一次，各集合并发检索，再用全局堆合并各集合的 top_k。
+        使用同一提供方的集合分数可以直接比较；混用不同模型的知识库时分数只是近似可比。
+        单个集合检索失败时跳过该集合。
+        
+        Args:
+            specs: 参与检索的知识库集合描述
+            query_text: 查询文本
+            top_k: 全局返回数量
+            score_threshold: 相似度阈值
+            filters: 过滤条件
+        
+        Returns:
+            按分数降序的检索结果，每条结果附带 collection_name 与 kb_id
+        """
+        if not specs:
+            return []
+        
+        await self.connect()
+        query_vectors: Dict[str, List[float]] = {}
+        for spec in specs:
+            provider = self._provider(spec)
+            if provider.name not in query_vectors:
+                query_vectors[provider.name] = await self._text_to_vector(query_text, spec)
+        
+        per_collection = await asyncio.gather(
+            *(
+                self.vector_search(
+                    collection_name=spec.collection_name,
+                    query_vector=query_vectors[self._provider(spec).name],
+                    top_k=top_k,
+                    score_threshold=score_threshold,
+                    filters=filters,
+                    spec=spec
+                )
+                for spec in specs
+            ),
+            return_exceptions=True
+        )
+        
+        candidates = []
+        for spec, results in zip(specs, per_collection):
+            if isinstance(results, Exception):
+                logger.warning(f"联合检索中集合 {spec.collection_name} 检索失败: {str(results)}")
+                continue
+            candidates.extend(
+                {**r, "collection_name": spec.collection_name, "kb_id": spec.kb_id}
+                for r in results
+            )
+        
+        merged = heapq.nlargest(top_k, candidates, key=lambda r: r["score"])
+        logger.info(f"联合检索完成: {len(specs)} 个知识库, 候选 {len(candidates)} 条, 返回 {len(merged)} 条")
+        return merged
+    
+    async def batch_vector_search(
+        self,
+        collection_name: str,
+        queries: List[str],
+        top_k: int = 10,
+        score_threshold: float = 0.7,
+        filters: SearchFilter = None,
+        spec: CollectionSpec = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        批量向量检索
+        
+        N 个查询一次批量编码，再用一次 N 个向量的检索请求完成，
+        摊薄逐条检索时的 gRPC 往返开销。
+        
+        Args:
+            collection_name: 集合名称
+            queries: 查询文本列表
+            top_k: 每个查询返回数量
+            score_threshold: 相似度阈值
+            filters: 过滤条件
+            spec: 知识库的集合描述
+        
+        Returns:
+            与 queries 顺序一致的检索结果列表
+        """
+        if not queries:
+            return []
+        
+        await self.connect()
+        
+        vectors = await self._queries_to_vectors(queries, spec)
+        batch_results = await self._threshold_search(
+            collection_name, vectors, top_k, score_threshold, filter_expr=self._filter_expr(filters, spec), spec=spec
+        )
+        logger.info(
+            f"批量向量检索完成: {collection_name}, 查询数 {len(queries)}, "
+            f"共返回 {sum(len(r) for r in batch_results)} 条结果"
+        )
+        return batch_results
+    
+    def _get_embedding_model(self):
+        """获取 Embedding 模型（懒加载，线程安全）"""
+        if self._embedding_model is not None:
+            return self._embedding_model
+        
+        with self._model_lock:
+            if self._embedding_model is not None:
+                return self._embedding_model
+            
             from sentence_transformers import SentenceTransformer
+            import os
             import time
             
-            # 如果没有加载模型，先加载
-            if not hasattr(self, '_embedding_model'):
-                model_path = settings.EMBEDDING_MODEL or 'BAAI/bge-m3'
-                logger.info(f"🔄 正在加载 Embedding 模型: {model_path}")
-                
-                # 检查是否是本地路径
-                import os
-                if os.path.exists(model_path):
-                    logger.info(f"💾 从本地路径加载模型: {model_path}")
-                    start_time = time.time()
-                    self._embedding_model = SentenceTransformer(
-                        model_path,
-                        device=settings.EMBEDDING_DEVICE or 'cpu'
-                    )
-                    load_time = time.time() - start_time
-                    logger.info(f"✅ Embedding 模型加载成功（耗时: {load_time:.2f}s）")
-                else:
-                    logger.info(f"🌐 从 HuggingFace 下载模型: {model_path}")
-                    start_time = time.time()
-                    self._embedding_model = SentenceTransformer(
-                        model_path,
-                        device=settings.EMBEDDING_DEVICE or 'cpu',
-                        cache_folder=settings.EMBEDDING_CACHE_FOLDER
-                    )
-                    load_time = time.time() - start_time
-                    logger.info(f"✅ Embedding 模型加载成功（耗时: {load_time:.2f}s）")
+            model_path = settings.EMBEDDING_MODEL or 'BAAI/bge-m3'
+            logger.info(f"🔄 正在加载 Embedding 模型: {model_path}")
             
-            # 生成向量
+            # 检查是否是本地路径
             start_time = time.time()
-            vector = self._embedding_model.encode(text, normalize_embeddings=True)
-            encode_time = time.time() - start_time
-            logger.info(f"🧬 文本编码完成（耗时: {encode_time:.3f}s, 维度: {len(vector)}）")
-            
-            return vector.tolist()
+            if settings.EMBEDDING_SPARSE_ENABLED:
+                # BGEM3FlagModel 一次前向计算同时输出稠密向量和稀疏词汇权重
+                from FlagEmbedding import BGEM3FlagModel
+                logger.info(f"🧩 使用 BGE-M3 模式加载（稠密 + 稀疏向量）")
+                if settings.EMBEDDING_BACKEND == "onnx":
+                    logger.warning("ONNX 后端不支持稀疏向量，已改用 PyTorch 后端")
+                self._embedding_model = BGEM3FlagModel(
+                    model_path,
+                    use_fp16=settings.EMBEDDING_DEVICE == 'cuda',
+                    device=settings.EMBEDDING_DEVICE or 'cpu'
+                )
+            elif settings.EMBEDDING_BACKEND == "onnx":
+                from app.knowledge.embedding_backends import OnnxEmbeddingModel
+                logger.info(f"⚡ 使用 ONNX Runtime 后端加载: {settings.EMBEDDING_ONNX_MODEL_PATH}")
+                self._embedding_model = OnnxEmbeddingModel(settings.EMBEDDING_ONNX_MODEL_PATH)
+            elif os.path.exists(model_path):
+                logger.info(f"💾 从本地路径加载模型: {model_path}")
+                self._embedding_model = SentenceTransformer(
+                    model_path,
+                    device=settings.EMBEDDING_DEVICE or 'cpu'
+                )
+            else:
+                logger.info(f"🌐 从 HuggingFace 下载模型: {model_path}")
+                self._embedding_model = SentenceTransformer(
+                    model_path,
+                    device=settings.EMBEDDING_DEVICE or 'cpu',
+                    cache_folder=settings.EMBEDDING_CACHE_FOLDER
+                )
+            load_time = time.time() - start_time
+            logger.info(f"✅ Embedding 模型加载成功（耗时: {load_time:.2f}s）")
+        
+        return self._embedding_model
+    
+    def embedding_backend_stats(self) -> Dict[str, Any]:
+        """Embedding 推理后端信息（ONNX 后端包含导出时记录的向量一致性）"""
+        model = self._embedding_model
+        if hasattr(model, "stats"):
+            return model.stats()
+        return {
+            "backend": "torch",
+            "loaded": model is not None,
+            "device": settings.EMBEDDING_DEVICE
+        }
+    
+    def _encode_texts(self, texts: List[str], batch_size: int = None) -> List[List[float]]:
+        """
+        批量编码文本
+        
+        先按文本长度排序再分桶，使同一批次内的文本长度接近，
+        减少 padding 带来的无效计算；编码完成后按原顺序还原。
+        
+        Args:
+            texts: 文本列表
+            batch_size: 每次前向计算的文本数量
+        
+        Returns:
+            与 texts 顺序一致的向量列表
+        """
+        if settings.EMBEDDING_SPARSE_ENABLED:
+            return self._encode_texts_hybrid(texts, batch_size, return_sparse=False)[0]
+        
+        model = self._get_embedding_model()
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        
+        for bucket in self._length_buckets(texts, batch_size):
+            encoded = model.encode(
+                [texts[i] for i in bucket],
+                batch_size=len(bucket),
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+            for i, vector in zip(bucket, encoded):
+                vectors[i] = vector.tolist()
+        
+        return vectors
+    
+    @staticmethod
+    def _length_buckets(texts: List[str], batch_size: int = None) -> List[List[int]]:
+        """按文本长度降序分桶，返回每个批次的原始下标"""
+        batch_size = max(1, batch_size or settings.EMBEDDING_BATCH_SIZE)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+    
+    def _encode_texts_hybrid(
+        self,
+        texts: List[str],
+        batch_size: int = None,
+        return_sparse: bool = True
+    ) -> Tuple[List[List[float]], List[Dict[int, float]]]:
+        """
+        用 BGE-M3 同时编码稠密向量和稀疏词汇权重（一次前向计算）
+        
+        Returns:
+            (稠密向量列表, 稀疏向量列表)，稀疏向量为 {词 ID: 权重}；
+            return_sparse 为 False 时稀疏向量列表为空
+        """
+        model = self._get_embedding_model()
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        sparse_vectors: List[Optional[Dict[int, float]]] = [None] * len(texts)
+        
+        for bucket in self._length_buckets(texts, batch_size):
+            output = model.encode(
+                [texts[i] for i in bucket],
+                batch_size=len(bucket),
+                return_dense=True,
+                return_sparse=return_sparse,
+                return_colbert_vecs=False
+            )
+            for j, i in enumerate(bucket):
+                vectors[i] = output["dense_vecs"][j].tolist()
+                if return_sparse:
+                    sparse_vectors[i] = {
+                        int(token): float(weight)
+                        for token, weight in output["lexical_weights"][j].items()
+                    }
+        
+        return vectors, (sparse_vectors if return_sparse else [])
+    
+    @staticmethod
+    def _provider(spec: CollectionSpec = None) -> EmbeddingProvider:
+        """知识库使用的 Embedding 提供方（未指定时为本地模型）"""
+        return embedding_providers.get(spec.embedding_provider if spec else None)
+    
+    def _query_batcher(self, provider: EmbeddingProvider) -> MicroBatcher:
+        batcher = self._query_batchers.get(provider.name)
+        if batcher is None:
+            batcher = MicroBatcher(
+                provider.embed_queries,
+                window_ms=settings.EMBEDDING_QUERY_BATCH_WINDOW_MS,
+                max_batch_size=settings.EMBEDDING_QUERY_BATCH_MAX_SIZE,
+                name=f"query_embedding_{provider.name}"
+            )
+            self._query_batchers[provider.name] = batcher
+        return batcher
+    
+    async def _text_to_vector(self, text: str, spec: CollectionSpec = None) -> List[float]:
+        """将查询文本转换为向量（先查缓存，未命中时经微批调度器合并并发请求）"""
+        provider = self._provider(spec)
+        cache_key = QueryEmbeddingCache.make_key(text, provider.model_id, provider.dimension)
+        vector = await self.query_cache.get(cache_key)
+        if vector is not None:
+            logger.info(f"🎯 查询向量命中缓存")
+            return vector
+        
+        vector = await self._query_batcher(provider).submit(text)
+        await self.query_cache.set(cache_key, vector)
+        return vector
+    
+    async def _queries_to_vectors(self, queries: List[str], spec: CollectionSpec = None) -> List[List[float]]:
+        """批量将查询文本转换为向量（命中缓存的不再编码，其余一次批量编码）"""
+        provider = self._provider(spec)
+        keys = [QueryEmbeddingCache.make_key(q, provider.model_id, provider.dimension) for q in queries]
+        vectors: List[Optional[List[float]]] = [await self.query_cache.get(key) for key in keys]
+        
+        missing: Dict[str, List[int]] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(queries[i], []).append(i)
+        
+        if missing:
+            texts = list(missing)
+            encoded = await provider.embed_queries(texts)
+            for text, vector in zip(texts, encoded):
+                for i in missing[text]:
+                    vectors[i] = vector
+                await self.query_cache.set(keys[missing[text][0]], vector)
+        
+        logger.info(f"批量查询向量化完成: {len(queries)} 个查询, 缓存命中 {len(queries) - sum(len(v) for v in missing.values())} 个")
+        return vectors
+    
+    async def _texts_to_vectors(self, texts: List[str]) -> List[List[float]]:
+        """
+        批量将文本转换为向量
+        
+        模型加载或编码失败时直接抛出异常：入库时文档标记为失败，
+        不会把零向量写入向量库和关键词索引。
+        """
+        if not texts:
+            return []
+        import time
+        
+        start_time = time.time()
+        try:
+            # 模型推理在独立执行器中运行，避免阻塞事件循环
+            vectors = await embedding_executor.run(self._encode_texts, texts)
         except Exception as e:
             logger.error(f"❌ Embedding 模型加载或编码失败: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            # 如果模型加载失败，返回零向量（仅供测试）
-            return [0.0] * settings.EMBEDDING_DIMENSION
+            raise
+        encode_time = time.time() - start_time
+        logger.info(
+            f"🧬 文本编码完成（数量: {len(texts)}, 耗时: {encode_time:.3f}s, "
+            f"维度: {len(vectors[0])}）"
+        )
+        return vectors
+    
+    async def _documents_to_vectors(self, texts: List[str], spec: CollectionSpec = None) -> List[List[float]]:
+        """
+        批量将文档分块转换为向量（使用知识库的 Embedding 提供方）
+        
+        先按内容哈希批量查询分块向量存储，只编码未命中的分块（同一批中的重复分块只编码一次），
+        新向量写回存储；编码失败时异常向上抛出，不写入任何向量。
+        """
+        provider = self._provider(spec)
+        if content_embedding_store is None:
+            return await provider.embed_documents(texts)
+        
+        model_id, dimension = provider.model_id, provider.dimension
+        keys = [content_key(text, model_id, dimension) for text in texts]
+        vectors: List[Optional[List[float]]] = await content_embedding_store.get_many(keys, model_id, dimension)
+        
+        missing: Dict[bytes, List[int]] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(keys[i], []).append(i)
+        
+        if missing:
+            encoded = await provider.embed_documents([texts[positions[0]] for positions in missing.values()])
+            for positions, vector in zip(missing.values(), encoded):
+                for i in positions:
+                    vectors[i] = vector
+            await content_embedding_store.put_many(list(missing), encoded, model_id, dimension)
+        
+        logger.info(
+            f"分块向量存储: {len(texts)} 个分块, 命中 {len(texts) - sum(len(v) for v in missing.values())} 个, "
+            f"编码 {len(missing)} 个"
+        )
+        return vectors
+    
+    def _sparse_provider(self, spec: CollectionSpec = None) -> EmbeddingProvider:
+        """
+        稀疏向量知识库的 Embedding 提供方
+        
+        稠密与稀疏向量由本地 BGE-M3 一次前向计算得到，知识库的提供方必须支持稀疏向量，
+        否则查询的稠密向量与入库时的不是同一模型。
+        """
+        provider = self._provider(spec)
+        if not provider.supports_sparse:
+            raise ValueError(
+                f"Embedding 提供方 {provider.name} 不支持稀疏向量"
+                f"（需要本地 BGE-M3 模型并开启 embedding.sparse_enabled）"
+            )
+        return provider
+    
+    async def _texts_to_hybrid_vectors(
+        self,
+        texts: List[str],
+        spec: CollectionSpec = None
+    ) -> Tuple[List[List[float]], List[Dict[int, float]]]:
+        """
+        批量将文本转换为稠密向量和稀疏向量
+        
+        稀疏向量每次都需要前向计算，稠密向量随之得到，因此不经过分块向量存储。
+        """
+        self._sparse_provider(spec)
+        if not texts:
+            return [], []
+        vectors, sparse_vectors = await embedding_executor.run(self._encode_texts_hybrid, texts)
+        logger.info(f"🧬 稠密 + 稀疏编码完成（数量: {len(texts)}）")
+        return vectors, sparse_vectors
+    
+    async def _query_to_hybrid_vector(
+        self,
+        text: str,
+        spec: CollectionSpec = None
+    ) -> Tuple[List[float], Dict[int, float]]:
+        """将查询文本转换为稠密向量和稀疏向量（结果缓存在进程内）"""
+        provider = self._sparse_provider(spec)
+        cache_key = QueryEmbeddingCache.make_key(text, provider.model_id, provider.dimension)
+        cached = self.sparse_query_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        vectors, sparse_vectors = await self._texts_to_hybrid_vectors([text], spec)
+        result = (vectors[0], sparse_vectors[0])
+        self.sparse_query_cache.set(cache_key, result)
+        await self.query_cache.set(cache_key, vectors[0])
+        return result
     
     async def keyword_search(
         self,
         collection_name: str,
         query_text: str,
-        top_k: int = 10
+        top_k: int = 10,
+        spec: CollectionSpec = None,
+        filters: SearchFilter = None
     ) -> List[Dict[str, Any]]:
         """
-        关键词检索 (BM25)
+        关键词检索
+        
+        启用稀疏向量的知识库使用 BGE-M3 词汇权重在向量存储中检索；
+        其余知识库使用本地持久化的 BM25 倒排索引，不访问 Milvus。
         
         Args:
             collection_name: 集合名称
             query_text: 查询文本
             top_k: 返回数量
+            spec: 知识库的集合描述
+            filters: 过滤条件
         
         Returns:
             检索结果列表
         """
-        # 简单实现：使用向量检索作为后备
-        # TODO: 实现真正的 BM25 关键词检索
-        # 可以使用 Elasticsearch 或 rank_bm25
-        return await self.vector_search(
-            collection_name=collection_name,
-            query_text=query_text,
-            top_k=top_k,
-            score_threshold=0.0  # 关键词检索不使用阈值
-        )
+        if spec and spec.sparse:
+            await self.connect()
+            _, sparse_vector = await self._query_to_hybrid_vector(query_text, spec)
+            results = (await vector_store.sparse_search(
+                collection_name, [sparse_vector], top_k, self._filter_expr(filters, spec)
+            ))[0]
+            logger.info(f"稀疏向量关键词检索完成: {collection_name}, 返回 {len(results)} 条结果")
+            return results
+        
+        predicate = filters.matches() if filters and not filters.is_empty() else None
+        index_name = spec.keyword_index_name if spec else collection_name
+        results = await keyword_index_manager.search(index_name, query_text, top_k, predicate)
+        logger.info(f"BM25 关键词检索完成: {collection_name}, 返回 {len(results)} 条结果")
+        return results
     
     async def hybrid_search(
         self,
@@ -211,77 +697,200 @@ class RetrievalService:
         query_text: str,
         top_k: int = 10,
         score_threshold: float = 0.7,
-        vector_weight: float = 0.7,
-        keyword_weight: float = 0.3
+        vector_weight: float = None,
+        keyword_weight: float = None,
+        fusion: str = "weighted",
+        spec: CollectionSpec = None,
+        filters: SearchFilter = None
     ) -> List[Dict[str, Any]]:
         """
         混合检索 (向量 + 关键词)
         
+        两路检索并发执行，各自受超时限制；某一路超时或失败时，
+        仍返回另一路的结果。BM25 索引的加载和检索在关键词执行器中运行，
+        冷加载或大索引不会阻塞事件循环，超时能按时生效。
+        
         Args:
             collection_name: 集合名称
             query_text: 查询文本
             top_k: 返回数量
-            score_threshold: 相似度阈值
-            vector_weight: 向量检索权重
-            keyword_weight: 关键词检索权重
+            score_threshold: 向量检索相似度阈值
+            vector_weight: 向量检索权重（weighted 融合）
+            keyword_weight: 关键词检索权重（weighted 融合）
+            fusion: 融合方式 (weighted/rrf)
+            spec: 知识库的集合描述
+            filters: 过滤条件（两路检索都生效）
         
         Returns:
             融合后的检索结果列表
         """
-        # 目前简化实现：直接使用向量检索
-        # TODO: 实现真正的混合检索（向量 + BM25）
-        return await self.vector_search(
-            collection_name=collection_name,
-            query_text=query_text,
+        vector_weight = settings.HYBRID_VECTOR_WEIGHT if vector_weight is None else vector_weight
+        keyword_weight = settings.HYBRID_KEYWORD_WEIGHT if keyword_weight is None else keyword_weight
+        candidate_k = top_k * settings.HYBRID_CANDIDATE_MULTIPLIER
+        
+        if spec and spec.sparse:
+            return await self._sparse_hybrid_search(
+                spec, query_text, top_k, candidate_k,
+                weights=None if fusion == "rrf" else (vector_weight, keyword_weight),
+                filters=filters
+            )
+        
+        vector_results, keyword_results = await asyncio.gather(
+            asyncio.wait_for(
+                self.vector_search(
+                    collection_name=collection_name,
+                    query_text=query_text,
+                    top_k=candidate_k,
+                    score_threshold=score_threshold,
+                    spec=spec,
+                    filters=filters
+                ),
+                timeout=settings.HYBRID_VECTOR_TIMEOUT
+            ),
+            asyncio.wait_for(
+                self.keyword_search(
+                    collection_name=collection_name,
+                    query_text=query_text,
+                    top_k=candidate_k,
+                    spec=spec,
+                    filters=filters
+                ),
+                timeout=settings.HYBRID_KEYWORD_TIMEOUT
+            ),
+            return_exceptions=True
+        )
+        
+        failures = []
+        for name, result in (("向量检索", vector_results), ("关键词检索", keyword_results)):
+            if isinstance(result, asyncio.TimeoutError):
+                logger.warning(f"混合检索中{name}超时，仅使用另一路结果")
+                failures.append(result)
+            elif isinstance(result, Exception):
+                logger.warning(f"混合检索中{name}失败: {str(result)}")
+                failures.append(result)
+        
+        if len(failures) == 2:
+            raise failures[0]
+        if isinstance(vector_results, Exception):
+            vector_results = []
+        if isinstance(keyword_results, Exception):
+            keyword_results = []
+        
+        if fusion == "rrf":
+            merged = self._rrf_merge(vector_results, keyword_results)
+        else:
+            merged = self._merge_results(vector_results, keyword_results, vector_weight, keyword_weight)
+        
+        logger.info(
+            f"混合检索完成（融合: {fusion}）: 向量 {len(vector_results)} 条, "
+            f"关键词 {len(keyword_results)} 条, 融合后返回 {min(len(merged), top_k)} 条"
+        )
+        return merged[:top_k]
+    
+    async def _sparse_hybrid_search(
+        self,
+        spec: CollectionSpec,
+        query_text: str,
+        top_k: int,
+        candidate_k: int,
+        weights: Optional[Tuple[float, float]] = None,
+        filters: SearchFilter = None
+    ) -> List[Dict[str, Any]]:
+        """
+        稠密 + 稀疏向量混合检索
+        
+        查询只做一次 BGE-M3 前向计算，两路检索与融合在向量存储中完成，
+        不使用 BM25 索引。融合分数不是余弦相似度，不应用相似度阈值；
+        量化/降维知识库的稠密一路使用压缩向量，不做全精度重打分。
+        二值量化的稠密一路是 HAMMING 距离，与稀疏内积分数不可比，只使用 RRF 融合
+        （新建知识库时已禁止该组合，这里兼容已有的知识库）。
+        """
+        if weights is not None and spec.quantization == "binary":
+            logger.warning(f"二值量化知识库不支持加权融合，改用 RRF: {spec.collection_name}")
+            weights = None
+        await self.connect()
+        self._record_query(spec.collection_name, query_text)
+        query_vector, sparse_vector = await self._query_to_hybrid_vector(query_text, spec)
+        dense = [query_vector]
+        if spec.compressed:
+            dense = quantized_searcher.compress(spec, dense)
+        
+        results = (await vector_store.hybrid_search(
+            spec.collection_name,
+            dense,
+            [sparse_vector],
             top_k=top_k,
-            score_threshold=score_threshold
+            filter_expr=self._filter_expr(filters, spec),
+            search_params=spec.search_params(),
+            weights=weights,
+            candidate_k=candidate_k
+        ))[0]
+        logger.info(
+            f"稠密 + 稀疏混合检索完成（融合: {'weighted' if weights else 'rrf'}）: "
+            f"{spec.collection_name}, 返回 {len(results)} 条"
         )
+        return results
+    
+    @staticmethod
+    def _result_key(result: Dict[str, Any]) -> str:
+        """融合时用于识别同一分块的键（优先使用 chunk_id）"""
+        metadata = result.get("metadata") or {}
+        return str(metadata.get("chunk_id") or result["id"])
     
     def _merge_results(
         self,
-        vector_results: List[SearchResult],
-        keyword_results: List[SearchResult],
+        vector_results: List[Dict[str, Any]],
+        keyword_results: List[Dict[str, Any]],
         vector_weight: float,
         keyword_weight: float
-    ) -> List[SearchResult]:
-        """融合检索结果"""
-        result_map: Dict[str, SearchResult] = {}
-        
-        # 处理向量检索结果
-        for r in vector_results:
-            if r.id not in result_map:
-                result_map[r.id] = SearchResult(
-                    id=r.id,
-                    content=r.content,
-                    score=r.score * vector_weight,
-                    metadata=r.metadata,
-                    source=r.source
-                )
-            else:
-                result_map[r.id].score += r.score * vector_weight
-        
-        # 处理关键词检索结果
-        for r in keyword_results:
-            if r.id not in result_map:
-                result_map[r.id] = SearchResult(
-                    id=r.id,
-                    content=r.content,
-                    score=r.score * keyword_weight,
-                    metadata=r.metadata,
-                    source=r.source
-                )
-            else:
-                result_map[r.id].score += r.score * keyword_weight
+    ) -> List[Dict[str, Any]]:
+        """按权重融合检索结果（关键词分数先按最大值归一化到 [0, 1]）"""
+        result_map: Dict[str, Dict[str, Any]] = {}
+        max_keyword_score = max((r["score"] for r in keyword_results), default=0.0) or 1.0
         
-        return list(result_map.values())
+        for results, weight, scale in (
+            (vector_results, vector_weight, 1.0),
+            (keyword_results, keyword_weight, max_keyword_score)
+        ):
+            for r in results:
+                key = self._result_key(r)
+                if key not in result_map:
+                    result_map[key] = {**r, "score": 0.0}
+                result_map[key]["score"] += r["score"] / scale * weight
+        
+        return sorted(result_map.values(), key=lambda r: r["score"], reverse=True)
+    
+    def _rrf_merge(
+        self,
+        vector_results: List[Dict[str, Any]],
+        keyword_results: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """倒数排名融合 (Reciprocal Rank Fusion)"""
+        result_map: Dict[str, Dict[str, Any]] = {}
+        k = settings.HYBRID_RRF_K
+        
+        for results in (vector_results, keyword_results):
+            for rank, r in enumerate(results, start=1):
+                key = self._result_key(r)
+                if key not in result_map:
+                    result_map[key] = {**r, "score": 0.0}
+                result_map[key]["score"] += 1.0 / (k + rank)
+        
+        return sorted(result_map.values(), key=lambda r: r["score"], reverse=True)
     
     async def add_texts(
         self,
         collection_name: str,
         texts: List[str],
-        metadatas: List[Dict[str, Any]] = None
+        metadatas: List[Dict[str, Any]] = None,
+        spec: CollectionSpec = None
     ):
-        """添加文本到集合"""
+        """
+        添加文本到集合
+        
+        量化/降维知识库（spec.compressed）向向量存储写入压缩后的向量，
+        全精度向量以相同主键写入冷存储用于重打分和重新拟合投影。
+        """
         logger.info(f"========== 开始向量化存储 ==========")
         logger.info(f"集合名称: {collection_name}")
         logger.info(f"文本数量: {len(texts)}")
@@ -289,66 +898,91 @@ class RetrievalService:
         await self.connect()
         
         # 生成 embeddings
-        logger.info(f"开始批量生成 {len(texts)} 个向量...")
-        vectors = []
+        logger.info(f"开始批量生成 {len(texts)} 个向量（批大小: {settings.EMBEDDING_BATCH_SIZE}）...")
         import time
         start_time = time.time()
         
-        for i, text in enumerate(texts):
-            vector = await self._text_to_vector(text)
-            vectors.append(vector)
-            if (i + 1) % 5 == 0 or (i + 1) == len(texts):
-                logger.info(f"  进度: {i+1}/{len(texts)} ({(i+1)/len(texts)*100:.1f}%)")
+        sparse = bool(spec and spec.sparse)
+        if sparse:
+            # 分块向量存储只保存稠密向量，稀疏向量知识库每次都完整编码
+            vectors, sparse_vectors = await self._texts_to_hybrid_vectors(texts, spec)
+        else:
+            vectors = await self._documents_to_vectors(texts, spec)
         
         total_time = time.time() - start_time
-        logger.info(f"向量生成完成（总耗时: {total_time:.2f}s, 平均: {total_time/len(texts):.3f}s/文本）")
+        logger.info(f"向量生成完成（总耗时: {total_time:.2f}s, 平均: {total_time/max(len(texts), 1):.3f}s/文本）")
         
         # 准备数据
-        logger.info(f"准备插入数据...")
-        entities = [
-            vectors,  # embedding field
-            texts,    # content field
-            metadatas if metadatas else [{} for _ in texts],  # metadata field
-            [meta.get("source", "") for meta in (metadatas or [{} for _ in texts])]  # source field
+        metadatas = metadatas or [{} for _ in texts]
+        rows = [
+            {
+                "embedding": vector,
+                "content": text,
+                "metadata": metadata,
+                "source": metadata.get("source", "")
+            }
+            for vector, text, metadata in zip(vectors, texts, metadatas)
         ]
+        if sparse:
+            for row, sparse_vector in zip(rows, sparse_vectors):
+                row[SPARSE_FIELD] = sparse_vector
+        if spec and spec.shared:
+            # 共享集合按 kb_id 分区，分区键不能依赖调用方传入的元数据
+            for row in rows:
+                row["kb_id"] = spec.kb_id
+        
+        compressed = bool(spec and spec.compressed)
+        keyword_index_name = spec.keyword_index_name if spec else collection_name
+        
+        # 分层存储可能在写入前把集合迁移到 Milvus，迁移后主键变化，需同步更新 BM25 索引和冷存储
+        id_mapping = await vector_store.ensure_capacity(collection_name, len(rows))
+        if id_mapping:
+            await keyword_index_manager.remap_ids(keyword_index_name, id_mapping)
+            if compressed:
+                await quantized_searcher.remap_ids(collection_name, id_mapping)
         
-        logger.info(f"开始插入到 Milvus Collection: {collection_name}")
-        collection = Collection(collection_name)
-        collection.insert(entities)
+        logger.info(f"开始插入到向量集合: {collection_name}")
+        ids = await vector_store.insert(
+            collection_name, quantized_searcher.prepare_rows(spec, rows) if compressed else rows
+        )
         logger.info(f"数据插入完成，执行 flush...")
-        collection.flush()
+        await vector_store.flush(collection_name)
         logger.info(f"✅ Flush 完成！")
+        
+        if compressed:
+            await quantized_searcher.add(collection_name, ids, vectors, metadatas)
+            logger.info(f"全精度向量已写入冷存储（量化: {spec.quantization}, 降维: {spec.projection_dim or '无'}）")
+        
+        # 同步更新 BM25 关键词索引（使用与向量存储一致的主键）；稀疏向量知识库不需要 BM25 索引
+        if sparse:
+            logger.info(f"========== 向量化存储完成 ==========")
+            return
+        try:
+            await keyword_index_manager.add_texts(keyword_index_name, ids, texts, metadatas)
+        except Exception as e:
+            logger.warning(f"更新 BM25 关键词索引失败: {str(e)}")
         logger.info(f"========== 向量化存储完成 ==========")
     
     async def rerank(
         self,
         query: str,
-        documents: List[str],
+        results: List[Dict[str, Any]],
         top_n: int = 5
     ) -> List[Dict[str, Any]]:
-        """对检索结果进行重排序"""
-        # TODO: 集成 BGE-Reranker 模型
-        # 目前直接返回原结果
-        results = []
-        for i, doc in enumerate(documents[:top_n]):
-            results.append({
-                "id": str(i),
-                "content": doc,
-                "score": 1.0 - (i * 0.1),  # 模拟分数
-                "metadata": {},
-                "source": ""
-            })
-        return results
+        """对检索结果进行重排序（保留原始分数与元数据）"""
+        return await rerank_service.rerank(query, results, top_n)
     
     async def search(
         self,
         collection_name: str,
         query: str,
-        query_vector: List[float],
+        query_vector: List[float] = None,
         mode: str = "hybrid",
         top_k: int = 10,
-        threshold: float = 0.7
-    ) -> List[SearchResult]:
+        threshold: float = 0.7,
+        spec: CollectionSpec = None,
+        filters: SearchFilter = None
+    ) -> List[Dict[str, Any]]:
         """
         统一检索接口
         
@@ -356,67 +990,217 @@ class RetrievalService:
             collection_name: 集合名称
             query: 查询文本
             query_vector: 查询向量
-            mode: 检索模式 (vector/keyword/hybrid)
+            mode: 检索模式 (vector/keyword/hybrid/hybrid_rrf)
             top_k: 返回数量
             threshold: 相似度阈值
+            spec: 知识库的集合描述
+            filters: 过滤条件
         
         Returns:
             检索结果列表
         """
         if mode == "vector":
             return await self.vector_search(
-                collection_name, query_vector, top_k, threshold
+                collection_name,
+                query_text=query,
+                query_vector=query_vector,
+                top_k=top_k,
+                score_threshold=threshold,
+                spec=spec,
+                filters=filters
             )
         elif mode == "keyword":
             return await self.keyword_search(
-                collection_name, query, top_k
+                collection_name, query, top_k, spec=spec, filters=filters
             )
-        else:  # hybrid
+        else:  # hybrid / hybrid_rrf
             return await self.hybrid_search(
-                collection_name, query, query_vector, top_k, threshold
+                collection_name,
+                query,
+                top_k=top_k,
+                score_threshold=threshold,
+                fusion="rrf" if mode == "hybrid_rrf" else "weighted",
+                spec=spec,
+                filters=filters
             )
 
 
 class RerankService:
-    """重排序服务"""
+    """
+    重排序服务
+    
+    使用 bge-reranker 交叉编码器对 (query, passage) 对打分。推理在独立
+    执行器中批量进行，分数按 (查询哈希, 分块ID) 缓存。级联模式（默认关闭）
+    是近似算法：只对召回排名靠前的 M 个候选打分，并在剩余候选大概率进不了
+    top-n 时提前停止。交叉编码分数与召回排名不单调，提前停止可能漏掉
+    排名靠后的高分候选，开启前需要用业务查询评估召回损失。
+    """
     
     def __init__(self):
         self.model = None
+        self._model_lock = threading.Lock()
+        # 加载失败后按指数退避重试，退避期间重排序降级为直接截断
+        self._load_failures = 0
+        self._retry_at = 0.0
+        self.score_cache = LRUCache(
+            max_size=settings.RERANK_CACHE_SIZE,
+            ttl=settings.RERANK_CACHE_TTL
+        )
+        
+        # 统计信息
+        self.pairs_scored = 0
+        self.early_stops = 0
+        self.skipped_candidates = 0
+    
+    def _load_model_sync(self):
+        """加载重排序模型（线程安全）"""
+        with self._model_lock:
+            if self.model is not None:
+                return
+            
+            from FlagEmbedding import FlagReranker
+            import os
+            import time
+            
+            model_path = settings.RERANK_MODEL
+            logger.info(f"🔄 正在加载 Reranker 模型: {model_path}")
+            start_time = time.time()
+            self.model = FlagReranker(
+                model_path,
+                use_fp16=settings.RERANK_USE_FP16,
+                cache_dir=None if os.path.exists(model_path) else settings.EMBEDDING_CACHE_FOLDER
+            )
+            load_time = time.time() - start_time
+            logger.info(f"✅ Reranker 模型加载成功（耗时: {load_time:.2f}s）")
     
     async def load_model(self):
-        """加载重排序模型"""
-        # TODO: 加载BGE-Reranker模型
-        # from FlagEmbedding import FlagReranker
-        # self.model = FlagReranker('BAAI/bge-reranker-v2-m3')
-        pass
+        """加载重排序模型（失败后在退避间隔内不再重试，重排序降级为直接截断）"""
+        if self.model is not None or time.monotonic() < self._retry_at:
+            return
+        try:
+            await rerank_executor.run(self._load_model_sync)
+            self._load_failures = 0
+        except Exception as e:
+            self._load_failures += 1
+            delay = min(
+                settings.RERANK_LOAD_RETRY_INTERVAL * 2 ** (self._load_failures - 1),
+                settings.RERANK_LOAD_RETRY_MAX_INTERVAL
+            )
+            self._retry_at = time.monotonic() + delay
+            logger.error(f"❌ Reranker 模型加载失败，重排序将被跳过，{delay:.0f}s 后重试: {str(e)}")
+    
+    def reset(self):
+        """清除加载失败的退避状态，下次调用 load_model 立即重试"""
+        self._load_failures = 0
+        self._retry_at = 0.0
+    
+    def _compute_scores(self, query: str, passages: List[str]) -> List[float]:
+        """批量计算交叉编码分数（在执行器线程中运行）"""
+        scores = self.model.compute_score(
+            [[query, passage] for passage in passages],
+            batch_size=settings.RERANK_BATCH_SIZE,
+            max_length=settings.RERANK_MAX_LENGTH,
+            normalize=True
+        )
+        if not isinstance(scores, list):
+            scores = [scores]
+        return [float(score) for score in scores]
+    
+    async def _score_batch(
+        self,
+        query: str,
+        query_hash: str,
+        candidates: List[Dict[str, Any]]
+    ) -> List[float]:
+        """对一批候选打分，命中缓存的候选不再计算"""
+        keys = [(query_hash, RetrievalService._result_key(r)) for r in candidates]
+        scores: List[Optional[float]] = [self.score_cache.get(key) for key in keys]
+        
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            computed = await rerank_executor.run(
+                self._compute_scores, query, [candidates[i]["content"] for i in missing]
+            )
+            self.pairs_scored += len(missing)
+            for i, score in zip(missing, computed):
+                scores[i] = score
+                self.score_cache.set(keys[i], score)
+        
+        return scores
     
     async def rerank(
         self,
         query: str,
-        results: List[SearchResult],
+        results: List[Dict[str, Any]],
         top_n: int = 5
-    ) -> List[SearchResult]:
+    ) -> List[Dict[str, Any]]:
         """
         对检索结果进行重排序
         
         Args:
             query: 查询文本
-            results: 检索结果
+            results: 检索结果（按召回分数降序）
             top_n: 返回数量
         
         Returns:
-            重排序后的结果
+            重排序后的结果，score 为重排序分数，原召回分数保存在 retrieval_score
         """
+        if not results:
+            return []
+        
+        await self.load_model()
         if not self.model:
             # 如果没有加载模型，直接返回原结果
             return results[:top_n]
         
-        # TODO: 使用模型进行重排序
-        # pairs = [[query, r.content] for r in results]
-        # scores = self.model.compute_score(pairs)
-        # ...
+        query_hash = hashlib.sha1(normalize_text(query).encode("utf-8")).hexdigest()
+        candidates = sorted(results, key=lambda r: r["score"], reverse=True)
         
-        return results[:top_n]
+        if settings.RERANK_CASCADE_ENABLED:
+            candidates = candidates[:settings.RERANK_CASCADE_TOP_M]
+            step = max(1, settings.RERANK_CASCADE_BATCH_SIZE)
+        else:
+            step = len(candidates)
+        
+        scored: List[tuple] = []
+        for start in range(0, len(candidates), step):
+            batch = candidates[start:start + step]
+            batch_scores = await self._score_batch(query, query_hash, batch)
+            scored.extend(zip(batch_scores, batch))
+            
+            remaining = len(candidates) - start - len(batch)
+            if remaining and len(scored) >= top_n:
+                # 近似提前停止：假设召回排名更低的候选分数不超过本批最高分加余量
+                # （启发式，交叉编码分数与召回排名不单调，不保证结果与完整打分一致）；
+                # 余量越大越保守
+                nth_score = heapq.nlargest(top_n, (score for score, _ in scored))[-1]
+                estimated_bound = max(batch_scores) + settings.RERANK_CASCADE_MARGIN
+                if nth_score >= estimated_bound:
+                    self.early_stops += 1
+                    self.skipped_candidates += remaining
+                    logger.info(
+                        f"级联重排序近似提前停止：已打分 {len(scored)} 个，跳过 {remaining} 个候选"
+                        f"（第 {top_n} 名分数 {nth_score:.4f} ≥ 估计上界 {estimated_bound:.4f}）"
+                    )
+                    break
+        
+        top = heapq.nlargest(top_n, scored, key=lambda item: item[0])
+        return [
+            {**r, "score": score, "retrieval_score": r["score"]}
+            for score, r in top
+        ]
+    
+    def stats(self) -> Dict[str, Any]:
+        """获取重排序统计"""
+        return {
+            "model_loaded": self.model is not None,
+            "load_failures": self._load_failures,
+            "pairs_scored": self.pairs_scored,
+            "cascade_enabled": settings.RERANK_CASCADE_ENABLED,
+            "early_stops": self.early_stops,
+            "skipped_candidates": self.skipped_candidates,
+            "score_cache": self.score_cache.stats()
+        }
 
 
 # 全局实例
@@ -0,0 +1,1045 @@
+"""
+向量存储访问层
+定义异步向量存储接口，提供 Milvus 实现与用于测试的内存实现
+"""
+import asyncio
+import functools
+import math
+import random
+import re
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.core.logger import logger
+from app.knowledge.index_profiles import BINARY_METRIC_TYPE, get_index_profile
+
+
+# 检索结果返回的标量字段
+OUTPUT_FIELDS = ["content", "metadata", "source"]
+
+# 从分块元数据提升为标量字段的键（均为 UUID 字符串）。
+# 独立集合以 document_id 为分区键，多个知识库共享的集合以 kb_id 为分区键
+SCALAR_FIELDS = ("document_id", "kb_id", "chunk_id", "page_id")
+PARTITION_KEY_FIELD = "document_id"
+SHARED_PARTITION_KEY_FIELD = "kb_id"
+SCALAR_INDEX_PARAMS = {"index_type": "INVERTED"}
+
+# 默认检索参数
+DEFAULT_SEARCH_PARAMS = {
+    "metric_type": "COSINE",
+    "params": {"nprobe": 10}
+}
+
+# 稀疏向量字段（bge-m3 词汇权重）的索引与检索参数
+SPARSE_FIELD = "sparse_embedding"
+SPARSE_INDEX_PARAMS = {
+    "index_type": "SPARSE_INVERTED_INDEX",
+    "metric_type": "IP",
+    "params": {"drop_ratio_build": 0.2}
+}
+SPARSE_SEARCH_PARAMS = {
+    "metric_type": "IP",
+    "params": {"drop_ratio_search": 0.2}
+}
+
+# 范围检索下推阈值时的容差（Milvus 的 radius 为开区间）
+RANGE_SEARCH_EPSILON = 1e-6
+
+
+def scalar_value(row: Dict[str, Any], name: str) -> Any:
+    """读取标量字段（顶层字段优先，其次为 metadata 中的同名键）"""
+    value = row.get(name)
+    return value if value is not None else (row.get("metadata") or {}).get(name)
+
+
+def sparse_dot(a: Dict[int, float], b: Dict[int, float]) -> float:
+    """稀疏向量内积"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(token, 0.0) for token, weight in a.items())
+
+
+def rrf_fuse(result_lists: List[List[Dict[str, Any]]], top_k: int, k: int = 60) -> List[Dict[str, Any]]:
+    """按主键对多路检索结果做倒数排名融合"""
+    fused: Dict[str, Dict[str, Any]] = {}
+    for results in result_lists:
+        for rank, hit in enumerate(results, start=1):
+            entry = fused.setdefault(hit["id"], {**hit, "score": 0.0})
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)[:top_k]
+
+
+class VectorStore(ABC):
+    """
+    向量存储接口
+
+    所有方法均为协程，实现方不得阻塞事件循环。
+    写入的行为字典：{"embedding", "content", "metadata", "source"}，
+    稀疏集合的行还包含 "sparse_embedding"（{词 ID: 权重}）；
+    检索命中为字典：{"id", "score", "content", "metadata", "source"}。
+    """
+
+    async def connect(self):
+        """建立连接"""
+
+    async def close(self):
+        """关闭连接"""
+
+    @abstractmethod
+    async def has_collection(self, collection_name: str) -> bool:
+        """集合是否存在"""
+
+    @abstractmethod
+    async def create_collection(
+        self,
+        collection_name: str,
+        dimension: int,
+        index_params: Optional[Dict[str, Any]] = None,
+        sparse: bool = False,
+        partition_key: str = PARTITION_KEY_FIELD
+    ):
+        """
+        创建集合（已存在时不做任何操作），index_params 为空时使用默认索引配置
+
+        index_params 的度量为 HAMMING 时创建二值向量集合，写入和检索的向量为打包后的 bytes。
+        sparse 为 True 时增加稀疏向量字段，支持 sparse_search / hybrid_search。
+        partition_key 为分区键字段（共享集合使用 kb_id），只有 Milvus 实现使用。
+        """
+
+    @abstractmethod
+    async def drop_collection(self, collection_name: str):
+        """删除集合"""
+
+    @abstractmethod
+    async def insert(self, collection_name: str, rows: List[Dict[str, Any]]) -> List[str]:
+        """写入数据，返回主键列表"""
+
+    async def flush(self, collection_name: str):
+        """将写入的数据持久化"""
+
+    @abstractmethod
+    async def search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        top_k: int = 10,
+        filter_expr: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """向量检索，每个查询向量返回一组按分数降序排列的命中"""
+
+    async def range_search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        radius: float,
+        top_k: int = 10,
+        filter_expr: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        范围检索：只返回相似度不低于 radius 的命中（最多 top_k 条）
+
+        默认实现检索后在本地过滤。
+        """
+        results = await self.search(collection_name, vectors, top_k, filter_expr, search_params)
+        return [[hit for hit in hits if hit["score"] >= radius] for hits in results]
+
+    async def sparse_search(
+        self,
+        collection_name: str,
+        sparse_vectors: List[Dict[int, float]],
+        top_k: int = 10,
+        filter_expr: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """稀疏向量（词汇权重）内积检索"""
+        raise NotImplementedError(f"{self.__class__.__name__} 不支持稀疏向量检索")
+
+    async def hybrid_search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        sparse_vectors: List[Dict[int, float]],
+        top_k: int = 10,
+        filter_expr: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+        weights: Optional[Tuple[float, float]] = None,
+        candidate_k: Optional[int] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        稠密 + 稀疏混合检索
+
+        两路各取 candidate_k 个候选后融合：weights 为 (稠密, 稀疏) 权重时加权求和，
+        为空时使用 RRF。默认实现分别检索后在本地融合。
+        """
+        candidate_k = candidate_k or top_k
+        dense = await self.search(collection_name, vectors, candidate_k, filter_expr, search_params)
+        sparse = await self.sparse_search(collection_name, sparse_vectors, candidate_k, filter_expr)
+        if weights is None:
+            return [
+                rrf_fuse([d, s], top_k, settings.HYBRID_RRF_K)
+                for d, s in zip(dense, sparse)
+            ]
+
+        results = []
+        for dense_hits, sparse_hits in zip(dense, sparse):
+            fused: Dict[str, Dict[str, Any]] = {}
+            for hits, weight in ((dense_hits, weights[0]), (sparse_hits, weights[1])):
+                for hit in hits:
+                    fused.setdefault(hit["id"], {**hit, "score": 0.0})["score"] += hit["score"] * weight
+            results.append(sorted(fused.values(), key=lambda hit: hit["score"], reverse=True)[:top_k])
+        return results
+
+    @abstractmethod
+    async def delete(self, collection_name: str, filter_expr: str) -> int:
+        """按过滤表达式删除数据，返回删除数量"""
+
+    @abstractmethod
+    async def count(self, collection_name: str) -> int:
+        """集合中的数据条数"""
+
+    async def rebuild_index(self, collection_name: str, index_params: Dict[str, Any]):
+        """按新的索引参数重建向量索引"""
+
+    async def describe_index(self, collection_name: str) -> Dict[str, Any]:
+        """当前向量索引参数"""
+        return {}
+
+    @abstractmethod
+    async def sample_vectors(self, collection_name: str, limit: int) -> List[Tuple[str, List[float]]]:
+        """随机抽取若干条 (主键, 向量)，用于索引调优"""
+
+    @abstractmethod
+    def scan(
+        self, collection_name: str, batch_size: int = 1000, filter_expr: Optional[str] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        """分批遍历集合中符合过滤条件的数据（行包含 id 与 embedding），用于重建集合和索引"""
+
+    @abstractmethod
+    async def rename_collection(self, collection_name: str, new_name: str):
+        """重命名集合"""
+
+    async def compact(self, collection_name: str):
+        """回收已删除数据占用的空间（默认不需要）"""
+
+    async def document_ids(self, collection_name: str, filter_expr: Optional[str] = None) -> Set[str]:
+        """集合中出现的全部 document_id（用于与数据库对账），默认实现遍历全部数据"""
+        found = set()
+        async for rows in self.scan(collection_name, filter_expr=filter_expr):
+            found.update(
+                str(scalar_value(row, "document_id")) for row in rows
+                if scalar_value(row, "document_id")
+            )
+        return found
+
+    async def ensure_capacity(self, collection_name: str, incoming: int) -> Optional[Dict[str, str]]:
+        """
+        写入前检查容量
+
+        分层存储在集合即将超过嵌入式上限时迁移到 Milvus，返回
+        旧主键 -> 新主键 的映射；不发生迁移时返回 None。
+        """
+        return None
+
+    async def preload(self, collection_names: List[str]) -> int:
+        """预加载集合，返回成功数量"""
+        return 0
+
+    def stats(self) -> Dict[str, Any]:
+        """运行统计"""
+        return {"backend": self.__class__.__name__}
+
+
+class MilvusVectorStore(VectorStore):
+    """
+    Milvus 向量存储
+
+    pymilvus 的同步 gRPC 调用在有界线程池中执行，不阻塞事件循环；
+    维护一组连接别名，多个检索可以通过不同连接并发进行。
+    """
+
+    def __init__(self, pool_size: int = 4):
+        self.pool_size = max(1, pool_size)
+        self._aliases = [f"agonx_{i}" for i in range(self.pool_size)]
+        self._pool: Optional[asyncio.Queue] = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.pool_size,
+            thread_name_prefix="agonx-milvus"
+        )
+        self._connected = False
+        self._connect_lock = asyncio.Lock()
+
+        # 统计信息
+        self._calls = 0
+        self._in_flight = 0
+        self._wait_total = 0.0
+
+    def _connect_sync(self):
+        from pymilvus import connections
+
+        for alias in self._aliases:
+            connections.connect(
+                alias=alias,
+                host=settings.MILVUS_HOST,
+                port=settings.MILVUS_PORT,
+                user=settings.MILVUS_USER or None,
+                password=settings.MILVUS_PASSWORD or None
+            )
+
+    async def connect(self):
+        """建立连接池"""
+        if self._connected:
+            return
+        async with self._connect_lock:
+            if self._connected:
+                return
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self._executor, self._connect_sync)
+            self._pool = asyncio.Queue()
+            for alias in self._aliases:
+                self._pool.put_nowait(alias)
+            self._connected = True
+            logger.info(f"Milvus 连接池已建立: {settings.MILVUS_HOST}:{settings.MILVUS_PORT} (连接数: {self.pool_size})")
+
+    async def close(self):
+        """关闭连接池"""
+        if not self._connected:
+            return
+        from pymilvus import connections
+
+        for alias in self._aliases:
+            connections.disconnect(alias)
+        self._connected = False
+        self._pool = None
+
+    async def _run(self, fn: Callable[..., Any], *args) -> Any:
+        """借用一个连接，在线程池中执行同步调用"""
+        await self.connect()
+        started = time.perf_counter()
+        alias = await self._pool.get()
+        self._wait_total += time.perf_counter() - started
+        self._calls += 1
+        self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, alias, *args))
+        finally:
+            self._in_flight -= 1
+            self._pool.put_nowait(alias)
+
+    # ---------- 同步实现（在工作线程中执行） ----------
+
+    @staticmethod
+    def _has_collection_sync(alias: str, collection_name: str) -> bool:
+        from pymilvus import utility
+        return utility.has_collection(collection_name, using=alias)
+
+    @staticmethod
+    def _create_collection_sync(
+        alias: str,
+        collection_name: str,
+        dimension: int,
+        index_params: Dict[str, Any],
+        sparse: bool = False,
+        partition_key: str = PARTITION_KEY_FIELD
+    ):
+        from pymilvus import CollectionSchema, FieldSchema, DataType, Collection, utility
+        from app.knowledge.collection_manager import collection_manager
+
+        if utility.has_collection(collection_name, using=alias):
+            return
+
+        # 定义Schema（二值量化集合的向量字段为 BINARY_VECTOR，dim 为比特数）
+        binary = index_params.get("metric_type") == BINARY_METRIC_TYPE
+        fields = [
+            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
+            FieldSchema(
+                name="embedding",
+                dtype=DataType.BINARY_VECTOR if binary else DataType.FLOAT_VECTOR,
+                dim=dimension
+            ),
+            FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=65535),
+            FieldSchema(name="metadata", dtype=DataType.JSON),
+            FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=500)
+        ]
+        # 常用过滤键提升为带索引的标量字段（metadata 中仍保留一份），按分区键分区
+        fields.extend(
+            FieldSchema(
+                name=name,
+                dtype=DataType.VARCHAR,
+                max_length=64,
+                is_partition_key=name == partition_key
+            )
+            for name in SCALAR_FIELDS
+        )
+        if sparse:
+            fields.append(FieldSchema(name=SPARSE_FIELD, dtype=DataType.SPARSE_FLOAT_VECTOR))
+        schema = CollectionSchema(fields, description="AgonX Knowledge Base Collection")
+
+        collection = Collection(
+            name=collection_name,
+            schema=schema,
+            using=alias,
+            num_partitions=settings.MILVUS_PARTITION_KEY_PARTITIONS
+        )
+
+        # 创建索引
+        collection.create_index(field_name="embedding", index_params=index_params)
+        for name in SCALAR_FIELDS:
+            collection.create_index(field_name=name, index_params=SCALAR_INDEX_PARAMS, index_name=f"{name}_index")
+        if sparse:
+            collection.create_index(field_name=SPARSE_FIELD, index_params=SPARSE_INDEX_PARAMS)
+        collection_manager.register(collection_name, collection, using=alias)
+        logger.info(f"Milvus集合创建并初始化索引成功: {collection_name} ({index_params['index_type']})")
+
+    @staticmethod
+    def _drop_collection_sync(alias: str, collection_name: str):
+        from pymilvus import utility
+        from app.knowledge.collection_manager import collection_manager
+
+        collection_manager.invalidate(collection_name)
+        if utility.has_collection(collection_name, using=alias):
+            utility.drop_collection(collection_name, using=alias)
+            logger.info(f"Milvus集合已删除: {collection_name}")
+
+    @staticmethod
+    def _insert_sync(alias: str, collection_name: str, rows: List[Dict[str, Any]]) -> List[str]:
+        from app.knowledge.collection_manager import collection_manager
+
+        collection = collection_manager.get(collection_name, load=False, using=alias)
+        columns = {
+            "embedding": [row["embedding"] for row in rows],
+            "content": [row["content"] for row in rows],
+            "metadata": [row.get("metadata") or {} for row in rows],
+            "source": [row.get("source", "") for row in rows],
+            SPARSE_FIELD: [row.get(SPARSE_FIELD) for row in rows]
+        }
+        for name in SCALAR_FIELDS:
+            columns[name] = [str(scalar_value(row, name) or "") for row in rows]
+        # 按集合的 schema 顺序组装列（旧集合没有标量字段和稀疏向量字段）
+        entities = [columns[field.name] for field in collection.schema.fields if not field.auto_id]
+        insert_result = collection.insert(entities)
+        return [str(pk) for pk in insert_result.primary_keys]
+
+    @staticmethod
+    def _flush_sync(alias: str, collection_name: str):
+        from app.knowledge.collection_manager import collection_manager
+
+        collection_manager.get(collection_name, load=False, using=alias).flush()
+
+    @staticmethod
+    def _search_sync(
+        alias: str,
+        collection_name: str,
+        vectors: List[List[float]],
+        top_k: int,
+        filter_expr: Optional[str],
+        search_params: Dict[str, Any]
+    ) -> List[List[Dict[str, Any]]]:
+        from app.knowledge.collection_manager import collection_manager
+
+        search_kwargs = dict(
+            data=vectors,
+            anns_field="embedding",
+            param=search_params,
+            limit=top_k,
+            expr=filter_expr,
+            output_fields=OUTPUT_FIELDS
+        )
+        # 集合句柄与加载状态由 collection_manager 缓存，不再每次 load
+        results = collection_manager.use(
+            collection_name, lambda collection: collection.search(**search_kwargs), using=alias
+        )
+        return MilvusVectorStore._hits_to_dicts(results)
+
+    @staticmethod
+    def _hits_to_dicts(results) -> List[List[Dict[str, Any]]]:
+        return [
+            [
+                {
+                    "id": str(hit.id),
+                    "score": float(hit.score),
+                    "content": hit.entity.get("content", ""),
+                    "metadata": hit.entity.get("metadata", {}),
+                    "source": hit.entity.get("source", "")
+                }
+                for hit in hits
+            ]
+            for hits in results
+        ]
+
+    @staticmethod
+    def _sparse_search_sync(
+        alias: str,
+        collection_name: str,
+        sparse_vectors: List[Dict[int, float]],
+        top_k: int,
+        filter_expr: Optional[str]
+    ) -> List[List[Dict[str, Any]]]:
+        from app.knowledge.collection_manager import collection_manager
+
+        results = collection_manager.use(
+            collection_name,
+            lambda collection: collection.search(
+                data=sparse_vectors,
+                anns_field=SPARSE_FIELD,
+                param=SPARSE_SEARCH_PARAMS,
+                limit=top_k,
+                expr=filter_expr,
+                output_fields=OUTPUT_FIELDS
+            ),
+            using=alias
+        )
+        return MilvusVectorStore._hits_to_dicts(results)
+
+    @staticmethod
+    def _hybrid_search_sync(
+        alias: str,
+        collection_name: str,
+        vectors: List[List[float]],
+        sparse_vectors: List[Dict[int, float]],
+        top_k: int,
+        filter_expr: Optional[str],
+        search_params: Dict[str, Any],
+        weights: Optional[Tuple[float, float]],
+        candidate_k: int
+    ) -> List[List[Dict[str, Any]]]:
+        from pymilvus import AnnSearchRequest, RRFRanker, WeightedRanker
+        from app.knowledge.collection_manager import collection_manager
+
+        ranker = WeightedRanker(*weights) if weights else RRFRanker(settings.HYBRID_RRF_K)
+
+        def search(collection) -> List[List[Dict[str, Any]]]:
+            # Milvus 的 hybrid_search 每次只接受一个查询，逐条执行
+            results = []
+            for vector, sparse_vector in zip(vectors, sparse_vectors):
+                requests = [
+                    AnnSearchRequest([vector], "embedding", search_params, candidate_k, expr=filter_expr),
+                    AnnSearchRequest([sparse_vector], SPARSE_FIELD, SPARSE_SEARCH_PARAMS, candidate_k, expr=filter_expr)
+                ]
+                hits = collection.hybrid_search(requests, ranker, limit=top_k, output_fields=OUTPUT_FIELDS)
+                results.extend(MilvusVectorStore._hits_to_dicts(hits))
+            return results
+
+        return collection_manager.use(collection_name, search, using=alias)
+
+    @staticmethod
+    def _rebuild_index_sync(alias: str, collection_name: str, index_params: Dict[str, Any]):
+        from app.knowledge.collection_manager import collection_manager
+
+        collection = collection_manager.get(collection_name, load=False, using=alias)
+        # 重建索引前必须先释放集合
+        collection_manager.mark_unloaded(collection_name)
+        collection.release()
+        for index in collection.indexes:
+            if index.field_name == "embedding":
+                collection.drop_index(index_name=index.index_name)
+        collection.create_index(field_name="embedding", index_params=index_params)
+        logger.info(f"Milvus集合索引已重建: {collection_name} ({index_params['index_type']})")
+
+    @staticmethod
+    def _describe_index_sync(alias: str, collection_name: str) -> Dict[str, Any]:
+        from app.knowledge.collection_manager import collection_manager
+
+        collection = collection_manager.get(collection_name, load=False, using=alias)
+        indexes = [index for index in collection.indexes if index.field_name == "embedding"]
+        if not indexes:
+            return {}
+        params = dict(indexes[0].params)
+        # 不同版本的 pymilvus 中 params 可能是 JSON 字符串
+        if isinstance(params.get("params"), str):
+            import json
+            params["params"] = json.loads(params["params"])
+        return params
+
+    @staticmethod
+    def _sample_vectors_sync(alias: str, collection_name: str, limit: int) -> List[Tuple[str, Any]]:
+        from app.knowledge.collection_manager import collection_manager
+
+        def query(collection) -> List[Dict[str, Any]]:
+            # 先只遍历主键（每行 8 字节），在全部主键上均匀抽样，再按主键取向量；
+            # 不使用 offset（Milvus 要求 offset + limit 不超过 16384，只能抽到前 16384 行）
+            iterator = collection.query_iterator(batch_size=16384, expr="id >= 0", output_fields=["id"])
+            sampled: List[int] = []
+            seen = 0
+            try:
+                while True:
+                    rows = iterator.next()
+                    if not rows:
+                        break
+                    # 蓄水池抽样
+                    for row in rows:
+                        seen += 1
+                        if len(sampled) < limit:
+                            sampled.append(row["id"])
+                        else:
+                            slot = random.randrange(seen)
+                            if slot < limit:
+                                sampled[slot] = row["id"]
+            finally:
+                iterator.close()
+            rows = []
+            for start in range(0, len(sampled), 1000):
+                ids = ", ".join(str(pk) for pk in sampled[start:start + 1000])
+                rows.extend(collection.query(expr=f"id in [{ids}]", output_fields=["id", "embedding"]))
+            return rows
+
+        rows = collection_manager.use(collection_name, query, using=alias)
+        samples = []
+        for row in rows:
+            vector = row["embedding"]
+            # 二值向量以 bytes 返回（部分版本包装在单元素列表中），原样用于检索
+            if isinstance(vector, list) and vector and isinstance(vector[0], bytes):
+                vector = vector[0]
+            samples.append((str(row["id"]), vector if isinstance(vector, bytes) else list(vector)))
+        return samples
+
+    @staticmethod
+    def _scan_open_sync(alias: str, collection_name: str, batch_size: int, filter_expr: Optional[str]):
+        from app.knowledge.collection_manager import collection_manager
+
+        return collection_manager.use(
+            collection_name,
+            lambda collection: collection.query_iterator(
+                batch_size=batch_size,
+                expr=filter_expr or "id >= 0",
+                output_fields=["*"]
+            ),
+            using=alias
+        )
+
+    @staticmethod
+    def _scan_next_sync(alias: str, iterator) -> List[Dict[str, Any]]:
+        rows = iterator.next()
+        if not rows:
+            iterator.close()
+        return [{**row, "id": str(row["id"])} for row in rows]
+
+    @staticmethod
+    def _rename_collection_sync(alias: str, collection_name: str, new_name: str):
+        from pymilvus import utility
+        from app.knowledge.collection_manager import collection_manager
+
+        collection_manager.invalidate(collection_name)
+        collection_manager.invalidate(new_name)
+        utility.rename_collection(collection_name, new_name, using=alias)
+        logger.info(f"Milvus集合已重命名: {collection_name} -> {new_name}")
+
+    @staticmethod
+    def _compact_sync(alias: str, collection_name: str):
+        from app.knowledge.collection_manager import collection_manager
+
+        # 压缩在 Milvus 服务端异步执行，这里只提交任务
+        collection = collection_manager.get(collection_name, load=False, using=alias)
+        collection.compact()
+        logger.info(f"Milvus集合压缩已提交: {collection_name}")
+
+    @staticmethod
+    def _document_ids_sync(alias: str, collection_name: str, filter_expr: Optional[str]) -> Set[str]:
+        from app.knowledge.collection_manager import collection_manager
+
+        def collect(collection) -> Set[str]:
+            # 只取 metadata（新旧 schema 都有），不传回向量
+            iterator = collection.query_iterator(
+                batch_size=5000,
+                expr=filter_expr or "id >= 0",
+                output_fields=["metadata"]
+            )
+            found = set()
+            try:
+                while True:
+                    rows = iterator.next()
+                    if not rows:
+                        break
+                    found.update(
+                        str(row["metadata"]["document_id"]) for row in rows
+                        if (row.get("metadata") or {}).get("document_id")
+                    )
+            finally:
+                iterator.close()
+            return found
+
+        return collection_manager.use(collection_name, collect, using=alias)
+
+    @staticmethod
+    def _delete_sync(alias: str, collection_name: str, filter_expr: str) -> int:
+        from app.knowledge.collection_manager import collection_manager
+
+        collection = collection_manager.get(collection_name, load=False, using=alias)
+        return collection.delete(filter_expr).delete_count
+
+    @staticmethod
+    def _count_sync(alias: str, collection_name: str) -> int:
+        from app.knowledge.collection_manager import collection_manager
+
+        return collection_manager.get(collection_name, load=False, using=alias).num_entities
+
+    @staticmethod
+    def _preload_sync(alias: str, collection_names: List[str]) -> int:
+        from app.knowledge.collection_manager import collection_manager
+
+        return collection_manager.preload(collection_names, using=alias)
+
+    # ---------- 异步接口 ----------
+
+    async def has_collection(self, collection_name: str) -> bool:
+        return await self._run(self._has_collection_sync, collection_name)
+
+    async def create_collection(
+        self,
+        collection_name: str,
+        dimension: int,
+        index_params: Optional[Dict[str, Any]] = None,
+        sparse: bool = False,
+        partition_key: str = PARTITION_KEY_FIELD
+    ):
+        await self._run(
+            self._create_collection_sync, collection_name, dimension,
+            index_params or get_index_profile(None).index_params(), sparse, partition_key
+        )
+
+    async def drop_collection(self, collection_name: str):
+        await self._run(self._drop_collection_sync, collection_name)
+
+    async def insert(self, collection_name: str, rows: List[Dict[str, Any]]) -> List[str]:
+        return await self._run(self._insert_sync, collection_name, rows)
+
+    async def flush(self, collection_name: str):
+        await self._run(self._flush_sync, collection_name)
+
+    async def search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        top_k: int = 10,
+        filter_expr: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        return await self._run(
+            self._search_sync, collection_name, vectors, top_k,
+            filter_expr, search_params or DEFAULT_SEARCH_PARAMS
+        )
+
+    async def range_search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        radius: float,
+        top_k: int = 10,
+        filter_expr: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        # 阈值作为 radius 下推到 Milvus，低于阈值的命中不会被传回和解析。
+        # COSINE 的范围条件为 radius < 分数，略微下调使分数恰好等于阈值的命中保留
+        params = dict(search_params or DEFAULT_SEARCH_PARAMS)
+        params["params"] = {**params.get("params", {}), "radius": radius - RANGE_SEARCH_EPSILON}
+        results = await self._run(self._search_sync, collection_name, vectors, top_k, filter_expr, params)
+        return [[hit for hit in hits if hit["score"] >= radius] for hits in results]
+
+    async def sparse_search(
+        self,
+        collection_name: str,
+        sparse_vectors: List[Dict[int, float]],
+        top_k: int = 10,
+        filter_expr: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        return await self._run(self._sparse_search_sync, collection_name, sparse_vectors, top_k, filter_expr)
+
+    async def hybrid_search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        sparse_vectors: List[Dict[int, float]],
+        top_k: int = 10,
+        filter_expr: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None,
+        weights: Optional[Tuple[float, float]] = None,
+        candidate_k: Optional[int] = None
+    ) -> List[List[Dict[str, Any]]]:
+        # 两路检索与融合都在 Milvus 服务端完成
+        return await self._run(
+            self._hybrid_search_sync, collection_name, vectors, sparse_vectors, top_k,
+            filter_expr, search_params or DEFAULT_SEARCH_PARAMS, weights, candidate_k or top_k
+        )
+
+    async def rebuild_index(self, collection_name: str, index_params: Dict[str, Any]):
+        await self._run(self._rebuild_index_sync, collection_name, index_params)
+
+    async def describe_index(self, collection_name: str) -> Dict[str, Any]:
+        return await self._run(self._describe_index_sync, collection_name)
+
+    async def sample_vectors(self, collection_name: str, limit: int) -> List[Tuple[str, List[float]]]:
+        return await self._run(self._sample_vectors_sync, collection_name, limit)
+
+    async def scan(
+        self, collection_name: str, batch_size: int = 1000, filter_expr: Optional[str] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        from app.knowledge.collection_manager import collection_manager
+
+        # 遍历期间固定集合，避免中途被 LRU 释放
+        collection_manager.pin(collection_name)
+        try:
+            iterator = await self._run(self._scan_open_sync, collection_name, batch_size, filter_expr)
+            while True:
+                rows = await self._run(self._scan_next_sync, iterator)
+                if not rows:
+                    return
+                yield rows
+        finally:
+            collection_manager.unpin(collection_name)
+
+    async def rename_collection(self, collection_name: str, new_name: str):
+        await self._run(self._rename_collection_sync, collection_name, new_name)
+
+    async def compact(self, collection_name: str):
+        await self._run(self._compact_sync, collection_name)
+
+    async def document_ids(self, collection_name: str, filter_expr: Optional[str] = None) -> Set[str]:
+        return await self._run(self._document_ids_sync, collection_name, filter_expr)
+
+    async def delete(self, collection_name: str, filter_expr: str) -> int:
+        return await self._run(self._delete_sync, collection_name, filter_expr)
+
+    async def count(self, collection_name: str) -> int:
+        return await self._run(self._count_sync, collection_name)
+
+    async def preload(self, collection_names: List[str]) -> int:
+        return await self._run(self._preload_sync, collection_names)
+
+    def stats(self) -> Dict[str, Any]:
+        from app.knowledge.collection_manager import collection_manager
+
+        return {
+            "backend": "milvus",
+            "pool_size": self.pool_size,
+            "idle_connections": self._pool.qsize() if self._pool else 0,
+            "in_flight": self._in_flight,
+            "calls": self._calls,
+            "avg_pool_wait_ms": round(self._wait_total / self._calls * 1000, 2) if self._calls else 0.0,
+            "collections": collection_manager.stats()
+        }
+
+
+_CONDITION_PATTERN = re.compile(
+    r'^\s*(?:metadata\["(?P<key>[^"]+)"\]|(?P<field>\w+))\s*(?P<op>==|!=|in)\s*(?P<value>.+?)\s*$'
+)
+
+
+def compile_filter(filter_expr: Optional[str]) -> Callable[[Dict[str, Any]], bool]:
+    """
+    将过滤表达式编译为行判定函数（供非 Milvus 实现使用）
+
+    支持用 and 连接的 `field == value`、`field != value`、`field in [...]`，
+    其中 field 可以是顶层字段或 metadata["key"]。
+    """
+    if not filter_expr or not filter_expr.strip():
+        return lambda row: True
+
+    import ast
+
+    conditions = []
+    for part in re.split(r"\s+and\s+", filter_expr.strip()):
+        match = _CONDITION_PATTERN.match(part.strip("() "))
+        if not match:
+            raise ValueError(f"不支持的过滤表达式: {part}")
+        value = ast.literal_eval(match.group("value"))
+        conditions.append((match.group("key"), match.group("field"), match.group("op"), value))
+
+    def _matches(row: Dict[str, Any]) -> bool:
+        for key, field, op, value in conditions:
+            actual = (row.get("metadata") or {}).get(key) if key else row.get(field, (row.get("metadata") or {}).get(field))
+            if op == "==" and actual != value:
+                return False
+            if op == "!=" and actual == value:
+                return False
+            if op == "in" and actual not in value:
+                return False
+        return True
+
+    return _matches
+
+
+class InMemoryVectorStore(VectorStore):
+    """
+    内存向量存储
+
+    纯 Python 暴力检索，仅用于单元测试和本地调试，不适合生产数据量。
+    """
+
+    def __init__(self):
+        self._collections: Dict[str, Dict[str, Any]] = {}
+
+    async def has_collection(self, collection_name: str) -> bool:
+        return collection_name in self._collections
+
+    async def create_collection(
+        self,
+        collection_name: str,
+        dimension: int,
+        index_params: Optional[Dict[str, Any]] = None,
+        sparse: bool = False,
+        partition_key: str = PARTITION_KEY_FIELD
+    ):
+        if (index_params or {}).get("metric_type") == BINARY_METRIC_TYPE:
+            raise ValueError("内存向量存储不支持二值向量集合")
+        self._collections.setdefault(collection_name, {
+            "dimension": dimension,
+            "sparse": sparse,
+            "rows": {},
+            "next_id": 1,
+            "index_params": index_params or get_index_profile(None).index_params()
+        })
+
+    async def drop_collection(self, collection_name: str):
+        self._collections.pop(collection_name, None)
+
+    def _get(self, collection_name: str) -> Dict[str, Any]:
+        if collection_name not in self._collections:
+            raise ValueError(f"Collection not found: {collection_name}")
+        return self._collections[collection_name]
+
+    async def insert(self, collection_name: str, rows: List[Dict[str, Any]]) -> List[str]:
+        collection = self._get(collection_name)
+        ids = []
+        for row in rows:
+            row_id = str(collection["next_id"])
+            collection["next_id"] += 1
+            collection["rows"][row_id] = {
+                "id": row_id,
+                "embedding": list(row["embedding"]),
+                "content": row["content"],
+                "metadata": row.get("metadata") or {},
+                "source": row.get("source", "")
+            }
+            if collection["sparse"]:
+                collection["rows"][row_id][SPARSE_FIELD] = dict(row.get(SPARSE_FIELD) or {})
+            ids.append(row_id)
+        return ids
+
+    async def sparse_search(
+        self,
+        collection_name: str,
+        sparse_vectors: List[Dict[int, float]],
+        top_k: int = 10,
+        filter_expr: Optional[str] = None
+    ) -> List[List[Dict[str, Any]]]:
+        collection = self._get(collection_name)
+        if not collection["sparse"]:
+            raise ValueError(f"集合没有稀疏向量字段: {collection_name}")
+        rows = [row for row in collection["rows"].values() if compile_filter(filter_expr)(row)]
+        results = []
+        for sparse_vector in sparse_vectors:
+            scored = sorted(
+                ({**row, "score": sparse_dot(sparse_vector, row[SPARSE_FIELD])} for row in rows),
+                key=lambda hit: hit["score"],
+                reverse=True
+            )[:top_k]
+            results.append([
+                {key: hit[key] for key in ("id", "score", "content", "metadata", "source")}
+                for hit in scored if hit["score"] > 0
+            ])
+        return results
+
+    async def search(
+        self,
+        collection_name: str,
+        vectors: List[List[float]],
+        top_k: int = 10,
+        filter_expr: Optional[str] = None,
+        search_params: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        rows = [row for row in self._get(collection_name)["rows"].values() if compile_filter(filter_expr)(row)]
+
+        def _cosine(a: List[float], b: List[float]) -> float:
+            norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+            return sum(x * y for x, y in zip(a, b)) / norm if norm else 0.0
+
+        results = []
+        for vector in vectors:
+            scored = sorted(
+                ({**row, "score": _cosine(vector, row["embedding"])} for row in rows),
+                key=lambda hit: hit["score"],
+                reverse=True
+            )[:top_k]
+            results.append([
+                {key: hit[key] for key in ("id", "score", "content", "metadata", "source")}
+                for hit in scored
+            ])
+        return results
+
+    async def rebuild_index(self, collection_name: str, index_params: Dict[str, Any]):
+        # 内存实现始终精确检索，只记录索引参数
+        self._get(collection_name)["index_params"] = index_params
+
+    async def describe_index(self, collection_name: str) -> Dict[str, Any]:
+        return self._get(collection_name)["index_params"]
+
+    async def sample_vectors(self, collection_name: str, limit: int) -> List[Tuple[str, List[float]]]:
+        rows = list(self._get(collection_name)["rows"].values())
+        return [(row["id"], row["embedding"]) for row in random.sample(rows, min(limit, len(rows)))]
+
+    async def scan(
+        self, collection_name: str, batch_size: int = 1000, filter_expr: Optional[str] = None
+    ) -> AsyncIterator[List[Dict[str, Any]]]:
+        predicate = compile_filter(filter_expr)
+        rows = [row for row in self._get(collection_name)["rows"].values() if predicate(row)]
+        for start in range(0, len(rows), batch_size):
+            yield [dict(row) for row in rows[start:start + batch_size]]
+
+    async def rename_collection(self, collection_name: str, new_name: str):
+        if new_name in self._collections:
+            raise ValueError(f"Collection already exists: {new_name}")
+        self._collections[new_name] = self._collections.pop(collection_name)
+
+    async def delete(self, collection_name: str, filter_expr: str) -> int:
+        collection = self._get(collection_name)
+        predicate = compile_filter(filter_expr)
+        doomed = [row_id for row_id, row in collection["rows"].items() if predicate(row)]
+        for row_id in doomed:
+            del collection["rows"][row_id]
+        return len(doomed)
+
+    async def count(self, collection_name: str) -> int:
+        return len(self._get(collection_name)["rows"])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "collections": len(self._collections),
+            "rows": sum(len(c["rows"]) for c in self._collections.values())
+        }
+
+
+def create_vector_store(backend: str = None) -> VectorStore:
+    """
+    根据配置创建向量存储
+
+    - milvus: 全部集合保存在 Milvus
+    - embedded: 全部集合保存在本地内存映射文件（无需 Milvus）
+    - auto: 新集合先保存在本地，超过 embedded_store.max_vectors 后迁移到 Milvus
+    - memory: 纯内存，仅用于测试
+    """
+    backend = (backend or settings.VECTOR_STORE_BACKEND).lower()
+    if backend == "milvus":
+        return MilvusVectorStore(pool_size=settings.MILVUS_CONNECTION_POOL_SIZE)
+    if backend in ("embedded", "auto"):
+        from app.knowledge.embedded_store import EmbeddedVectorStore, TieredVectorStore
+
+        embedded = EmbeddedVectorStore(settings.EMBEDDED_STORE_DIR)
+        if backend == "embedded":
+            return embedded
+        return TieredVectorStore(
+            embedded,
+            MilvusVectorStore(pool_size=settings.MILVUS_CONNECTION_POOL_SIZE),
+            max_vectors=settings.EMBEDDED_STORE_MAX_VECTORS
+        )
+    if backend == "memory":
+        return InMemoryVectorStore()
+    raise ValueError(f"不支持的向量存储后端: {backend}")
+
+
+# 全局实例
+vector_store = create_vector_store()
@@ -20,9 +20,20 @@ class KnowledgeBase(Base):
     top_k = Column(Integer, default=10)
     top_n = Column(Integer, default=5)
     similarity_threshold = Column(Float, default=0.7)
-    search_mode = Column(String(20), default="hybrid")  # vector, keyword, hybrid
+    search_mode = Column(String(20), default="hybrid")  # vector, keyword, hybrid, hybrid_rrf
     rerank_enabled = Column(Boolean, default=True)
     
+    # 向量索引配置
+    index_profile = Column(String(20), default="IVF_FLAT")  # FLAT, IVF_FLAT, IVF_SQ8, HNSW, DISKANN, BIN_FLAT, BIN_IVF_FLAT
+    index_search_params = Column(JSON, nullable=True)  # 自动调优结果 {"param", "value", "recall", ...}
+    quantization = Column(String(10), default="none")  # none, int8, binary
+    projection_dim = Column(Integer, nullable=True)  # PCA 降维后的维度，为空表示使用原始维度
+    projection_rescore = Column(Boolean, default=True)  # 降维检索后是否用全精度向量重打分
+    sparse_enabled = Column(Boolean, default=False)  # 集合是否包含 BGE-M3 稀疏向量字段
+    scalar_fields = Column(Boolean, default=True)  # 集合是否包含 document_id 等标量字段（旧集合需迁移）
+    shared_collection = Column(Boolean, default=False)  # 是否存放在多个知识库共享的集合中（按 kb_id 分区）
+    embedding_provider = Column(String(50), nullable=True)  # Embedding 提供方（local 或 embedding.providers 中的名称），为空表示本地模型
+    
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
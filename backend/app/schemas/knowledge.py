@@ -7,6 +7,10 @@ from datetime import datetime
 class KnowledgeBaseCreate(BaseModel):
     name: str
     description: Optional[str] = None
+    quantization: Optional[str] = None  # none, int8, binary（创建后不可修改）
+    sparse: Optional[bool] = None  # 是否同时保存 BGE-M3 稀疏向量（默认跟随 embedding.sparse_enabled）
+    shared: Optional[bool] = None  # 是否放入共享集合（默认跟随 milvus.shared_collections.enabled）
+    embedding_provider: Optional[str] = None  # Embedding 提供方（默认跟随 embedding.default_provider，创建后不可修改）
 
 
 class KnowledgeBaseUpdate(BaseModel):
@@ -32,6 +36,71 @@ class RetrievalConfigResponse(BaseModel):
     similarity_threshold: float
     search_mode: str
     rerank_enabled: bool
+    index_profile: Optional[str] = None
+    index_search_params: Optional[Dict[str, Any]] = None
+    quantization: Optional[str] = None
+    projection_dim: Optional[int] = None
+    projection_rescore: Optional[bool] = None
+    sparse_enabled: Optional[bool] = None
+    scalar_fields: Optional[bool] = None
+    shared_collection: Optional[bool] = None
+    embedding_provider: Optional[str] = None
+
+
+# 向量索引相关
+class IndexProfileUpdate(BaseModel):
+    index_profile: str  # FLAT, IVF_FLAT, IVF_SQ8, HNSW, DISKANN, BIN_FLAT, BIN_IVF_FLAT, AUTO
+
+
+class IndexTuneRequest(BaseModel):
+    recall_target: Optional[float] = None  # 0~1，默认使用配置
+    sample_size: Optional[int] = None
+    top_k: Optional[int] = None
+
+
+class IndexTuneResponse(BaseModel):
+    index_profile: str
+    search_param: Optional[str]
+    value: Optional[int]
+    recall: float
+    latency_ms: float
+    recall_target: float
+    met_target: bool
+    sample_size: int
+    measurements: List[Dict[str, Any]]
+
+
+class QuantizationReportResponse(BaseModel):
+    quantization: str
+    projection_dim: Optional[int] = None
+    index_profile: str
+    top_k: int
+    rescore_multiplier: int
+    real_queries: int
+    sampled_queries: int
+    float_latency_ms: float
+    quantized_latency_ms: float
+    rescored_latency_ms: float
+    quantized_recall: float
+    rescored_recall: float
+    float_bytes_per_vector: int
+    quantized_bytes_per_vector: int
+
+
+class ProjectionUpdate(BaseModel):
+    dimension: Optional[int] = None  # 如 256、384；为空表示恢复原始维度
+    rescore: bool = True  # 降维检索后是否用全精度向量重打分
+
+
+class ProjectionResponse(BaseModel):
+    projection_dim: Optional[int]
+    explained_variance: Optional[float]
+    migrated: int
+    report: Optional[QuantizationReportResponse] = None
+
+
+class ScalarFieldMigrationResponse(BaseModel):
+    migrated: int
 
 
 class KnowledgeBaseResponse(BaseModel):
@@ -65,6 +134,7 @@ class SearchRequest(BaseModel):
     top_k: Optional[int] = 10
     similarity_threshold: Optional[float] = 0.7
     search_mode: Optional[str] = "hybrid"
+    document_ids: Optional[List[str]] = None  # 只在这些文档中检索
 
 
 class SearchResult(BaseModel):
@@ -73,3 +143,24 @@ class SearchResult(BaseModel):
     score: float
     metadata: Optional[Dict[str, Any]] = None
     source: str
+    collection_id: Optional[str] = None  # 联合检索时标识结果所属知识库
+
+
+class FederatedSearchRequest(BaseModel):
+    collection_ids: List[str]
+    query: str
+    top_k: Optional[int] = 10
+    similarity_threshold: Optional[float] = 0.7
+    rerank_enabled: Optional[bool] = False
+
+
+class BatchSearchRequest(BaseModel):
+    collection_id: str
+    queries: List[str]
+    top_k: Optional[int] = 10
+    similarity_threshold: Optional[float] = 0.7
+
+
+class BatchSearchResult(BaseModel):
+    query: str
+    results: List[SearchResult]
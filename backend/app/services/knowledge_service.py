@@ -2,7 +2,10 @@
 知识库服务
 处理知识库的创建、管理、文档上传及检索逻辑
 """
+import asyncio
+import re
 import uuid
+from dataclasses import replace
 from typing import List, Optional, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
@@ -11,10 +14,24 @@ from sqlalchemy import delete, func
 from app.models.knowledge import KnowledgeBase, Document
 from app.schemas.knowledge import KnowledgeBaseCreate, KnowledgeBaseUpdate, RetrievalConfigUpdate
 from app.knowledge.retrieval import retrieval_service
+from app.knowledge.bm25 import keyword_index_manager
+from app.knowledge.collection_manager import collection_manager
+from app.knowledge.vector_store import PARTITION_KEY_FIELD, SHARED_PARTITION_KEY_FIELD, vector_store
+from app.knowledge.index_profiles import (
+    CollectionSpec, check_quantization, get_index_profile, recommend_index_profile
+)
+from app.knowledge.index_tuner import index_auto_tuner, TuningResult
+from app.knowledge.quantization import quantized_searcher, QuantizationReport
+from app.knowledge.projection import PCAProjection, projection_store
+from app.knowledge.cache import search_result_cache
+from app.knowledge.gc import DeletionTask, ReconcileReport, vector_gc
+from app.knowledge.embedding_providers import LOCAL_PROVIDER, embedding_providers
 from app.core.logger import logger
-from pymilvus import CollectionSchema, FieldSchema, DataType, Collection, connections, utility
 from app.core.config import settings
 
+# 正在后台重建的 BM25 索引（索引名 -> 重建任务）
+_keyword_rebuilds: Dict[str, asyncio.Task] = {}
+
 class KnowledgeService:
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -25,8 +42,39 @@ class KnowledgeService:
         # 集合名使用 agonx_前缀 + UUID 的一部分，确保唯一且符合命名规范
         collection_name = f"agonx_{kb_id.replace('-', '_')}"
         
-        # 1. 在Milvus中创建集合
-        await self._create_milvus_collection(collection_name)
+        # 1. 在Milvus中创建集合（量化知识库使用与量化方式匹配的索引，并创建全精度冷存储）
+        quantization = kb_in.quantization or settings.QUANTIZATION_DEFAULT
+        # Embedding 提供方决定向量维度，入库和查询都使用同一提供方
+        provider_name = embedding_providers.validate(kb_in.embedding_provider)
+        provider = embedding_providers.get(provider_name)
+        sparse = provider.supports_sparse if kb_in.sparse is None else kb_in.sparse
+        if sparse and not provider.supports_sparse:
+            raise ValueError("稀疏向量只支持本地 BGE-M3 模型（embedding.sparse_enabled），无法创建稀疏向量知识库")
+        shared = settings.SHARED_COLLECTIONS_ENABLED if kb_in.shared is None else kb_in.shared
+        if shared and quantization != "none":
+            raise ValueError("共享集合的知识库不支持向量量化")
+        if sparse and quantization == "binary":
+            # 二值向量使用 HAMMING 距离，与稀疏向量的内积分数无法在同一个加权融合中比较
+            raise ValueError("稀疏向量知识库不支持二值量化")
+        
+        if shared:
+            # 多个知识库共享少量大集合，以 kb_id 为分区键隔离
+            collection_name = self._shared_collection_name(kb_id, sparse, provider_name)
+            index_profile = get_index_profile(settings.SHARED_COLLECTIONS_INDEX_PROFILE).name
+            await self._create_milvus_collection(
+                collection_name, index_profile, sparse, partition_key=SHARED_PARTITION_KEY_FIELD,
+                dimension=provider.dimension
+            )
+        else:
+            if quantization == "none":
+                profile = get_index_profile(None)
+            else:
+                profile = recommend_index_profile(0, quantization)
+            check_quantization(profile, quantization)
+            index_profile = profile.name
+            await self._create_milvus_collection(collection_name, index_profile, sparse, dimension=provider.dimension)
+            if quantization != "none":
+                await quantized_searcher.create(collection_name, provider.dimension)
         
         # 2. 在MySQL中保存元数据
         db_kb = KnowledgeBase(
@@ -34,8 +82,15 @@ class KnowledgeService:
             user_id=user_id,
             name=kb_in.name,
             description=kb_in.description,
-            collection_name=collection_name
+            collection_name=collection_name,
+            index_profile=index_profile,
+            quantization=quantization,
+            sparse_enabled=sparse,
+            scalar_fields=True,
+            shared_collection=shared,
+            embedding_provider=provider_name
         )
+        await keyword_index_manager.create(CollectionSpec.from_knowledge_base(db_kb).keyword_index_name)
         self.db.add(db_kb)
         await self.db.commit()
         await self.db.refresh(db_kb)
@@ -43,33 +98,46 @@ class KnowledgeService:
         logger.info(f"知识库创建成功: {db_kb.name} (ID: {db_kb.id}, Collection: {collection_name})")
         return db_kb
 
-    async def _create_milvus_collection(self, collection_name: str):
-        """创建Milvus集合"""
-        await retrieval_service.connect()
+    @staticmethod
+    def _shared_collection_name(kb_id: str, sparse: bool = False, provider: str = LOCAL_PROVIDER) -> str:
+        """
+        按 kb_id 把知识库均匀分配到共享集合
         
-        if utility.has_collection(collection_name):
-            return
+        稀疏向量知识库、远程 Embedding 提供方的知识库（维度和向量空间不同）各自使用单独的一组集合。
+        """
+        index = uuid.UUID(kb_id).int % max(1, settings.SHARED_COLLECTIONS_COUNT)
+        name = f"agonx_shared_{index}" + ("_sparse" if sparse else "")
+        if provider != LOCAL_PROVIDER:
+            name += "_" + re.sub(r"\W", "_", provider)
+        return name
 
-        # 定义Schema
-        fields = [
-            FieldSchema(name="id", dtype=DataType.INT64, is_primary=True, auto_id=True),
-            FieldSchema(name="embedding", dtype=DataType.FLOAT_VECTOR, dim=settings.EMBEDDING_DIMENSION),
-            FieldSchema(name="content", dtype=DataType.VARCHAR, max_length=65535),
-            FieldSchema(name="metadata", dtype=DataType.JSON),
-            FieldSchema(name="source", dtype=DataType.VARCHAR, max_length=500)
-        ]
-        schema = CollectionSchema(fields, description="AgonX Knowledge Base Collection")
-        
-        collection = Collection(name=collection_name, schema=schema)
-        
-        # 创建索引
-        index_params = {
-            "metric_type": "COSINE",
-            "index_type": "IVF_FLAT",
-            "params": {"nlist": 128}
-        }
-        collection.create_index(field_name="embedding", index_params=index_params)
-        logger.info(f"Milvus集合创建并初始化索引成功: {collection_name}")
+    @staticmethod
+    def _embedding_dimension(spec: CollectionSpec) -> int:
+        """知识库原始向量维度（由 Embedding 提供方决定）"""
+        return embedding_providers.get(spec.embedding_provider).dimension
+
+    @staticmethod
+    def _check_dedicated(kb: KnowledgeBase, action: str):
+        """共享集合的索引与 schema 由所有知识库共用，不能单独修改"""
+        if kb.shared_collection:
+            raise ValueError(f"共享集合的知识库不支持{action}")
+
+    async def _create_milvus_collection(
+        self,
+        collection_name: str,
+        index_profile: str = None,
+        sparse: bool = False,
+        partition_key: str = PARTITION_KEY_FIELD,
+        dimension: int = None
+    ):
+        """创建Milvus集合（sparse 为 True 时包含 BGE-M3 稀疏向量字段；共享集合已存在时直接复用）"""
+        await vector_store.create_collection(
+            collection_name,
+            dimension or settings.EMBEDDING_DIMENSION,
+            index_params=get_index_profile(index_profile).index_params(),
+            sparse=sparse,
+            partition_key=partition_key
+        )
 
     async def get_user_knowledge_bases(self, user_id: int) -> List[KnowledgeBase]:
         """获取用户的所有知识库"""
@@ -85,17 +153,36 @@ class KnowledgeService:
         )
         return result.scalar_one_or_none()
 
+    async def get_user_knowledge_bases_by_ids(self, user_id: int, kb_ids: List[str]) -> List[KnowledgeBase]:
+        """获取用户有权访问的指定知识库（不属于该用户的 ID 会被忽略）"""
+        result = await self.db.execute(
+            select(KnowledgeBase).where(
+                KnowledgeBase.user_id == user_id,
+                KnowledgeBase.id.in_(kb_ids)
+            )
+        )
+        return result.scalars().all()
+
     async def delete_knowledge_base(self, kb_id: str):
         """删除知识库及关联数据"""
         kb = await self.get_knowledge_base(kb_id)
         if not kb:
             return
         
-        # 1. 删除Milvus集合
-        await retrieval_service.connect()
-        if utility.has_collection(kb.collection_name):
-            utility.drop_collection(kb.collection_name)
-            logger.info(f"Milvus集合已删除: {kb.collection_name}")
+        # 1. 删除Milvus集合（共享集合只删除该知识库分区内的数据）
+        spec = CollectionSpec.from_knowledge_base(kb)
+        if spec.shared:
+            await retrieval_service.connect()
+            deleted = await vector_store.delete(kb.collection_name, spec.filter_expr())
+            logger.info(f"已从共享集合 {kb.collection_name} 删除知识库 {kb_id} 的 {deleted} 条向量")
+        else:
+            await vector_store.drop_collection(kb.collection_name)
+            await quantized_searcher.drop(kb.collection_name)
+            projection_store.drop(kb.collection_name)
+        await keyword_index_manager.drop(spec.keyword_index_name)
+        await self.invalidate_search_cache(kb_id)
+        # 原文件、页面截图等对象由后台回收
+        vector_gc.submit(DeletionTask.for_knowledge_base(kb_id))
         
         # 2. 删除MySQL中的记录 (由于CASCADE，会自动删除关联的Document)
         await self.db.delete(kb)
@@ -113,5 +200,381 @@ class KnowledgeService:
         
         await self.db.commit()
         await self.db.refresh(kb)
+        await self.invalidate_search_cache(kb_id)
+        return kb
+
+    async def invalidate_search_cache(self, kb_id: str):
+        """知识库内容或配置变化后，使其检索结果缓存失效"""
+        await search_result_cache.bump_version(kb_id)
+
+    async def rebuild_index(self, kb: KnowledgeBase, index_profile: str) -> KnowledgeBase:
+        """
+        切换知识库的索引类型并重建索引
+        
+        index_profile 为 AUTO 时按当前数据量选择；IVF 类索引的 nlist 按数据量计算。
+        索引类型必须与知识库的量化方式匹配（二值量化只能使用 BIN_ 索引）。
+        重建后之前的调优结果失效。
+        """
+        self._check_dedicated(kb, "切换索引类型")
+        quantization = kb.quantization or "none"
+        num_entities = await vector_store.count(kb.collection_name)
+        if index_profile.upper() == "AUTO":
+            profile = recommend_index_profile(num_entities, quantization)
+        else:
+            profile = get_index_profile(index_profile)
+        check_quantization(profile, quantization)
+        
+        await vector_store.rebuild_index(kb.collection_name, profile.index_params(num_entities))
+        
+        kb.index_profile = profile.name
+        kb.index_search_params = None
+        await self.db.commit()
+        await self.db.refresh(kb)
+        await self.invalidate_search_cache(kb.id)
+        logger.info(f"知识库索引已切换: {kb.name} -> {profile.name} ({num_entities} 条向量)")
         return kb
 
+    async def tune_index(
+        self,
+        kb: KnowledgeBase,
+        recall_target: float = None,
+        sample_size: int = None,
+        top_k: int = None
+    ) -> TuningResult:
+        """按召回率目标自动调优检索参数，并保存到知识库"""
+        self._check_dedicated(kb, "单独调优检索参数")
+        result = await index_auto_tuner.tune(
+            kb.collection_name,
+            get_index_profile(kb.index_profile),
+            recall_target=recall_target or settings.INDEX_TUNE_RECALL_TARGET,
+            sample_size=sample_size or settings.INDEX_TUNE_SAMPLE_SIZE,
+            top_k=top_k or kb.top_k
+        )
+        
+        kb.index_search_params = {
+            "param": result.search_param,
+            "value": result.value,
+            "recall": result.recall,
+            "recall_target": result.recall_target,
+            "latency_ms": result.latency_ms
+        } if result.search_param else None
+        await self.db.commit()
+        await self.db.refresh(kb)
+        await self.invalidate_search_cache(kb.id)
+        logger.info(f"知识库索引调优完成: {kb.name} {result.search_param}={result.value}, recall={result.recall}")
+        return result
+
+    async def quantization_report(
+        self,
+        kb: KnowledgeBase,
+        sample_size: int = None,
+        top_k: int = None
+    ) -> QuantizationReport:
+        """
+        生成量化检索的召回/延迟报告
+        
+        优先使用该知识库最近的真实查询；数量不足时用冷存储中抽样的分块向量补足。
+        """
+        sample_size = sample_size or settings.QUANTIZATION_REPORT_SAMPLE_SIZE
+        queries = retrieval_service.recent_queries(kb.collection_name, sample_size)
+        spec = CollectionSpec.from_knowledge_base(kb)
+        vectors = await retrieval_service._queries_to_vectors(queries, spec) if queries else []
+        if len(vectors) < sample_size:
+            samples = await quantized_searcher.cold_store.sample_vectors(
+                kb.collection_name, sample_size - len(vectors)
+            )
+            vectors.extend(vector for _, vector in samples)
+        
+        await retrieval_service.connect()
+        return await quantized_searcher.report(
+            spec,
+            vectors,
+            top_k=top_k or kb.top_k,
+            real_queries=len(queries)
+        )
+
+    async def set_projection(
+        self,
+        kb: KnowledgeBase,
+        dimension: Optional[int],
+        rescore: bool = True
+    ) -> Dict[str, Any]:
+        """
+        切换知识库的降维投影并重建集合
+        
+        在知识库自己的分块向量上拟合 PCA（dimension 为空时恢复原始维度），
+        把全部分块按新维度写入临时集合，再替换原集合。全精度向量写入冷存储，
+        供重打分和以后重新拟合使用。重建期间写入的新分块会丢失，应在无上传时执行。
+        
+        Returns:
+            {"projection_dim", "explained_variance", "migrated", "report"}，
+            report 为降维后的召回/延迟报告（恢复原始维度时为 None）
+        """
+        self._check_dedicated(kb, "降维投影")
+        full_dim = self._embedding_dimension(CollectionSpec.from_knowledge_base(kb))
+        if dimension is not None:
+            if not 8 <= dimension < full_dim:
+                raise ValueError(f"投影维度必须在 [8, {full_dim}) 范围内")
+            if kb.quantization == "binary" and dimension % 8:
+                raise ValueError("二值量化知识库的投影维度必须是 8 的倍数")
+        
+        await retrieval_service.connect()
+        name = kb.collection_name
+        old_spec = CollectionSpec.from_knowledge_base(kb)
+        new_spec = replace(old_spec, projection_dim=dimension, projection_rescore=rescore)
+        source = vector_store if old_spec.stores_full_vectors else quantized_searcher.cold_store
+        
+        # 1. 拟合投影
+        projection = None
+        if dimension is not None:
+            samples = await source.sample_vectors(name, settings.PROJECTION_FIT_SAMPLE_SIZE)
+            projection = await asyncio.to_thread(
+                PCAProjection.fit, [vector for _, vector in samples], dimension
+            )
+        
+        # 2. 按新维度重建集合
+        mapping = await self._rebuild_collection(kb, old_spec, new_spec, projection)
+        if projection is not None:
+            projection_store.save(name, projection)
+        else:
+            projection_store.drop(name)
+        
+        kb.projection_dim = dimension
+        kb.projection_rescore = rescore
+        kb.index_search_params = None
+        await self.db.commit()
+        await self.db.refresh(kb)
+        await self.invalidate_search_cache(kb.id)
+        logger.info(f"知识库降维重建完成: {kb.name} -> {dimension or full_dim} 维 ({len(mapping)} 条向量)")
+        
+        report = None
+        if new_spec.compressed and mapping:
+            report = (await self.quantization_report(kb)).to_dict()
+        return {
+            "projection_dim": dimension,
+            "explained_variance": round(projection.explained_variance, 4) if projection else None,
+            "migrated": len(mapping),
+            "report": report
+        }
+
+    async def migrate_scalar_fields(self, kb: KnowledgeBase) -> Dict[str, Any]:
+        """
+        将旧集合迁移到带标量字段的 schema
+        
+        document_id / kb_id / chunk_id / page_id 从 metadata 中提取为带索引的标量字段，
+        并以 document_id 为分区键。迁移通过重建集合完成（向量原样复制，不重新编码），
+        期间写入的新分块会丢失，应在无上传时执行。
+        
+        Returns:
+            {"migrated": 迁移的分块数}
+        """
+        if kb.scalar_fields:
+            return {"migrated": 0}
+        
+        await retrieval_service.connect()
+        old_spec = CollectionSpec.from_knowledge_base(kb)
+        new_spec = replace(old_spec, scalar_fields=True)
+        projection = projection_store.get(kb.collection_name) if old_spec.projected else None
+        mapping = await self._rebuild_collection(kb, old_spec, new_spec, projection)
+        
+        kb.scalar_fields = True
+        await self.db.commit()
+        await self.db.refresh(kb)
+        await self.invalidate_search_cache(kb.id)
+        logger.info(f"知识库标量字段迁移完成: {kb.name} ({len(mapping)} 条向量)")
+        return {"migrated": len(mapping)}
+
+    async def _rebuild_collection(
+        self,
+        kb: KnowledgeBase,
+        old_spec: CollectionSpec,
+        new_spec: CollectionSpec,
+        projection: Optional[PCAProjection] = None
+    ) -> Dict[str, str]:
+        """
+        按 new_spec 重建集合
+        
+        全部分块写入临时集合（冷存储同样写入临时集合，主键与新集合一致），
+        再替换原集合并同步 BM25 索引的主键。返回旧主键到新主键的映射。
+        """
+        name = kb.collection_name
+        tmp_name = f"{name}__rebuild"
+        tmp_spec = replace(new_spec, collection_name=tmp_name)
+        for store in (vector_store, quantized_searcher.cold_store):
+            if await store.has_collection(tmp_name):
+                await store.drop_collection(tmp_name)
+        
+        num_entities = await vector_store.count(name)
+        await vector_store.create_collection(
+            tmp_name,
+            new_spec.projection_dim or self._embedding_dimension(new_spec),
+            index_params=get_index_profile(kb.index_profile).index_params(num_entities),
+            sparse=old_spec.sparse
+        )
+        
+        mapping: Dict[str, str] = {}
+        async for rows in vector_store.scan(name, settings.PROJECTION_REBUILD_BATCH_SIZE):
+            ids = [row["id"] for row in rows]
+            if old_spec.stores_full_vectors:
+                vectors = [list(row["embedding"]) for row in rows]
+            else:
+                stored = await quantized_searcher.cold_store.fetch_vectors(name, ids)
+                rows = [row for row in rows if row["id"] in stored]
+                ids = [row["id"] for row in rows]
+                vectors = [stored[row_id].tolist() for row_id in ids]
+            if not rows:
+                continue
+            
+            full_rows = [{**row, "embedding": vector} for row, vector in zip(rows, vectors)]
+            new_ids = await vector_store.insert(
+                tmp_name, quantized_searcher.prepare_rows(tmp_spec, full_rows, projection)
+            )
+            if new_spec.compressed:
+                await quantized_searcher.add(
+                    tmp_name, new_ids, vectors, [row.get("metadata") or {} for row in rows]
+                )
+            mapping.update(zip(ids, new_ids))
+        await vector_store.flush(tmp_name)
+        
+        # 替换原集合
+        await vector_store.drop_collection(name)
+        await vector_store.rename_collection(tmp_name, name)
+        await quantized_searcher.drop(name)
+        if new_spec.compressed:
+            await quantized_searcher.cold_store.rename_collection(tmp_name, name)
+        await keyword_index_manager.remap_ids(old_spec.keyword_index_name, mapping)
+        return mapping
+
+    async def delete_document(self, kb: KnowledgeBase, document: Document):
+        """
+        删除文档
+
+        数据库记录、向量、BM25 索引和检索缓存立即更新，删除后检索不再返回该文档；
+        MinIO 对象（原文件、页面截图、缩略图、提取的图片）和集合压缩交给后台垃圾回收器。
+        向量删除失败时也交给回收器重试，回收器删除向量后会再次使检索缓存失效。
+        """
+        await self.db.delete(document)
+        await self.db.commit()
+        
+        spec = CollectionSpec.from_knowledge_base(kb)
+        try:
+            await retrieval_service.connect()
+            deleted = await vector_gc.delete_vectors(spec, [document.id])
+            vector_gc.submit(DeletionTask.for_document(spec, document.id, document.file_path, vectors=False))
+        except Exception as e:
+            logger.warning(f"删除文档向量失败，交给后台回收器重试: {document.id}: {str(e)}")
+            deleted = None
+            vector_gc.submit(DeletionTask.for_document(spec, document.id, document.file_path))
+        
+        removed = await keyword_index_manager.remove_document(spec.keyword_index_name, document.id)
+        await self.invalidate_search_cache(kb.id)
+        logger.info(
+            f"文档已删除: {document.filename} (向量 {'待回收' if deleted is None else f'{deleted} 条'}, "
+            f"BM25 索引移除 {removed} 个分块，文件已提交后台回收)"
+        )
+
+    async def reconcile_storage(self, dry_run: bool = True, check_objects: bool = True) -> ReconcileReport:
+        """对账：清理数据库中已不存在的文档在向量集合和 MinIO 中遗留的数据"""
+        kbs = (await self.db.execute(select(KnowledgeBase))).scalars().all()
+        result = await self.db.execute(select(Document.knowledge_base_id, Document.id))
+        alive: Dict[str, set] = {kb.id: set() for kb in kbs}
+        for kb_id, doc_id in result.all():
+            alive.setdefault(kb_id, set()).add(doc_id)
+        
+        await retrieval_service.connect()
+        return await vector_gc.reconcile(
+            [(CollectionSpec.from_knowledge_base(kb), alive[kb.id]) for kb in kbs],
+            dry_run=dry_run,
+            check_objects=check_objects,
+            recheck=self._existing_document_ids
+        )
+
+    async def _existing_document_ids(self, document_ids: List[str]) -> set:
+        """返回给定文档 ID 中数据库当前存在的部分（对账删除前重新核对）"""
+        # 结束扫描前开启的事务，读取扫描期间提交的文档（可重复读隔离级别下旧事务看不到）
+        await self.db.commit()
+        existing = set()
+        for i in range(0, len(document_ids), 1000):
+            result = await self.db.execute(
+                select(Document.id).where(Document.id.in_(document_ids[i:i + 1000]))
+            )
+            existing.update(result.scalars().all())
+        return existing
+
+    async def ensure_keyword_index(self, kb: KnowledgeBase) -> bool:
+        """
+        确保知识库的 BM25 索引完整
+        
+        索引文件缺失或不完整（如功能上线前创建的知识库）时，在后台遍历向量集合全量重建，
+        同一索引同时只有一个重建任务；重建完成前返回 False，调用方应退回纯向量检索。
+        分块 ID、内容和元数据与入库时写入 BM25 索引的一致（向量存储主键），
+        混合检索可以按主键融合两路结果，按文档删除也能命中。
+        稀疏向量知识库的关键词检索使用 BGE-M3 词汇权重，不需要 BM25 索引。
+        
+        Returns:
+            关键词检索当前是否可用
+        """
+        spec = CollectionSpec.from_knowledge_base(kb)
+        index_name = spec.keyword_index_name
+        if kb.sparse_enabled:
+            return True
+        if await keyword_index_manager.is_complete(index_name):
+            return True
+        # 单飞：并发检索只触发一次重建
+        if index_name not in _keyword_rebuilds:
+            task = asyncio.create_task(self._rebuild_keyword_index(spec))
+            _keyword_rebuilds[index_name] = task
+            task.add_done_callback(lambda _: _keyword_rebuilds.pop(index_name, None))
+        return False
+    
+    @staticmethod
+    async def _rebuild_keyword_index(spec: CollectionSpec):
+        """从向量集合重建 BM25 索引（共享集合只扫描本知识库分区）"""
+        index_name = spec.keyword_index_name
+        logger.info(f"BM25 索引不完整，后台从向量集合重建: {index_name}")
+        try:
+            await retrieval_service.connect()
+            entries = []
+            if await vector_store.has_collection(spec.collection_name):
+                async for rows in vector_store.scan(spec.collection_name, filter_expr=spec.filter_expr()):
+                    for row in rows:
+                        metadata = row.get("metadata") or {}
+                        entries.append({
+                            "id": row["id"],
+                            "content": row.get("content", ""),
+                            "metadata": metadata,
+                            "source": metadata.get("source", "")
+                        })
+            await keyword_index_manager.rebuild(index_name, entries)
+            # 重建期间的检索退回纯向量检索，结果未写入缓存，这里不需要使缓存失效
+            logger.info(f"✅ BM25 索引重建完成: {index_name}（{len(entries)} 个分块）")
+        except Exception as e:
+            logger.error(f"BM25 索引重建失败: {index_name}: {str(e)}")
+    
+    async def preload_collections(self, limit: int) -> int:
+        """
+        预加载最常用的知识库集合
+        
+        优先使用上次运行记录的检索次数，没有记录时按文档数量选择。
+        """
+        collection_manager.load_usage()
+        names = collection_manager.most_used(limit)
+        
+        if len(names) < limit:
+            result = await self.db.execute(
+                select(KnowledgeBase.collection_name)
+                .outerjoin(Document, Document.knowledge_base_id == KnowledgeBase.id)
+                .group_by(KnowledgeBase.id, KnowledgeBase.collection_name)
+                .order_by(func.count(Document.id).desc())
+                .limit(limit)
+            )
+            for name in result.scalars().all():
+                if name not in names and len(names) < limit:
+                    names.append(name)
+        
+        if not names:
+            return 0
+        
+        loaded = await vector_store.preload(names)
+        logger.info(f"预加载 Milvus 集合完成: {loaded}/{len(names)}")
+        return loaded
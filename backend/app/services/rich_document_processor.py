@@ -18,7 +18,7 @@ class RichDocumentProcessor:
     
     def __init__(self, minio_client: Minio):
         self.minio_client = minio_client
-        self.bucket_name = "agonx-documents"
+        self.bucket_name = settings.MINIO_BUCKET
     
     async def process_pdf_page(
         self,
@@ -0,0 +1,267 @@
+"""
+模型预热服务
+应用启动时并行加载 Embedding 模型、Reranker 和 OCR 引擎，并各执行一次推理，
+首个请求不再承担模型加载和首次推理的开销；预热状态通过 /ready 对外报告
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.logger import logger
+
+WARMUP_MODELS = ("embedding", "rerank", "ocr")
+WARMUP_TEXT = "AgonX 模型预热：知识库检索与重排序"
+
+
+class ModelWarmup:
+    """
+    模型预热
+
+    每个模型分两步：加载（load）和预热推理（infer），分别记录耗时。
+    Embedding 和 Reranker 在各自的推理执行器中运行，OCR 在线程池中运行，三者互不阻塞。
+    预热失败或超时不影响应用启动，模型仍会在首次使用时懒加载；失败的模型在后台按指数退避重试。
+    只有 warmup.required 中的模型全部就绪后才报告 ready，预热失败但之后已懒加载成功的模型也算就绪。
+    """
+
+    def __init__(self):
+        self.models = [name for name in settings.WARMUP_MODELS if name in WARMUP_MODELS]
+        self.required = {name for name in settings.WARMUP_REQUIRED if name in self.models}
+        self.states: Dict[str, Dict[str, Any]] = {name: {"status": "pending"} for name in self.models}
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+        unknown = set(settings.WARMUP_MODELS) - set(WARMUP_MODELS)
+        if unknown:
+            logger.warning(f"忽略未知的预热模型: {', '.join(sorted(unknown))}")
+
+    async def start(self):
+        """开始预热（blocking 为 False 时在后台运行，存活检查不受影响；失败重试始终在后台运行）"""
+        if not settings.WARMUP_ENABLED or not self.models:
+            logger.info("模型预热已关闭，模型将在首次使用时加载")
+            return
+        if settings.WARMUP_BLOCKING:
+            await self._first_pass()
+            self._task = asyncio.create_task(self._retry_failed())
+        else:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def run(self):
+        """并行预热所有模型，失败的模型按退避间隔重试"""
+        await self._first_pass()
+        await self._retry_failed()
+
+    async def _first_pass(self):
+        self.started_at = time.time()
+        logger.info(f"🔥 开始预热模型: {', '.join(self.models)}")
+        await self._warm_all(self.models)
+        self.finished_at = time.time()
+
+        summary = ", ".join(
+            f"{name} {state['status']}"
+            + (f"（加载 {state['load_s']}s, 推理 {state['warmup_s']}s）" if state["status"] == "ready" else "")
+            for name, state in self.states.items()
+        )
+        logger.info(f"🔥 模型预热结束（总耗时: {self.finished_at - self.started_at:.2f}s）: {summary}")
+        if not self.ready:
+            logger.error(f"❌ 必需模型预热失败，重试成功前 /ready 返回 503: {', '.join(sorted(self.required))}")
+
+    async def _retry_failed(self):
+        """按指数退避重试失败的模型，直到全部就绪（retry_interval 为 0 时不重试）"""
+        interval = settings.WARMUP_RETRY_INTERVAL
+        if interval <= 0:
+            return
+        while True:
+            failed = [name for name, state in self.states.items() if state["status"] == "failed"]
+            if not failed:
+                return
+            logger.info(f"🔁 {interval:.0f}s 后重试预热: {', '.join(failed)}")
+            await asyncio.sleep(interval)
+            for name in failed:
+                self.states[name]["retries"] = self.states[name].get("retries", 0) + 1
+            await self._warm_all(failed)
+            if self.ready:
+                logger.info("✅ 必需模型已就绪，/ready 恢复 200")
+            interval = min(interval * 2, settings.WARMUP_RETRY_MAX_INTERVAL)
+
+    async def _warm_all(self, names: List[str]):
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(self._warm(name) for name in names)),
+                timeout=settings.WARMUP_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            for name in names:
+                state = self.states[name]
+                if state["status"] not in ("ready", "failed"):
+                    state.update(status="failed", error=f"预热超时（{settings.WARMUP_TIMEOUT:.0f}s）")
+                    logger.error(f"❌ {name} 预热超时，将在首次使用时继续加载")
+
+    async def _warm(self, name: str):
+        """加载并预热单个模型，记录各阶段耗时"""
+        state = self.states[name]
+        load, infer = self._steps(name)
+        try:
+            state["status"] = "loading"
+            start = time.perf_counter()
+            await load()
+            state["load_s"] = round(time.perf_counter() - start, 2)
+
+            state["status"] = "warming"
+            start = time.perf_counter()
+            await infer()
+            state["warmup_s"] = round(time.perf_counter() - start, 2)
+
+            state["status"] = "ready"
+            state.pop("error", None)
+            logger.info(f"✅ {name} 预热完成（加载: {state['load_s']:.2f}s, 预热推理: {state['warmup_s']:.2f}s）")
+        except Exception as e:
+            state.update(status="failed", error=str(e))
+            logger.error(f"❌ {name} 预热失败: {str(e)}")
+
+    def _steps(self, name: str) -> Tuple[Callable[[], Awaitable], Callable[[], Awaitable]]:
+        return {
+            "embedding": (self._load_embedding, self._infer_embedding),
+            "rerank": (self._load_rerank, self._infer_rerank),
+            "ocr": (self._load_ocr, self._infer_ocr),
+        }[name]
+
+    # ---------- Embedding（默认提供方） ----------
+
+    @staticmethod
+    def _embedding_provider():
+        from app.knowledge.embedding_providers import embedding_providers
+        return embedding_providers.get(settings.EMBEDDING_DEFAULT_PROVIDER)
+
+    async def _load_embedding(self):
+        from app.knowledge.embedding_providers import LOCAL_PROVIDER
+        from app.knowledge.executor import embedding_executor
+        from app.knowledge.retrieval import retrieval_service
+
+        # 远程提供方没有本地模型，连接在预热推理时建立
+        if self._embedding_provider().name == LOCAL_PROVIDER:
+            await embedding_executor.run(retrieval_service._get_embedding_model)
+
+    async def _infer_embedding(self):
+        from app.knowledge.embedding_providers import LOCAL_PROVIDER
+        from app.knowledge.executor import embedding_executor
+        from app.knowledge.retrieval import retrieval_service
+
+        provider = self._embedding_provider()
+        if provider.name == LOCAL_PROVIDER:
+            vectors = await embedding_executor.run(retrieval_service._encode_texts, [WARMUP_TEXT])
+        else:
+            vectors = await provider.embed_queries([WARMUP_TEXT])
+        if len(vectors[0]) != provider.dimension:
+            raise ValueError(f"向量维度 {len(vectors[0])} 与配置 {provider.dimension} 不一致")
+
+    # ---------- Reranker ----------
+
+    async def _load_rerank(self):
+        from app.knowledge.retrieval import rerank_service
+
+        # 预热有自己的重试间隔，不等待 rerank_service 的加载退避
+        rerank_service.reset()
+        await rerank_service.load_model()
+        if rerank_service.model is None:
+            raise RuntimeError("Reranker 模型加载失败，重排序将被跳过")
+
+    async def _infer_rerank(self):
+        from app.knowledge.executor import rerank_executor
+        from app.knowledge.retrieval import rerank_service
+
+        await rerank_executor.run(rerank_service._compute_scores, WARMUP_TEXT, [WARMUP_TEXT])
+
+    # ---------- OCR ----------
+
+    async def _load_ocr(self):
+        from app.services.ocr_service import ocr_service
+
+        if ocr_service.engine == "paddleocr":
+            await asyncio.to_thread(ocr_service._get_paddle_ocr)
+
+    async def _infer_ocr(self):
+        from app.services.ocr_service import ocr_service
+
+        if ocr_service.engine == "paddleocr":
+            await asyncio.to_thread(self._paddle_ocr_sync, ocr_service._get_paddle_ocr())
+
+    @staticmethod
+    def _paddle_ocr_sync(ocr):
+        """对一张带文字的小图执行一次检测、方向分类和识别"""
+        import numpy as np
+        from PIL import Image, ImageDraw
+
+        image = Image.new("RGB", (320, 48), "white")
+        ImageDraw.Draw(image).text((8, 16), "AgonX OCR warmup 2024", fill="black")
+        ocr.ocr(np.array(image), cls=True)
+
+    # ---------- 状态 ----------
+
+    @staticmethod
+    def _loaded(name: str) -> bool:
+        """模型当前是否已在进程内加载（预热失败后可能已被首次请求懒加载）"""
+        if name == "embedding":
+            from app.knowledge.embedding_providers import LOCAL_PROVIDER
+            from app.knowledge.retrieval import retrieval_service
+
+            # 远程提供方没有本地模型可检查，只能等待重试
+            if ModelWarmup._embedding_provider().name != LOCAL_PROVIDER:
+                return False
+            return retrieval_service._embedding_model is not None
+        if name == "rerank":
+            from app.knowledge.retrieval import rerank_service
+            return rerank_service.model is not None
+        from app.services.ocr_service import ocr_service
+        return ocr_service.engine != "paddleocr" or ocr_service._ocr_instance is not None
+
+    def _is_ready(self, name: str) -> bool:
+        status = self.states[name]["status"]
+        return status == "ready" or (status == "failed" and self._loaded(name))
+
+    @property
+    def ready(self) -> bool:
+        """必需模型是否全部就绪（预热关闭时始终就绪）"""
+        if not settings.WARMUP_ENABLED or not self.models:
+            return True
+        if self.finished_at is None:
+            return False
+        return all(self._is_ready(name) for name in self.required)
+
+    def status(self) -> Dict[str, Any]:
+        if not settings.WARMUP_ENABLED or not self.models:
+            status = "disabled"
+        elif self.finished_at is None:
+            status = "warming"
+        elif not self.ready:
+            status = "failed"
+        elif not all(self._is_ready(name) for name in self.states):
+            status = "degraded"
+        else:
+            status = "ready"
+
+        if self.started_at is None:
+            elapsed = None
+        else:
+            elapsed = round((self.finished_at or time.time()) - self.started_at, 2)
+        return {
+            "ready": self.ready,
+            "status": status,
+            "elapsed_s": elapsed,
+            "required": sorted(self.required),
+            "models": self.states
+        }
+
+
+# 全局实例
+model_warmup = ModelWarmup()
@@ -0,0 +1,101 @@
+"""
+导出 Embedding 模型的 ONNX int8 版本
+导出后用 PyTorch 后端对比向量一致性，结果写入输出目录的 agonx_onnx.json，
+在 config.yaml 中设置 embedding.backend: "onnx" 和 embedding.onnx.model_path 即可使用
+
+用法:
+    python download/export_onnx.py --model F:\\modules\\bge-m3 --output F:\\modules\\bge-m3-onnx-int8
+"""
+
+import argparse
+import os
+import sys
+
+# 添加项目根目录到路径，以便导入 app 模块
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.core.config import settings
+from app.knowledge.embedding_backends import (
+    OnnxEmbeddingModel, embedding_agreement, export_onnx, write_onnx_metadata
+)
+
+# 一致性检查的默认样本（可用 --samples 指定文本文件，每行一条）
+DEFAULT_SAMPLES = [
+    "AgonX 是一个多智能体协作平台",
+    "知识库支持 PDF、Word、Markdown 等格式的文档上传",
+    "向量检索使用 Milvus，关键词检索使用 BM25",
+    "如何重置管理员密码？",
+    "上传的文档会被切分为多个分块并生成向量",
+    "This is a test sentence for embedding agreement.",
+    "The reranker scores query and passage pairs with a cross-encoder.",
+    "ONNX Runtime runs the quantized model on CPU-only nodes.",
+    "检索结果按相似度排序，低于阈值的结果会被过滤",
+    "设备故障时请先检查电源和网络连接",
+    "订单状态可以在个人中心查询",
+    "The weather tool returns the forecast for a given city.",
+]
+
+
+def load_samples(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 ONNX int8 Embedding 模型")
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL, help="本地模型目录或 HuggingFace 模型 ID")
+    parser.add_argument("--output", default=settings.EMBEDDING_ONNX_MODEL_PATH, help="输出目录")
+    parser.add_argument("--no-quantize", action="store_true", help="只导出 fp32 模型")
+    parser.add_argument("--keep-fp32", action="store_true", help="量化后保留 fp32 模型")
+    parser.add_argument("--samples", help="一致性检查的样本文件（每行一条文本）")
+    parser.add_argument("--skip-check", action="store_true", help="跳过与 PyTorch 后端的一致性检查")
+    args = parser.parse_args()
+
+    print("============================================================")
+    print("导出 ONNX Embedding 模型")
+    print("============================================================")
+    print(f"源模型: {args.model}")
+    print(f"输出目录: {args.output}")
+    print(f"int8 量化: {not args.no_quantize}")
+    print("============================================================")
+
+    try:
+        output = export_onnx(
+            args.model,
+            args.output,
+            quantize=not args.no_quantize,
+            keep_fp32=args.keep_fp32
+        )
+    except Exception as e:
+        print(f"\n❌ 导出失败: {e}")
+        sys.exit(1)
+
+    if args.skip_check:
+        print(f"\n✅ 导出完成: {output}")
+        return
+
+    print("\n对比 PyTorch 后端的向量一致性...")
+    from sentence_transformers import SentenceTransformer
+
+    samples = load_samples(args.samples) if args.samples else DEFAULT_SAMPLES
+    reference = SentenceTransformer(args.model, device="cpu")
+    candidate = OnnxEmbeddingModel(str(output))
+    agreement = embedding_agreement(reference, candidate, samples)
+    write_onnx_metadata(output, {"agreement": agreement})
+
+    print("============================================================")
+    print(f"样本数: {agreement['samples']}")
+    print(f"余弦相似度（均值）: {agreement['mean_cosine']}")
+    print(f"余弦相似度（最小）: {agreement['min_cosine']}")
+    print(f"近邻一致率: {agreement['neighbor_agreement']}")
+    print("============================================================")
+    if agreement["min_cosine"] < 0.98:
+        print("⚠️ 部分样本与 PyTorch 后端差异较大，建议用业务语料评估召回后再切换")
+    print(f"\n✅ 导出完成: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,6 +10,7 @@ if sys.platform != 'win32':
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from app.core.config import settings
 from app.core.database import init_db, close_db
@@ -46,12 +47,48 @@ async def lifespan(app: FastAPI):
     except Exception as e:
         logger.warning(f"MCP工具注册失败: {str(e)}")
     
+    # 预加载热门知识库集合
+    if settings.MILVUS_PRELOAD_COLLECTIONS > 0:
+        try:
+            from app.core.database import AsyncSessionLocal
+            from app.services.knowledge_service import KnowledgeService
+            
+            async with AsyncSessionLocal() as session:
+                await KnowledgeService(session).preload_collections(settings.MILVUS_PRELOAD_COLLECTIONS)
+        except Exception as e:
+            logger.warning(f"预加载 Milvus 集合失败: {str(e)}")
+    
+    # 启动向量/对象垃圾回收器
+    from app.knowledge.gc import vector_gc
+    vector_gc.start()
+    
+    # 预热模型（Embedding / Reranker / OCR 并行加载并执行一次推理，完成前 /ready 返回 503）
+    from app.services.warmup_service import model_warmup
+    await model_warmup.start()
+    
     logger.info(f"应用启动完成, API前缀: {settings.API_V1_PREFIX}")
     
     yield
     
     # 关闭时
     logger.info("应用关闭中...")
+    from app.knowledge.executor import embedding_executor, keyword_executor, rerank_executor
+    from app.knowledge.bm25 import keyword_index_manager
+    from app.knowledge.collection_manager import collection_manager
+    from app.knowledge.vector_store import vector_store
+    from app.knowledge.content_store import content_embedding_store
+    from app.knowledge.embedding_providers import embedding_providers
+    await model_warmup.stop()
+    await vector_gc.stop()
+    await keyword_index_manager.flush()
+    collection_manager.save_usage()
+    await vector_store.close()
+    if content_embedding_store is not None:
+        await content_embedding_store.close()
+    await embedding_providers.close()
+    embedding_executor.shutdown()
+    rerank_executor.shutdown()
+    keyword_executor.shutdown()
     await close_db()
     logger.info("应用已关闭")
 
@@ -108,11 +145,21 @@ def create_app() -> FastAPI:
     from app.mcp.server import mcp_server
     app.include_router(mcp_server.get_router(), prefix=settings.API_V1_PREFIX)
     
-    # 健康检查
+    # 健康检查（存活）
     @app.get("/health")
     async def health_check():
         return {"status": "healthy", "version": settings.APP_VERSION}
     
+    # 就绪检查：模型预热完成前返回 503，负载均衡据此决定是否转发流量
+    @app.get("/ready")
+    async def readiness_check():
+        from app.services.warmup_service import model_warmup
+        status = model_warmup.status()
+        return JSONResponse(
+            status_code=200 if status["ready"] else 503,
+            content={**status, "version": settings.APP_VERSION}
+        )
+    
     return app
 
 
@@ -0,0 +1,9 @@
+-- ========================================
+-- 知识库 Embedding 提供方迁移脚本
+-- 版本: v2.5.0
+-- 描述: 每个知识库记录入库和查询使用的 Embedding 提供方（local 或 embedding.providers 中的名称），
+--       已有知识库为 NULL，即本地模型
+-- ========================================
+
+ALTER TABLE knowledge_bases
+ADD COLUMN embedding_provider VARCHAR(50) DEFAULT NULL COMMENT 'Embedding 提供方，为空表示本地模型';
@@ -0,0 +1,12 @@
+-- ========================================
+-- 知识库向量索引配置迁移脚本
+-- 版本: v2.1.0
+-- 描述: 支持按知识库选择 ANN 索引类型并保存自动调优的检索参数
+-- ========================================
+
+ALTER TABLE knowledge_bases
+ADD COLUMN index_profile VARCHAR(20) DEFAULT 'IVF_FLAT' COMMENT '向量索引类型: FLAT/IVF_FLAT/IVF_SQ8/HNSW/DISKANN',
+ADD COLUMN index_search_params JSON COMMENT '自动调优的检索参数';
+
+-- 已有知识库均使用 IVF_FLAT 索引创建
+UPDATE knowledge_bases SET index_profile = 'IVF_FLAT' WHERE index_profile IS NULL;
@@ -0,0 +1,9 @@
+-- ========================================
+-- 知识库向量降维迁移脚本
+-- 版本: v2.2.0
+-- 描述: 支持按知识库使用 PCA 降维后的向量建索引，可选全精度重打分
+-- ========================================
+
+ALTER TABLE knowledge_bases
+ADD COLUMN projection_dim INT DEFAULT NULL COMMENT 'PCA 降维后的维度，为空表示原始维度',
+ADD COLUMN projection_rescore BOOLEAN DEFAULT TRUE COMMENT '降维检索后是否用全精度向量重打分';
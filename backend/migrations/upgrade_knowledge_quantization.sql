@@ -0,0 +1,11 @@
+-- ========================================
+-- 知识库向量量化迁移脚本
+-- 版本: v2.2.0
+-- 描述: 支持按知识库使用 int8 / 二值量化向量做首轮检索，全精度向量重打分
+-- ========================================
+
+ALTER TABLE knowledge_bases
+ADD COLUMN quantization VARCHAR(10) DEFAULT 'none' COMMENT '向量量化方式: none/int8/binary';
+
+-- 已有知识库均未量化
+UPDATE knowledge_bases SET quantization = 'none' WHERE quantization IS NULL;
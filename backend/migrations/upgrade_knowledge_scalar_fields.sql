@@ -0,0 +1,15 @@
+-- ========================================
+-- 知识库标量字段迁移脚本
+-- 版本: v2.3.0
+-- 描述: 新集合将 document_id / kb_id / chunk_id / page_id 提升为带索引的标量字段
+--       （document_id 为分区键）。已有集合标记为未迁移，按 metadata JSON 过滤，
+--       可调用 POST /api/v1/knowledge/collections/{kb_id}/scalar-fields/migrate 重建
+-- ========================================
+
+ALTER TABLE knowledge_bases
+ADD COLUMN scalar_fields BOOLEAN DEFAULT FALSE COMMENT '集合是否包含 document_id 等标量字段';
+
+UPDATE knowledge_bases SET scalar_fields = FALSE WHERE scalar_fields IS NULL;
+
+-- 之后创建的知识库默认包含标量字段
+ALTER TABLE knowledge_bases ALTER COLUMN scalar_fields SET DEFAULT TRUE;
@@ -0,0 +1,11 @@
+-- ========================================
+-- 知识库共享集合迁移脚本
+-- 版本: v2.4.0
+-- 描述: 支持多个知识库共享少量 Milvus 集合（以 kb_id 为分区键隔离），
+--       已有知识库保持独立集合
+-- ========================================
+
+ALTER TABLE knowledge_bases
+ADD COLUMN shared_collection BOOLEAN DEFAULT FALSE COMMENT '是否存放在多个知识库共享的集合中';
+
+UPDATE knowledge_bases SET shared_collection = FALSE WHERE shared_collection IS NULL;
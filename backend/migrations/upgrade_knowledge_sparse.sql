@@ -0,0 +1,11 @@
+-- ========================================
+-- 知识库稀疏向量迁移脚本
+-- 版本: v2.2.0
+-- 描述: 支持在 Milvus 集合中同时保存 BGE-M3 稠密向量与稀疏词汇权重
+-- ========================================
+
+ALTER TABLE knowledge_bases
+ADD COLUMN sparse_enabled BOOLEAN DEFAULT FALSE COMMENT '集合是否包含 BGE-M3 稀疏向量字段';
+
+-- 已有集合没有稀疏向量字段
+UPDATE knowledge_bases SET sparse_enabled = FALSE WHERE sparse_enabled IS NULL;
@@ -0,0 +1,246 @@
+"""
+嵌入式向量存储测试脚本（不需要 Milvus、MySQL 和 Embedding 模型）
+测试：
+1. EmbeddedVectorStore 写入 → 检索 → 过滤 → 删除 → 重新打开后数据一致
+2. TieredVectorStore 超过容量后迁移，主键映射覆盖全部旧主键
+3. 知识库流程：add_texts → 向量/关键词/混合检索 → 按文档过滤 → 删除文档
+
+使用方法：
+    python test/test_embedded_vector_store.py
+也可以用 pytest 运行：
+    python -m pytest test/test_embedded_vector_store.py -q
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 在导入 app 之前切换到嵌入式后端，数据写入临时目录
+_DATA_DIR = tempfile.mkdtemp(prefix="agonx-embedded-test-")
+os.environ["VECTOR_STORE_BACKEND"] = "embedded"
+os.environ["EMBEDDED_STORE_DIR"] = os.path.join(_DATA_DIR, "vectors")
+os.environ["BM25_INDEX_DIR"] = os.path.join(_DATA_DIR, "bm25")
+os.environ["EMBEDDING_CONTENT_STORE_ENABLED"] = "false"
+os.environ["EMBEDDING_QUERY_CACHE_REDIS"] = "false"
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import asyncio
+import hashlib
+import math
+from typing import List
+
+from app.knowledge.bm25 import keyword_index_manager, tokenize
+from app.knowledge.embedded_store import EmbeddedVectorStore, TieredVectorStore
+from app.knowledge.embedding_providers import EmbeddingProvider, embedding_providers
+from app.knowledge.filters import SearchFilter
+from app.knowledge.index_profiles import CollectionSpec
+from app.knowledge.retrieval import retrieval_service
+from app.knowledge.vector_store import InMemoryVectorStore, vector_store
+
+DIMENSION = 64
+
+DOCUMENTS = {
+    "doc-1": [
+        "设备出现故障时，请先检查电源指示灯和网络连接。",
+        "重启设备后故障仍然存在，请联系售后服务。",
+    ],
+    "doc-2": [
+        "订单状态可以在个人中心的订单页面查询。",
+        "退款申请提交后三个工作日内处理完成。",
+    ],
+    "doc-3": [
+        "知识库支持 PDF、Word、Markdown 等格式的文档上传。",
+    ],
+}
+
+
+class HashEmbeddingProvider(EmbeddingProvider):
+    """按分词哈希生成的确定性向量（词袋），共享词越多余弦相似度越高"""
+
+    name = "test-hash"
+    dimension = DIMENSION
+
+    @property
+    def model_id(self) -> str:
+        return "test-hash"
+
+    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [embed(text) for text in texts]
+
+
+def embed(text: str) -> List[float]:
+    vector = [0.0] * DIMENSION
+    for token in tokenize(text):
+        vector[int(hashlib.md5(token.encode("utf-8")).hexdigest(), 16) % DIMENSION] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def make_rows():
+    rows = []
+    for document_id, chunks in DOCUMENTS.items():
+        for i, content in enumerate(chunks):
+            metadata = {"document_id": document_id, "kb_id": "kb-test", "chunk_id": f"{document_id}-{i}"}
+            rows.append({"embedding": embed(content), "content": content, "metadata": metadata, "source": document_id})
+    return rows
+
+
+def print_step(step: str, message: str):
+    print(f"\n{'=' * 60}")
+    print(f"【{step}】{message}")
+    print('=' * 60)
+
+
+async def check_embedded_store():
+    print_step("测试1", "EmbeddedVectorStore 写入 / 检索 / 过滤 / 删除 / 重新打开")
+    data_dir = os.path.join(_DATA_DIR, "store")
+    store = EmbeddedVectorStore(data_dir)
+    name = "kb_embedded_test"
+    await store.create_collection(name, DIMENSION)
+
+    rows = make_rows()
+    ids = await store.insert(name, rows)
+    await store.flush(name)
+    assert len(ids) == len(rows) and len(set(ids)) == len(ids), "主键数量不正确"
+    assert await store.count(name) == len(rows)
+    print(f"✅ 写入 {len(ids)} 条")
+
+    query = embed("设备故障 检查电源")
+    hits = (await store.search(name, [query], top_k=3))[0]
+    assert hits[0]["metadata"]["document_id"] == "doc-1", f"最相似的分块应来自 doc-1: {hits[0]}"
+    assert hits[0]["id"] == ids[0]
+    assert all(hits[i]["score"] >= hits[i + 1]["score"] for i in range(len(hits) - 1)), "结果未按分数降序"
+    print(f"✅ 检索命中: {hits[0]['content']} (分数 {hits[0]['score']:.4f})")
+
+    expr = SearchFilter(document_ids=["doc-2"]).to_expr()
+    filtered = (await store.search(name, [query], top_k=10, filter_expr=expr))[0]
+    assert filtered and all(hit["metadata"]["document_id"] == "doc-2" for hit in filtered), "过滤条件未生效"
+    print(f"✅ 按文档过滤: {len(filtered)} 条")
+
+    ranged = (await store.range_search(name, [query], radius=0.99, top_k=10))[0]
+    assert all(hit["score"] >= 0.99 for hit in ranged), "范围检索返回了低于阈值的结果"
+
+    deleted = await store.delete(name, SearchFilter(document_ids=["doc-1"]).to_expr())
+    await store.flush(name)
+    assert deleted == len(DOCUMENTS["doc-1"]), f"删除数量不正确: {deleted}"
+    hits = (await store.search(name, [query], top_k=10))[0]
+    assert all(hit["metadata"]["document_id"] != "doc-1" for hit in hits), "已删除的分块仍被检索到"
+    assert await store.document_ids(name) == {"doc-2", "doc-3"}
+    print(f"✅ 删除 doc-1 的 {deleted} 个分块")
+
+    # 重新打开：删除标记和主键都持久化
+    await store.close()
+    reopened = EmbeddedVectorStore(data_dir)
+    assert await reopened.count(name) == len(rows) - deleted
+    hits = (await reopened.search(name, [embed(DOCUMENTS["doc-3"][0])], top_k=1))[0]
+    assert hits[0]["id"] == ids[-1], "重新打开后主键变化"
+    new_ids = await reopened.insert(name, make_rows()[:1])
+    assert new_ids[0] not in ids, "重新打开后主键被复用"
+    await reopened.drop_collection(name)
+    assert not await reopened.has_collection(name)
+    print("✅ 重新打开后数据一致，删除集合成功")
+
+
+async def check_tiered_migration():
+    print_step("测试2", "TieredVectorStore 超过容量迁移与主键映射")
+    # 迁移目标使用内存存储代替 Milvus，接口相同
+    target = InMemoryVectorStore()
+    store = TieredVectorStore(EmbeddedVectorStore(os.path.join(_DATA_DIR, "tiered")), target, max_vectors=4)
+    name = "kb_tiered_test"
+    await store.create_collection(name, DIMENSION)
+
+    rows = make_rows()
+    old_ids = await store.insert(name, rows[:3])
+    await store.flush(name)
+    await store.delete(name, SearchFilter(chunk_ids=["doc-1-0"]).to_expr())
+    assert await store.ensure_capacity(name, 1) is None, "未超过容量时不应迁移"
+
+    mapping = await store.ensure_capacity(name, 3)
+    assert mapping is not None and store.migrations == 1, "超过容量时应迁移"
+    assert not store.embedded.contains(name) and await target.has_collection(name)
+    assert set(mapping) == set(old_ids[1:]), "映射应覆盖全部未删除的旧主键"
+    assert await store.count(name) == 2
+
+    new_ids = await store.insert(name, rows[3:])
+    assert await store.count(name) == len(rows) - 1
+    hits = (await store.search(name, [embed(rows[1]["content"])], top_k=1))[0]
+    assert hits[0]["id"] == mapping[old_ids[1]], "迁移后的主键与映射不一致"
+    hits = (await store.search(name, [embed(rows[-1]["content"])], top_k=1))[0]
+    assert hits[0]["id"] == new_ids[-1]
+    print(f"✅ 迁移 {len(mapping)} 条向量，映射与检索结果一致")
+
+
+async def check_pipeline():
+    print_step("测试3", "知识库流程（嵌入式后端）：入库 → 检索 → 过滤 → 删除")
+    assert isinstance(vector_store, EmbeddedVectorStore), "应使用嵌入式向量存储"
+    embedding_providers.register(HashEmbeddingProvider())
+    name = "kb_pipeline_test"
+    spec = CollectionSpec(collection_name=name, kb_id="kb-test", embedding_provider="test-hash")
+    await vector_store.create_collection(name, DIMENSION)
+    await keyword_index_manager.create(spec.keyword_index_name)
+
+    for document_id, chunks in DOCUMENTS.items():
+        await retrieval_service.add_texts(
+            name,
+            chunks,
+            [{"document_id": document_id, "kb_id": "kb-test", "source": f"{document_id}.txt"} for _ in chunks],
+            spec=spec
+        )
+    total = sum(len(chunks) for chunks in DOCUMENTS.values())
+    assert await vector_store.count(name) == total
+    print(f"✅ 入库 {total} 个分块")
+
+    query = "订单 退款 查询"
+    results = await retrieval_service.vector_search(name, query, top_k=3, score_threshold=0.0, spec=spec)
+    assert results[0]["metadata"]["document_id"] == "doc-2", f"向量检索结果不正确: {results[0]}"
+    keyword = await retrieval_service.keyword_search(name, query, top_k=3, spec=spec)
+    assert keyword and keyword[0]["metadata"]["document_id"] == "doc-2", "关键词检索结果不正确"
+    # 两路检索使用相同主键，RRF 融合能合并同一分块
+    hybrid = await retrieval_service.hybrid_search(name, query, top_k=3, score_threshold=0.0, fusion="rrf", spec=spec)
+    assert {r["id"] for r in keyword} & {r["id"] for r in results}, "向量与关键词结果的主键不一致"
+    assert hybrid[0]["metadata"]["document_id"] == "doc-2"
+    print(f"✅ 向量 / 关键词 / 混合检索均命中 doc-2")
+
+    filters = SearchFilter(document_ids=["doc-3"])
+    filtered = await retrieval_service.vector_search(
+        name, query, top_k=5, score_threshold=0.0, spec=spec, filters=filters
+    )
+    assert filtered and all(r["metadata"]["document_id"] == "doc-3" for r in filtered), "按文档过滤未生效"
+    print(f"✅ 按文档过滤: {len(filtered)} 条")
+
+    await vector_store.delete(name, spec.filter_expr(SearchFilter(document_ids=["doc-2"])))
+    await keyword_index_manager.remove_document(spec.keyword_index_name, "doc-2")
+    results = await retrieval_service.hybrid_search(name, query, top_k=5, score_threshold=0.0, spec=spec)
+    assert all(r["metadata"]["document_id"] != "doc-2" for r in results), "删除的文档仍被检索到"
+    print("✅ 删除 doc-2 后不再被检索到")
+
+    await keyword_index_manager.drop(spec.keyword_index_name)
+    await vector_store.drop_collection(name)
+
+
+def test_embedded_store():
+    asyncio.run(check_embedded_store())
+
+
+def test_tiered_migration():
+    asyncio.run(check_tiered_migration())
+
+
+def test_pipeline():
+    asyncio.run(check_pipeline())
+
+
+def main():
+    print("=" * 60)
+    print("嵌入式向量存储测试")
+    print(f"数据目录: {_DATA_DIR}")
+    print("=" * 60)
+    test_embedded_store()
+    test_tiered_migration()
+    test_pipeline()
+    print("\n🎉 全部测试通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,11 @@
 1. 确保后端服务已启动
 2. 准备测试文档（PDF/TXT/DOCX）
 3. 运行：python test/test_knowledge_pipeline.py
+
+没有 Milvus 的本地环境可在配置中设置 milvus.vector_store_backend: "embedded"，
+向量保存在本地内存映射文件中，流程与 Milvus 一致。
+不启动后端服务、不需要 Milvus/MySQL/Embedding 模型的进程内流程测试见
+test/test_embedded_vector_store.py。
 """
 import sys
 from pathlib import Path
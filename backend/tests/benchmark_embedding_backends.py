@@ -0,0 +1,133 @@
+"""
+Embedding 推理后端基准测试
+对比 torch（SentenceTransformer fp32）与 onnx（ONNX Runtime int8）在 CPU 上的吞吐和内存占用
+
+每个后端在独立子进程中加载和运行，内存数据互不影响。
+
+使用方法：
+1. 先运行 python download/export_onnx.py 导出 ONNX 模型
+2. 运行：python tests/benchmark_embedding_backends.py --texts 256 --threads 8
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core.config import settings
+
+SAMPLE_SENTENCES = [
+    "知识库支持 PDF、Word、Markdown 等格式的文档上传，上传后自动切分并生成向量。",
+    "设备出现故障时，请先检查电源指示灯和网络连接，然后重启设备。",
+    "The reranker scores each query and passage pair with a cross-encoder model.",
+    "检索结果按相似度排序，低于阈值的结果会被过滤，再由重排序模型精排。",
+    "ONNX Runtime executes the quantized graph with int8 matrix multiplications on CPU.",
+]
+
+
+def build_texts(count: int, sentences_per_text: int):
+    """构造与文档分块长度接近的测试文本"""
+    texts = []
+    for i in range(count):
+        parts = [SAMPLE_SENTENCES[(i + j) % len(SAMPLE_SENTENCES)] for j in range(sentences_per_text)]
+        texts.append(f"[{i}] " + " ".join(parts))
+    return texts
+
+
+def peak_rss_mb() -> float:
+    """进程峰值常驻内存（MB）；Windows 上没有 resource 模块时返回当前值"""
+    try:
+        import resource
+        # Linux 上 ru_maxrss 单位为 KB
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        import psutil
+        return psutil.Process(os.getpid()).memory_info().rss / 1024 / 1024
+
+
+def run_worker(backend: str, args):
+    """子进程：加载指定后端并编码测试文本，结果以 JSON 输出到 stdout"""
+    start = time.perf_counter()
+    if backend == "onnx":
+        from app.knowledge.embedding_backends import OnnxEmbeddingModel
+        model = OnnxEmbeddingModel(args.onnx_path, threads=args.threads)
+    else:
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if args.threads > 0:
+            torch.set_num_threads(args.threads)
+        model = SentenceTransformer(args.model, device="cpu")
+    load_time = time.perf_counter() - start
+
+    texts = build_texts(args.texts, args.sentences)
+    # 预热一次，排除首次调用的图优化/内存分配开销
+    model.encode(texts[:args.batch_size], batch_size=args.batch_size, normalize_embeddings=True)
+
+    start = time.perf_counter()
+    model.encode(texts, batch_size=args.batch_size, normalize_embeddings=True, show_progress_bar=False)
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "backend": backend,
+        "load_time_s": round(load_time, 2),
+        "encode_time_s": round(elapsed, 2),
+        "texts_per_s": round(len(texts) / elapsed, 2),
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding 推理后端基准测试")
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL, help="PyTorch 模型路径")
+    parser.add_argument("--onnx-path", default=settings.EMBEDDING_ONNX_MODEL_PATH, help="ONNX 模型目录")
+    parser.add_argument("--texts", type=int, default=256, help="测试文本数量")
+    parser.add_argument("--sentences", type=int, default=6, help="每条文本包含的句子数（控制长度）")
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--threads", type=int, default=settings.EMBEDDING_ONNX_THREADS, help="推理线程数，0 表示默认")
+    parser.add_argument("--backends", default="torch,onnx", help="要测试的后端，逗号分隔")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args)
+        return
+
+    print("=" * 60)
+    print("Embedding 推理后端基准测试")
+    print("=" * 60)
+    print(f"  PyTorch 模型: {args.model}")
+    print(f"  ONNX 模型: {args.onnx_path}")
+    print(f"  文本数量: {args.texts}, 批大小: {args.batch_size}, 线程数: {args.threads or '默认'}")
+
+    results = {}
+    for backend in args.backends.split(","):
+        print(f"\n运行 {backend} 后端...")
+        command = [
+            sys.executable, __file__, "--worker", backend,
+            "--model", args.model, "--onnx-path", args.onnx_path,
+            "--texts", str(args.texts), "--sentences", str(args.sentences),
+            "--batch-size", str(args.batch_size), "--threads", str(args.threads)
+        ]
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.returncode != 0:
+            print(f"  ✗ 运行失败:\n{proc.stderr[-2000:]}")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        results[backend] = result
+        print(f"  ✓ 加载 {result['load_time_s']}s, 编码 {result['encode_time_s']}s, "
+              f"{result['texts_per_s']} 条/s, 峰值内存 {result['peak_rss_mb']} MB")
+
+    if "torch" in results and "onnx" in results:
+        torch_result, onnx_result = results["torch"], results["onnx"]
+        print("\n" + "=" * 60)
+        print(f"吞吐提升: {onnx_result['texts_per_s'] / torch_result['texts_per_s']:.2f}x")
+        print(f"内存占用: {onnx_result['peak_rss_mb'] / torch_result['peak_rss_mb']:.2%}")
+        print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
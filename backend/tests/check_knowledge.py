@@ -119,7 +119,7 @@ async def check_minio():
         )
         
         # 检查 bucket
-        bucket_name = "agonx-documents"
+        bucket_name = settings.MINIO_BUCKET
         if not client.bucket_exists(bucket_name):
             print(f"  ! Bucket '{bucket_name}' 不存在，将自动创建")
         else:
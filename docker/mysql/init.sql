@@ -72,6 +72,15 @@ CREATE TABLE IF NOT EXISTS knowledge_bases (
     similarity_threshold FLOAT DEFAULT 0.7,
     search_mode VARCHAR(20) DEFAULT 'hybrid',
     rerank_enabled BOOLEAN DEFAULT TRUE,
+    index_profile VARCHAR(20) DEFAULT 'IVF_FLAT',
+    index_search_params JSON,
+    quantization VARCHAR(10) DEFAULT 'none',
+    projection_dim INT DEFAULT NULL,
+    projection_rescore BOOLEAN DEFAULT TRUE,
+    sparse_enabled BOOLEAN DEFAULT FALSE,
+    scalar_fields BOOLEAN DEFAULT TRUE,
+    shared_collection BOOLEAN DEFAULT FALSE,
+    embedding_provider VARCHAR(50) DEFAULT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
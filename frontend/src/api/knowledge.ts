@@ -38,6 +38,14 @@ export interface EnhancedSearchResult {
   metadata: Record<string, unknown>
 }
 
+export interface EmbeddingProvider {
+  name: string
+  model: string
+  dimension: number
+  supports_sparse: boolean
+  default: boolean
+}
+
 export const knowledgeApi = {
   // 获取知识库列表
   getCollections(): Promise<ApiResponse<KnowledgeBase[]>> {
@@ -45,10 +53,15 @@ export const knowledgeApi = {
   },
 
   // 创建知识库
-  createCollection(data: { name: string; description: string }): Promise<ApiResponse<KnowledgeBase>> {
+  createCollection(data: { name: string; description: string; embedding_provider?: string }): Promise<ApiResponse<KnowledgeBase>> {
     return request.post('/knowledge/collections', data)
   },
 
+  // 获取可选的 Embedding 提供方
+  getEmbeddingProviders(): Promise<ApiResponse<EmbeddingProvider[]>> {
+    return request.get('/knowledge/embedding-providers')
+  },
+
   // 删除知识库
   deleteCollection(id: string): Promise<ApiResponse<null>> {
     return request.delete(`/knowledge/collections/${id}`)
@@ -83,6 +96,7 @@ export const knowledgeApi = {
     top_k?: number
     similarity_threshold?: number
     search_mode?: string
+    document_ids?: string[]
   }): Promise<ApiResponse<SearchResult[]>> {
     return request.post('/knowledge/search', data)
   },
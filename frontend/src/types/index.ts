@@ -65,8 +65,17 @@ export interface RetrievalConfig {
   top_k: number
   top_n: number
   similarity_threshold: number
-  search_mode: 'vector' | 'keyword' | 'hybrid'
+  search_mode: 'vector' | 'keyword' | 'hybrid' | 'hybrid_rrf'
   rerank_enabled: boolean
+  index_profile?: 'FLAT' | 'IVF_FLAT' | 'IVF_SQ8' | 'HNSW' | 'DISKANN' | 'BIN_FLAT' | 'BIN_IVF_FLAT'
+  index_search_params?: Record<string, any> | null
+  quantization?: 'none' | 'int8' | 'binary'
+  projection_dim?: number | null
+  projection_rescore?: boolean
+  sparse_enabled?: boolean
+  scalar_fields?: boolean
+  shared_collection?: boolean
+  embedding_provider?: string | null
 }
 
 // 智能体相关类型